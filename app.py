@@ -35,6 +35,35 @@ EFFECT_DEFAULTS = {
             'filter_type': 0, # 0=LP, 1=HP, 2=BP
             'cutoff_hz': 1000,
             'q': 0.707
+            },
+        'chorus': {
+            'rate_hz': 0.8,
+            'depth_ms': 3.0,
+            'delay_ms': 15.0,
+            'voices': 3,
+            'spread': 0.5,
+            'mix': 0.5
+            },
+        'flanger': {
+            'rate_hz': 0.25,
+            'depth_ms': 2.0,
+            'delay_ms': 1.0,
+            'feedback': 0.5,
+            'spread': 0.25,
+            'mix': 0.5
+            },
+        'compressor': {
+            'threshold_db': -20.0,
+            'ratio': 4.0,
+            'knee_db': 6.0,
+            'attack_ms': 10.0,
+            'release_ms': 120.0,
+            'makeup_db': 0.0
+            },
+        'limiter': {
+            'ceiling_db': -1.0,
+            'lookahead_ms': 5.0,
+            'release_ms': 80.0
             }
         }
 
@@ -70,6 +99,82 @@ DEFAULT_PRESETS = {
     ]
 }
 
+# (param_key, label, min, max, step) per effect type
+EFFECT_CONTROLS = {
+        'delay': [
+            ('feedback', "Feedback", 0, 0.95, 0.01),
+            ('delay_ms', "Delay time (ms)", 50, 1000, 1),
+            ('mix_dry', "Dry mix", 0, 1, 0.01),
+            ('mix_wet', "Wet mix", 0, 1, 0.01),
+            ('offset_ms', "Stereo offset", 0, 1000, 1),
+            ],
+        'reverb': [
+            ('rt60_s', "60dB decay time (s)", 0.1, 10.0, 0.1),
+            ('mix_dry', "Dry mix", 0, 1, 0.01),
+            ('mix_wet', "Wet mix", 0, 1, 0.01),
+            ('damp', "Damping", 0, 0.95, 0.01),
+            ('pre_delay_ms', "Pre-delay (ms)", 0, 100, 1),
+            ],
+        'gate': [
+            ('threshold_db', "Threshold (dB)", -60, 0, 1),
+            ('attack_ms', "Attack (ms)", 1, 500, 1),
+            ('release_ms', "Release (ms)", 10, 1000, 10),
+            ],
+        'spectral': [
+            ('threshold_db', "Noise Threshold (dB)", -80, 0, 1),
+            ('reduction', "Noise Floor (0=Silence, 1=Orig)", 0.0, 1.0, 0.05),
+            ],
+        'octaver': [
+            ('semitones', "Pitch Shift (Semitones)", -24, 24, 1),
+            ('mix', "Mix (0=Dry, 1=Wet)", 0.0, 1.0, 0.05),
+            ],
+        'filter': [
+            ('filter_type', "Type (0=Low, 1=High, 2=Band)", 0, 2, 1),
+            ('cutoff_hz', "Frequency (Hz)", 20, 10000, 10),
+            ('q', "Resonance (Q)", 0.1, 5.0, 0.1),
+            ],
+        'chorus': [
+            ('rate_hz', "Rate (Hz)", 0.05, 5.0, 0.05),
+            ('depth_ms', "Depth (ms)", 0, 10, 0.1),
+            ('delay_ms', "Delay (ms)", 5, 40, 0.5),
+            ('voices', "Voices", 1, 4, 1),
+            ('spread', "Stereo spread", 0, 1, 0.05),
+            ('mix', "Mix (0=Dry, 1=Wet)", 0.0, 1.0, 0.05),
+            ],
+        'flanger': [
+            ('rate_hz', "Rate (Hz)", 0.05, 5.0, 0.05),
+            ('depth_ms', "Depth (ms)", 0, 5, 0.05),
+            ('delay_ms', "Delay (ms)", 0.1, 10, 0.1),
+            ('feedback', "Feedback", -0.95, 0.95, 0.05),
+            ('spread', "Stereo spread", 0, 1, 0.05),
+            ('mix', "Mix (0=Dry, 1=Wet)", 0.0, 1.0, 0.05),
+            ],
+        'compressor': [
+            ('threshold_db', "Threshold (dB)", -60, 0, 1),
+            ('ratio', "Ratio", 1, 20, 0.5),
+            ('knee_db', "Knee (dB)", 0, 24, 1),
+            ('attack_ms', "Attack (ms)", 0.1, 200, 0.1),
+            ('release_ms', "Release (ms)", 5, 2000, 5),
+            ('makeup_db', "Makeup (dB)", 0, 24, 0.5),
+            ],
+        'limiter': [
+            ('ceiling_db', "Ceiling (dB)", -24, 0, 0.1),
+            ('lookahead_ms', "Lookahead (ms)", 0, 20, 0.5),
+            ('release_ms', "Release (ms)", 5, 2000, 5),
+            ]
+        }
+
+# plain attributes on the backend, not smoothed, so LFOs cannot drive them
+NON_MODULATABLE = {('delay', 'offset_ms'), ('chorus', 'voices'), ('limiter', 'lookahead_ms')}
+
+MOD_SOURCES = [
+        {'label': 'LFO - Sine', 'value': 'sine'},
+        {'label': 'LFO - Triangle', 'value': 'triangle'},
+        {'label': 'LFO - Square', 'value': 'square'},
+        {'label': 'LFO - Sample & Hold', 'value': 'sample_hold'},
+        {'label': 'Envelope follower', 'value': 'envelope'}
+        ]
+
 app = dash.Dash(__name__)
 app.title = "Audio Effects"
 server = app.server
@@ -80,46 +185,7 @@ def create_effect_card(effect_data, index, total_count):
     effect_type = effect_data["type"]
     params = effect_data["params"]
 
-    control_configs = []
-    if effect_type == 'delay':
-        control_configs = [
-                # (param_key, label, min, max, step)
-                ('feedback', "Feedback", 0, 0.95, 0.01),
-                ('delay_ms', "Delay time (ms)", 50, 1000, 1),
-                ('mix_dry', "Dry mix", 0, 1, 0.01),
-                ('mix_wet', "Wet mix", 0, 1, 0.01),
-                ('offset_ms', "Stereo offset", 0, 1000, 1),
-                ]
-    elif effect_type == 'reverb':
-        control_configs = [
-                ('rt60_s', "60dB decay time (s)", 0.1, 10.0, 0.1),
-                ('mix_dry', "Dry mix", 0, 1, 0.01),
-                ('mix_wet', "Wet mix", 0, 1, 0.01),
-                ('damp', "Damping", 0, 0.95, 0.01),
-                ('pre_delay_ms', "Pre-delay (ms)", 0, 100, 1),
-                ]
-    elif effect_type == 'gate':
-        control_configs = [
-                ('threshold_db', "Threshold (dB)", -60, 0, 1),
-                ('attack_ms', "Attack (ms)", 1, 500, 1),
-                ('release_ms', "Release (ms)", 10, 1000, 10),
-                ]
-    elif effect_type == 'spectral':
-        control_configs = [
-                ('threshold_db', "Noise Threshold (dB)", -80, 0, 1),
-                ('reduction', "Noise Floor (0=Silence, 1=Orig)", 0.0, 1.0, 0.05),
-                ]
-    elif effect_type == 'octaver':
-        control_configs = [
-                ('semitones', "Pitch Shift (Semitones)", -24, 24, 1),
-                ('mix', "Mix (0=Dry, 1=Wet)", 0.0, 1.0, 0.05),
-                ]
-    elif effect_type == 'filter':
-        control_configs = [
-                ('filter_type', "Type (0=Low, 1=High, 2=Band)", 0, 2, 1),
-                ('cutoff_hz', "Frequency (Hz)", 20, 10000, 10),
-                ('q', "Resonance (Q)", 0.1, 5.0, 0.1),
-                ]
+    control_configs = EFFECT_CONTROLS.get(effect_type, [])
 
     controls_ui = []
     for param_key, label, min, max, step in control_configs:
@@ -184,8 +250,14 @@ app.layout = dash.html.Div([
 
     dash.dcc.Store(id='ws-commands-store'),
     dash.dcc.Store(id='loading-state-store'),
-    dash.dcc.Store(id='effects-chain-store', data=[]),
+    # the chain stores live in sessionStorage like the backend session token
+    # (02_custom.js), so a page reload shows the chain the resumed session still runs
+    dash.dcc.Store(id='effects-chain-store', storage_type='session', data=[]),
+    # ids and types only, written on add/delete/reorder/preset load: what the
+    # chain UI is built from, so slider patches of the store above never reach the server
+    dash.dcc.Store(id='chain-structure-store', storage_type='session', data=[]),
     dash.dcc.Store(id='presets-store', storage_type='local', data=DEFAULT_PRESETS),
+    dash.dcc.Store(id='modulation-store', storage_type='session', data=[]),
 
     dash.html.Div(id='dummy-output', style={'display': 'none'}),
     dash.html.Div(id='dummy-player-control', style={'display': 'none'}),
@@ -212,7 +284,25 @@ app.layout = dash.html.Div([
                     id="stop-stream-btn", 
                     n_clicks=0, 
                     className="btn-control btn-stop"
-                )
+                ),
+                dash.html.Div([
+                    dash.html.Label("Latency profile:", style={'fontWeight': 'bold'}),
+                    dash.dcc.Dropdown(
+                        id='latency-profile-selector',
+                        options=[
+                            {'label': 'Ultra (64 frames)', 'value': 'ultra'},
+                            {'label': 'Low (128 frames)', 'value': 'low'},
+                            {'label': 'Normal (256 frames)', 'value': 'normal'},
+                            {'label': 'Safe (512 frames)', 'value': 'safe'},
+                            {'label': 'Adaptive', 'value': 'adaptive'}
+                            ],
+                        value='normal',
+                        clearable=False
+                        ),
+                    dash.html.Div(id='latency-status', style={'fontSize': '12px', 'color': '#666', 'marginTop': '5px'}),
+                    dash.html.Div(id='loudness-status', style={'fontSize': '12px', 'color': '#666', 'marginTop': '5px', 'fontFamily': 'monospace'}),
+                    dash.html.Div(id='pitch-status', style={'fontSize': '12px', 'color': '#666', 'marginTop': '5px', 'fontFamily': 'monospace'})
+                    ], style={'width': '100%', 'marginTop': '10px'})
                 ]),
             dash.html.Div(id="file-controls", children=[
                 dash.dcc.Upload(
@@ -226,10 +316,23 @@ app.layout = dash.html.Div([
                         }
                     ),
                 dash.html.Div(id="output-filename"),
+                dash.html.Label("Output format:", style={'fontWeight': 'bold'}),
+                dash.dcc.Dropdown(
+                    id='output-format-selector',
+                    options=[
+                        {'label': 'WAV (16-bit)', 'value': 'wav16'},
+                        {'label': 'WAV (32-bit float)', 'value': 'wav32f'},
+                        {'label': 'FLAC', 'value': 'flac'},
+                        {'label': 'Ogg Vorbis', 'value': 'ogg'}
+                        ],
+                    value='wav16',
+                    clearable=False,
+                    style={'marginBottom': '10px'}
+                    ),
 
                 dash.html.Div(id='processing-status', children=[
                     dash.html.Div(className='loader-spinner'),  # CSS Class defined above
-                    dash.html.Div("Processing...", style={'fontSize': '14px', 'color': '#666'})
+                    dash.html.Div("Processing...", id='processing-progress', style={'fontSize': '14px', 'color': '#666'})
                 ], style={'display': 'none', 'textAlign': 'center', 'padding': '20px'}),
 
                 dash.html.Hr(),
@@ -298,8 +401,32 @@ app.layout = dash.html.Div([
                 {'label': 'Noise Gate', 'value': 'gate'},
                 {'label': 'Spectral Filter', 'value': 'spectral'},
                 {'label': 'Octaver', 'value': 'octaver'},
-                {'label': 'EQ Filter', 'value': 'filter'}
-                ], placeholder='Select an effect to add...')
+                {'label': 'EQ Filter', 'value': 'filter'},
+                {'label': 'Chorus', 'value': 'chorus'},
+                {'label': 'Flanger', 'value': 'flanger'},
+                {'label': 'Compressor', 'value': 'compressor'},
+                {'label': 'Limiter', 'value': 'limiter'}
+                ], placeholder='Select an effect to add...'),
+
+            dash.html.Hr(),
+            dash.html.H2("Modulation"),
+            dash.html.Div([
+                dash.dcc.Dropdown(id='mod-source-type', options=MOD_SOURCES, value='sine', clearable=False,
+                                  style={'marginBottom': '10px'}),
+                dash.html.Div([
+                    dash.dcc.Input(id='mod-rate-hz', type='number', min=0.01, max=20, step=0.01, value=1.0,
+                                   placeholder="Rate (Hz)", style={'width': '33%'}),
+                    dash.dcc.Input(id='mod-bpm', type='number', min=20, max=300, step=1,
+                                   placeholder="Sync BPM", style={'width': '33%'}),
+                    dash.dcc.Input(id='mod-beats', type='number', min=0.25, max=16, step=0.25, value=1,
+                                   placeholder="Beats/cycle", style={'width': '33%'}),
+                ], style={'display': 'flex', 'marginBottom': '10px'}),
+                dash.dcc.Dropdown(id='mod-target', placeholder="Target parameter...", style={'marginBottom': '10px'}),
+                dash.html.Label("Depth (fraction of range)"),
+                dash.dcc.Slider(id='mod-depth', min=-1, max=1, step=0.05, value=0.25, marks={-1: '-1', 0: '0', 1: '1'}),
+                dash.html.Button("+ Add modulation", id='add-mod-btn', n_clicks=0, style={'marginTop': '10px'}),
+                dash.html.Div(id='mod-routes-container', style={'marginTop': '10px'})
+            ], style={'backgroundColor': '#f0f0f0', 'padding': '15px', 'borderRadius': '8px', 'marginBottom': '20px'})
 
         ], style={
                 # SIDEBAR STYLES
@@ -323,10 +450,20 @@ app.layout = dash.html.Div([
                     style={'height': '100%', 'width': '100%'},
                     config={'responsive': True, 'displayModeBar': False} 
                 ),
-                style={'flex': '0 0 40%', 'marginBottom': '10px', 'minHeight': '0'} 
+                style={'flex': '0 0 32%', 'marginBottom': '10px', 'minHeight': '0'} 
             ),
 
-            # 2. ROW FOR SPECTRUM & CHROMA
+            # 2. SPECTROGRAM OF THE LAST FILE (original above, processed below)
+            dash.html.Div(
+                dash.dcc.Graph(
+                    id='spectrogram-graph', 
+                    style={'height': '100%', 'width': '100%'},
+                    config={'responsive': True, 'displayModeBar': False} 
+                ),
+                style={'flex': '0 0 30%', 'marginBottom': '10px', 'minHeight': '0'} 
+            ),
+
+            # 3. ROW FOR SPECTRUM & CHROMA
             dash.html.Div([
                 
                 # SPECTRUM (Bottom Left)
@@ -372,29 +509,25 @@ app.layout = dash.html.Div([
 ])
 
 
+def chain_structure(chain):
+    return [{'effect_id': e['effect_id'], 'type': e['type']} for e in chain]
+
+
 @app.callback(
         dash.Output('effects-chain-container', 'children'),
-        dash.Input('effects-chain-store', 'data'),
-        dash.State('effects-chain-container', 'children')
+        dash.Input('chain-structure-store', 'data'),
+        dash.State('effects-chain-store', 'data')
         )
-def update_effects_chain_ui(chain_data, current_children):
-    if not chain_data:
-        # If data is empty but UI is not, we need to clear it
-        if current_children: 
-            return []
-        return dash.no_update
-    # prevent rerender when user moves a slider
-    new_ids = [e['effect_id'] for e in chain_data]
-    current_ids = [child['props']['id']['index'] for child in current_children]
-    if new_ids == current_ids:
-        raise dash.exceptions.PreventUpdate
-
+def update_effects_chain_ui(structure, chain_data):
+    # only structural edits land here, the params are read once to seed the controls
+    chain_data = chain_data or []
     count = len(chain_data)
     return [create_effect_card(effect, i, count) for i, effect in enumerate(chain_data)]
 
 
 @app.callback(
         dash.Output('effects-chain-store', 'data', allow_duplicate=True),
+        dash.Output('chain-structure-store', 'data', allow_duplicate=True),
         dash.Output('ws-commands-store', 'data', allow_duplicate=True),
         dash.Output('add-effect-dropdown', 'value'),
         dash.Input('add-effect-dropdown', 'value'),
@@ -403,7 +536,7 @@ def update_effects_chain_ui(chain_data, current_children):
         )
 def add_effect(effect_type, current_chain):
     if not effect_type:
-        return dash.no_update, dash.no_update, None
+        return dash.no_update, dash.no_update, dash.no_update, None
 
     new_effect_id = str(uuid.uuid4())
     new_effect = {
@@ -418,11 +551,12 @@ def add_effect(effect_type, current_chain):
             'config': new_chain
             }
 
-    return new_chain, command, ""
+    return new_chain, chain_structure(new_chain), command, ""
 
 
 @app.callback(
         dash.Output('effects-chain-store', 'data', allow_duplicate=True),
+        dash.Output('chain-structure-store', 'data', allow_duplicate=True),
         dash.Output('ws-commands-store', 'data', allow_duplicate=True),
         dash.Input({'type': 'delete-effect-btn', 'index': dash.ALL}, 'n_clicks'),
         dash.State('effects-chain-store', 'data'),
@@ -430,12 +564,12 @@ def add_effect(effect_type, current_chain):
         )
 def delete_effect(n_clicks, current_chain):
     if not dash.ctx.triggered_id:
-        return dash.no_update, dash.no_update
+        return dash.no_update, dash.no_update, dash.no_update
 
     # prevent deletion when the callback is trigger by adding a new effect
     trigger_value = dash.ctx.triggered[0]['value']
     if not trigger_value or trigger_value == 0:
-        return dash.no_update, dash.no_update
+        return dash.no_update, dash.no_update, dash.no_update
 
     effect_id_to_delete = dash.ctx.triggered_id['index']
     new_chain = [effect for effect in current_chain if effect['effect_id'] != effect_id_to_delete]
@@ -443,11 +577,12 @@ def delete_effect(n_clicks, current_chain):
             'command': 'build_chain',
             'config': new_chain
             }
-    return new_chain, command
+    return new_chain, chain_structure(new_chain), command
 
 
 @app.callback(
         dash.Output('effects-chain-store', 'data', allow_duplicate=True),
+        dash.Output('chain-structure-store', 'data', allow_duplicate=True),
         dash.Output('ws-commands-store', 'data', allow_duplicate=True),
         dash.Input({'type': 'move-up-btn', 'index': dash.ALL}, 'n_clicks'),
         dash.Input({'type': 'move-down-btn', 'index': dash.ALL}, 'n_clicks'),
@@ -456,12 +591,12 @@ def delete_effect(n_clicks, current_chain):
         )
 def reorder_effects(up_clicks, down_clicks, current_chain):
     if not current_chain or not dash.ctx.triggered:
-        return dash.no_update, dash.no_update
+        return dash.no_update, dash.no_update, dash.no_update
 
     # check that a click actually happened (ignore initial render)
     trigger_value = dash.ctx.triggered[0]['value']
     if not trigger_value or trigger_value == 0:
-        return dash.no_update, dash.no_update
+        return dash.no_update, dash.no_update, dash.no_update
 
     trigger_id = dash.ctx.triggered_id
     idx = trigger_id['index'] # type: ignore
@@ -475,76 +610,25 @@ def reorder_effects(up_clicks, down_clicks, current_chain):
     elif action == 'move-down-btn' and idx < len(new_chain) - 1:
         new_chain[idx], new_chain[idx+1] = new_chain[idx+1], new_chain[idx]
     else:
-        return dash.no_update, dash.no_update
+        return dash.no_update, dash.no_update, dash.no_update
 
     command = {'command': 'build_chain', 'config': new_chain}
-    return new_chain, command
+    return new_chain, chain_structure(new_chain), command
 
 
 @app.callback(
-        dash.Output({'type': 'effect-param-slider', 'effect_id': dash.MATCH, 'param': dash.MATCH}, 'value'),
-        dash.Output({'type': 'effect-param-input', 'effect_id': dash.MATCH, 'param': dash.MATCH}, 'value'),
-        dash.Input({'type': 'effect-param-slider', 'effect_id': dash.MATCH, 'param': dash.MATCH}, 'value'),
-        dash.Input({'type': 'effect-param-input', 'effect_id': dash.MATCH, 'param': dash.MATCH}, 'value'),
-        prevent_initial_call=True
-        )
-def sync_slider_and_input(slider_value, input_value):
-    trigger_id = dash.ctx.triggered_id
-    if not trigger_id:
-        return dash.no_update, dash.no_update
-
-    value = slider_value if trigger_id['type'] == 'effect-param-slider' else input_value
-    return value, value
-
-
-@app.callback(
-        dash.Output('effects-chain-store', 'data', allow_duplicate=True),
-        dash.Output('ws-commands-store', 'data', allow_duplicate=True),
-        dash.Input({'type': 'effect-param-slider', 'effect_id': dash.ALL, 'param': dash.ALL}, 'value'),
-        dash.State('effects-chain-store', 'data'),
-        prevent_initial_call=True
-        )
-def update_parameter(value, current_chain):
-    if not dash.ctx.triggered_id:
-        return dash.no_update, dash.no_update
-
-    # guard against race conditions when adding a new effect
-    effect_id = dash.ctx.triggered_id['effect_id']
-    if not effect_id or not current_chain or not any(eff['effect_id'] == effect_id for eff in current_chain):
-        return dash.no_update, dash.no_update
-
-    new_chain = copy.deepcopy(current_chain)
-    param_name = dash.ctx.triggered_id['param']
-    new_value = dash.ctx.triggered[0]['value']
-
-    for effect in new_chain:
-        if effect['effect_id'] == effect_id:
-            effect['params'][param_name] = new_value
-            break
-
-    command = {
-            'command': 'update_param',
-            'effect_id': effect_id,
-            'param': param_name,
-            'value': new_value
-            }
-
-    return new_chain, command
-
-
-@app.callback(
-        dash.Output('upload-audio', 'disabled'),
         dash.Output('processing-status', 'style'),
         dash.Input('loading-state-store', 'data')
         )
 def control_ui_during_load(data):
+    # uploads stay enabled: a new one cancels the render in flight
     is_busy = data.get('busy', False) if data else False
     
     # Toggle display between 'none' and 'block'
     spinner_style = {'display': 'block', 'textAlign': 'center', 'padding': '15px', 'backgroundColor': '#f0f8ff', 'borderRadius': '5px'}
     hidden_style = {'display': 'none'}
     
-    return is_busy, (spinner_style if is_busy else hidden_style)
+    return spinner_style if is_busy else hidden_style
 
 
 @app.callback(
@@ -554,7 +638,7 @@ def control_ui_during_load(data):
         )
 def toggle_source_controls(mode):
     if mode == 'mic':
-        return {"display": "flex"}, {"display": "none"}
+        return {"display": "flex", "flexWrap": "wrap"}, {"display": "none"}
     else:
         return {"display": "none"}, {"display": "block"}
 
@@ -588,6 +672,15 @@ def stop_stream(n_clicks):
     return {'command': 'stop'}
 
 
+@app.callback(
+        dash.Output('ws-commands-store', 'data', allow_duplicate=True),
+        dash.Input('latency-profile-selector', 'value'),
+        prevent_initial_call=True
+        )
+def set_latency_profile(profile):
+    return {'command': 'set_latency_profile', 'profile': profile}
+
+
 @app.callback(
         dash.Output('loading-state-store', 'data', allow_duplicate=True),
         dash.Input('loading-state-reset-trigger', 'n_clicks'),
@@ -597,6 +690,105 @@ def reset_loading_state(n_clicks):
     return {'busy': False}
 
 
+@app.callback(
+        dash.Output('mod-target', 'options'),
+        dash.Input('chain-structure-store', 'data')
+        )
+def update_mod_targets(structure):
+    options = []
+    for i, effect in enumerate(structure or []):
+        for param_key, label, *_ in EFFECT_CONTROLS.get(effect['type'], []):
+            if (effect['type'], param_key) in NON_MODULATABLE:
+                continue
+            options.append({
+                'label': f"{i + 1}. {effect['type'].title()}: {label}",
+                'value': f"{effect['effect_id']}|{param_key}"
+                })
+    return options
+
+
+def modulation_command(routes):
+    return {
+            'command': 'set_modulation',
+            'routes': [{k: r[k] for k in ('source', 'effect_id', 'param', 'depth')} for r in routes]
+            }
+
+
+@app.callback(
+        dash.Output('modulation-store', 'data', allow_duplicate=True),
+        dash.Output('ws-commands-store', 'data', allow_duplicate=True),
+        dash.Input('add-mod-btn', 'n_clicks'),
+        dash.State('mod-source-type', 'value'),
+        dash.State('mod-rate-hz', 'value'),
+        dash.State('mod-bpm', 'value'),
+        dash.State('mod-beats', 'value'),
+        dash.State('mod-target', 'value'),
+        dash.State('mod-depth', 'value'),
+        dash.State('modulation-store', 'data'),
+        prevent_initial_call=True
+        )
+def add_modulation(n_clicks, source_type, rate_hz, bpm, beats, target, depth, routes):
+    if not n_clicks or not target:
+        return dash.no_update, dash.no_update
+
+    if source_type == 'envelope':
+        source = {'type': 'envelope'}
+    else:
+        source = {'type': 'lfo', 'shape': source_type, 'rate_hz': rate_hz or 1.0}
+        if bpm:
+            source.update({'bpm': bpm, 'beats': beats or 1})
+
+    effect_id, param = target.split('|')
+    new_routes = (routes or []) + [{
+        'route_id': str(uuid.uuid4()),
+        'source': source,
+        'effect_id': effect_id,
+        'param': param,
+        'depth': depth
+        }]
+    return new_routes, modulation_command(new_routes)
+
+
+@app.callback(
+        dash.Output('modulation-store', 'data', allow_duplicate=True),
+        dash.Output('ws-commands-store', 'data', allow_duplicate=True),
+        dash.Input({'type': 'delete-mod-btn', 'index': dash.ALL}, 'n_clicks'),
+        dash.State('modulation-store', 'data'),
+        prevent_initial_call=True
+        )
+def delete_modulation(n_clicks, routes):
+    if not dash.ctx.triggered_id or not dash.ctx.triggered[0]['value']:
+        return dash.no_update, dash.no_update
+
+    route_id = dash.ctx.triggered_id['index']
+    new_routes = [r for r in routes if r['route_id'] != route_id]
+    return new_routes, modulation_command(new_routes)
+
+
+@app.callback(
+        dash.Output('mod-routes-container', 'children'),
+        dash.Input('modulation-store', 'data'),
+        dash.State('chain-structure-store', 'data')
+        )
+def render_modulation_routes(routes, structure):
+    types = {e['effect_id']: e['type'] for e in structure or []}
+    rows = []
+    for r in routes or []:
+        src = r['source']
+        if src['type'] == 'envelope':
+            src_label = "Envelope"
+        elif 'bpm' in src:
+            src_label = f"{src['shape']} @ {src['bpm']} BPM / {src['beats']} beats"
+        else:
+            src_label = f"{src['shape']} @ {src['rate_hz']} Hz"
+        target_label = f"{types.get(r['effect_id'], '?').title()}.{r['param']}"
+        rows.append(dash.html.Div([
+            dash.html.Span(f"{src_label} → {target_label} ({r['depth']:+.2f})", style={'flex': '1'}),
+            dash.html.Button("X", id={'type': 'delete-mod-btn', 'index': r['route_id']}, n_clicks=0)
+            ], style={'display': 'flex', 'alignItems': 'center', 'marginBottom': '5px', 'fontSize': '13px'}))
+    return rows
+
+
 @app.callback(
     dash.Output('presets-store', 'data'),
     dash.Output('preset-selector', 'options'),
@@ -627,6 +819,7 @@ def manage_presets(n_clicks, presets_data, new_name, current_chain):
 
 @app.callback(
     dash.Output('effects-chain-store', 'data', allow_duplicate=True),
+    dash.Output('chain-structure-store', 'data', allow_duplicate=True),
     dash.Output('ws-commands-store', 'data', allow_duplicate=True),
     dash.Output('preset-selector', 'value'),
     dash.Input('preset-selector', 'value'),
@@ -635,7 +828,7 @@ def manage_presets(n_clicks, presets_data, new_name, current_chain):
 )
 def load_preset(selected_preset_name, presets_data):
     if not selected_preset_name or not presets_data:
-        return dash.no_update, dash.no_update, dash.no_update
+        return dash.no_update, dash.no_update, dash.no_update, dash.no_update
     
     if selected_preset_name in presets_data:
         # Get chain
@@ -647,9 +840,9 @@ def load_preset(selected_preset_name, presets_data):
             effect['effect_id'] = str(uuid.uuid4())
 
         command = {'command': 'build_chain', 'config': new_chain}
-        return new_chain, command, None
+        return new_chain, chain_structure(new_chain), command, None
     
-    return dash.no_update, dash.no_update, dash.no_update
+    return dash.no_update, dash.no_update, dash.no_update, dash.no_update
 
 
 # command sender
@@ -664,16 +857,74 @@ dash.clientside_callback(
         )
 
 
+# slider <-> number input sync, in the browser
+dash.clientside_callback(
+        """
+        (slider_value, input_value) => {
+            const trigger = window.dash_clientside.callback_context.triggered_id;
+            if (!trigger) return [window.dash_clientside.no_update, window.dash_clientside.no_update];
+
+            const value = trigger.type === 'effect-param-slider' ? slider_value : input_value;
+            return [value, value];
+            }
+        """,
+        dash.Output({'type': 'effect-param-slider', 'effect_id': dash.MATCH, 'param': dash.MATCH}, 'value'),
+        dash.Output({'type': 'effect-param-input', 'effect_id': dash.MATCH, 'param': dash.MATCH}, 'value'),
+        dash.Input({'type': 'effect-param-slider', 'effect_id': dash.MATCH, 'param': dash.MATCH}, 'value'),
+        dash.Input({'type': 'effect-param-input', 'effect_id': dash.MATCH, 'param': dash.MATCH}, 'value'),
+        prevent_initial_call=True
+        )
+
+
+# parameter change: sent straight to the backend and patched into the store,
+# so slider ticks never reach the Flask server
+dash.clientside_callback(
+        """
+        (values, current_chain) => {
+            const dc = window.dash_clientside;
+            const trigger = dc.callback_context.triggered_id;
+            if (!trigger || !current_chain) return dc.no_update;
+
+            // guard against race conditions when adding a new effect
+            const idx = current_chain.findIndex(eff => eff.effect_id === trigger.effect_id);
+            if (idx < 0) return dc.no_update;
+
+            const new_value = dc.callback_context.triggered[0].value;
+            if (current_chain[idx].params[trigger.param] === new_value) return dc.no_update;
+
+            dc.ws_sender.send_command({
+                'command': 'update_param',
+                'effect_id': trigger.effect_id,
+                'param': trigger.param,
+                'value': new_value
+                });
+
+            return new dc.Patch().assign([idx, 'params', trigger.param], new_value).build();
+            }
+        """,
+        dash.Output('effects-chain-store', 'data', allow_duplicate=True),
+        dash.Input({'type': 'effect-param-slider', 'effect_id': dash.ALL, 'param': dash.ALL}, 'value'),
+        dash.State('effects-chain-store', 'data'),
+        prevent_initial_call=True
+        )
+
+
 # file processor
 dash.clientside_callback(
         """
-        (contents, filename) => {
+        (contents, filename, output_format) => {
             if (!contents) return [window.dash_clientside.no_update, "No file loaded"];
 
+            // keep the upload locally so the backend does not have to echo it back
+            window.audioB64Original = contents;
             const command = {
                 'command': 'process_file',
                 'contents': contents,
-                'filename': filename
+                'filename': filename,
+                'output_format': output_format,
+                'echo_original': false,
+                // ?trace in the page URL asks for a traced render
+                'debug': new URLSearchParams(window.location.search).has('trace')
                 }
 
             window.dash_clientside.ws_sender.send_command(command);
@@ -685,6 +936,7 @@ dash.clientside_callback(
         dash.Output('upload-audio', 'contents'),
         dash.Input('upload-audio', 'contents'),
         dash.State('upload-audio', 'filename'),
+        dash.State('output-format-selector', 'value'),
         prevent_initial_call=True
         )
 
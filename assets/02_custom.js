@@ -11,9 +11,14 @@ const NOTES = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"];
 let rtInputBuffer = new Array(PLOT_WINDOW_SIZE).fill(0);
 let rtOutputBuffer = new Array(PLOT_WINDOW_SIZE).fill(0);
 
-let fullAudioOriginal = [];
-let fullAudioProcessed = [];
+// file mode: the backend keeps min/max/RMS pyramids of both signals and we
+// only ever hold the range that is on screen (see waveform_range)
+const FILE_MIN_PLOT_POINTS = 500;
+let fileFrames = 0;
+let fileDuration = 0;
 let currentFileSampleRate = AUDIO_SAMPLE_RATE_DEFAULT;
+let pendingRange = null;
+let rangeInFlight = false;
 
 let playbackRafId = null;
 
@@ -180,13 +185,12 @@ function renderPlots(inputData, outputData, sampleRate, isRealTime) {
     const inputSlice = inputData.slice(sliceStart);
     const outputSlice = outputData.slice(sliceStart);
 
-    const dIn = calculateSpectrumAndChroma(inputSlice, sampleRate);
-    const dOut = calculateSpectrumAndChroma(outputSlice, sampleRate);
-
-
     // --- 3. RENDER ---
-    
-    // Time Domain
+    renderTimeDomain(tAxis, tInput, tOutput, null);
+    renderSpectra(inputSlice, outputSlice, sampleRate);
+}
+
+function renderTimeDomain(tAxis, tInput, tOutput, xRange) {
     Plotly.react('time-domain-graph', [
         { 
             x: tAxis, y: tOutput, 
@@ -207,6 +211,7 @@ function renderPlots(inputData, outputData, sampleRate, isRealTime) {
         title: { text: 'Time Domain', font: {size: 18}, x: 0, xanchor: 'left' },
         xaxis: { 
             ...COMMON_LAYOUT.xaxis,
+            ...(xRange ? { range: xRange } : {}),
             title: { text: 'Time (s)', font: { size: 12 } } 
         },
         yaxis: { 
@@ -215,6 +220,11 @@ function renderPlots(inputData, outputData, sampleRate, isRealTime) {
             title: { text: 'Amplitude', font: { size: 12 } }
         }
     });
+}
+
+function renderSpectra(inputSlice, outputSlice, sampleRate) {
+    const dIn = calculateSpectrumAndChroma(inputSlice, sampleRate);
+    const dOut = calculateSpectrumAndChroma(outputSlice, sampleRate);
 
     // Spectrum
     const peakLabel = `Spectrum (Peak: ${dIn.peakFreq.toFixed(1)} Hz)`;
@@ -279,40 +289,72 @@ function renderPlots(inputData, outputData, sampleRate, isRealTime) {
     });
     }
 
-function updatePlotsForPlaybackTime(currentTime) {
-    if (fullAudioOriginal.length === 0) return;
+function filePlotPoints() {
+    const el = document.getElementById('time-domain-graph');
+    const width = el && el.clientWidth ? el.clientWidth : 1000;
+    return Math.max(FILE_MIN_PLOT_POINTS, 2 * width);
+}
 
-    // Latency compensation (~120ms ahead)
-    const LOOKAHEAD_SEC = 0.12; 
-    const plotBlockSize = PLOT_WINDOW_SIZE; 
-    
-    let currentSampleIndex = Math.floor((currentTime + LOOKAHEAD_SEC) * currentFileSampleRate);
+// Only one waveform_range request is in flight; newer views replace older pending ones.
+function requestFileRange(view, t0, t1) {
+    pendingRange = { command: 'waveform_range', view: view, t0: t0, t1: t1, n_points: filePlotPoints(), raw_frames: FFT_SIZE };
+    if (!rangeInFlight) sendPendingRange();
+}
 
-    // Clamp to end
-    if (currentSampleIndex > fullAudioOriginal.length) {
-        currentSampleIndex = fullAudioOriginal.length;
-    }
+function sendPendingRange() {
+    if (pendingRange === null || !ws || ws.readyState !== 1) return;
+    rangeInFlight = true;
+    sendRaw(pendingRange);
+    pendingRange = null;
+}
 
-    let originalSlice, processedSlice;
-    const startIndex = currentSampleIndex - plotBlockSize;
+function renderFileRange(data) {
+    if (typeof Plotly === 'undefined') return;
 
-    if (startIndex >= 0) {
-        originalSlice = fullAudioOriginal.slice(startIndex, currentSampleIndex);
-        processedSlice = fullAudioProcessed.slice(startIndex, currentSampleIndex);
-    } else {
-        originalSlice = new Array(plotBlockSize).fill(0);
-        processedSlice = new Array(plotBlockSize).fill(0);
-        const availableLen = Math.min(currentSampleIndex, fullAudioOriginal.length);
-        const availableDataOrig = fullAudioOriginal.slice(0, availableLen);
-        const availableDataProc = fullAudioProcessed.slice(0, availableLen);
-        const offset = plotBlockSize - availableLen;
-        for (let i = 0; i < availableLen; i++) {
-            originalSlice[offset + i] = availableDataOrig[i];
-            processedSlice[offset + i] = availableDataProc[i];
-        }
+    // min/max pairs drawn as one zig-zag line give the usual filled waveform look
+    const n = data.original.min.length;
+    const tAxis = new Array(2 * n);
+    const tInput = new Array(2 * n);
+    const tOutput = new Array(2 * n);
+    for (let i = 0; i < n; i++) {
+        const t = data.t_start + i * data.dt;
+        tAxis[2 * i] = t;
+        tAxis[2 * i + 1] = t;
+        tInput[2 * i] = data.original.min[i];
+        tInput[2 * i + 1] = data.original.max[i];
+        tOutput[2 * i] = data.processed.min[i];
+        tOutput[2 * i + 1] = data.processed.max[i];
     }
+    renderTimeDomain(tAxis, tInput, tOutput, [data.t0, data.t1]);
+    if (data.original.raw) renderSpectra(data.original.raw, data.processed.raw, data.sample_rate);
+    attachZoomListener();
+}
 
-    renderPlots(originalSlice, processedSlice, currentFileSampleRate, false);
+function attachZoomListener() {
+    const graph = document.getElementById('time-domain-graph');
+    if (!graph || typeof graph.on !== 'function' || graph.dataset.hasZoomListener === "true") return;
+    graph.on('plotly_relayout', (ev) => {
+        // zooming only drives file plots while nothing is playing
+        if (fileFrames === 0 || playbackRafId !== null) return;
+        if (ev['xaxis.range[0]'] !== undefined) {
+            requestFileRange('zoom', Math.max(0, ev['xaxis.range[0]']), Math.min(fileDuration, ev['xaxis.range[1]']));
+        } else if (ev['xaxis.autorange']) {
+            requestFileRange('zoom', 0, fileDuration);
+        }
+    });
+    graph.dataset.hasZoomListener = "true";
+}
+
+function updatePlotsForPlaybackTime(currentTime) {
+    if (fileFrames === 0) return;
+
+    // Latency compensation (~120ms ahead)
+    const LOOKAHEAD_SEC = 0.12; 
+    const windowSec = PLOT_WINDOW_SIZE / currentFileSampleRate;
+
+    // Clamp to end
+    const t1 = Math.min(currentTime + LOOKAHEAD_SEC, fileDuration);
+    requestFileRange('playback', t1 - windowSec, t1);
 }
 
 function attemptAttachAudioListeners() {
@@ -354,6 +396,71 @@ function attemptAttachAudioListeners() {
     playerOrig.dataset.hasListeners = "true";
 }
 
+// EBU R128 readout: live (type "loudness") or of the last rendered file
+function showLoudness(l) {
+    const status = document.getElementById('loudness-status');
+    if (!status) return;
+    const v = (x, unit) => x === null || x === undefined ? "--" : `${x.toFixed(1)} ${unit}`;
+    status.textContent = `M ${v(l.momentary, "LUFS")} | S ${v(l.short_term, "LUFS")} | I ${v(l.integrated, "LUFS")}`
+        + ` | LRA ${v(l.lra, "LU")} | TP ${v(l.true_peak, "dBTP")}`;
+}
+
+// tuner readout of the live input
+function showPitch(p) {
+    const status = document.getElementById('pitch-status');
+    if (!status) return;
+    if (p.frequency === null) {
+        status.textContent = "Tuner: --";
+        return;
+    }
+    const sign = p.cents >= 0 ? "+" : "";
+    status.textContent = `Tuner: ${p.note} ${sign}${p.cents.toFixed(1)} cents (${p.frequency.toFixed(1)} Hz, confidence ${p.confidence})`;
+}
+
+// --- SESSION RESUME ---
+// The backend keeps a dropped client's session (engine, chain, parked upload)
+// for a grace period; reconnecting with its token picks it up unchanged. If it
+// expired, the chain-shaping commands sent last are replayed to the new one.
+// The token is kept in sessionStorage so a page reload resumes the session too.
+const SESSION_TOKEN_KEY = 'audioSessionToken';
+let sessionToken = sessionStorage.getItem(SESSION_TOKEN_KEY);
+const REPLAYED_COMMANDS = ['set_latency_profile', 'build_chain', 'set_modulation'];
+const lastStateCommands = new Map();
+
+// slider moves only send update_param, so fold them into the stored build_chain
+// (a private copy) or a replay would bring back the values of the last rebuild
+function rememberStateCommand(c) {
+    if (c.command === 'update_param') {
+        const chain = lastStateCommands.get('build_chain');
+        const effect = chain && chain.config.find(eff => eff.effect_id === c.effect_id);
+        if (effect) effect.params[c.param] = c.value;
+    } else if (REPLAYED_COMMANDS.includes(c.command)) {
+        lastStateCommands.set(c.command, JSON.parse(JSON.stringify(c)));
+    }
+}
+
+function onSession(data) {
+    const reconnect = sessionToken !== null;
+    sessionToken = data.token;
+    sessionStorage.setItem(SESSION_TOKEN_KEY, sessionToken);
+    if (data.resumed) {
+        console.info("Session resumed", data.file ? `(file: ${data.file.duration.toFixed(1)} s)` : "");
+        // a render that finished while we were away sent its result to the old socket
+        if (renderPending && !data.rendering) {
+            sendCommand({ command: 'render_file', output_format: lastOutputFormat });
+        }
+    } else if (reconnect) {
+        console.info("Session expired, restoring the chain");
+        REPLAYED_COMMANDS.forEach(name => {
+            if (!lastStateCommands.has(name)) return;
+            // a new session starts a new sequence: stamp the replay afresh
+            const replay = Object.assign({}, lastStateCommands.get(name));
+            delete replay.seq;
+            sendRaw(replay);
+        });
+    }
+}
+
 function connectWebSocket() {
     let backendUrl;
     if (window.location.hostname === "127.0.0.1" || window.location.hostname === "localhost") {
@@ -365,26 +472,75 @@ function connectWebSocket() {
         console.log("Environment: CLOUD");
         backendUrl = "wss://audio-backend-2ypn.onrender.com"; 
     }
+    if (sessionToken) backendUrl += `/?session=${encodeURIComponent(sessionToken)}`;
     console.log("Connecting to:", backendUrl);
     ws = new WebSocket(backendUrl);
-    ws.onopen = (event) => { console.log("Connected"); attemptAttachAudioListeners(); };
+    ws.onopen = (event) => { console.log("Connected"); attemptAttachAudioListeners(); reportPlotFlow(true); rangeInFlight = false; };
     ws.onmessage = (event) => {
         const data = JSON.parse(event.data);
-        if (data.type === "plot_data") {
+        if (data.type === "session") {
+            onSession(data);
+        } else if (data.type === "plot_data") {
+            const t0 = performance.now();
             pushToRingBuffer(rtInputBuffer, data.input);
             pushToRingBuffer(rtOutputBuffer, data.output);
             renderPlots(rtInputBuffer, rtOutputBuffer, data.sample_rate, true);
+            plotFrameRendered(data.frame, performance.now() - t0);
+        } else if (data.type === "latency") {
+            const status = document.getElementById('latency-status');
+            if (status) {
+                const rtt = data.round_trip_ms === null ? "n/a" : `${data.round_trip_ms} ms`;
+                status.textContent = `${data.profile}${data.adaptive ? " (adaptive)" : ""}: ${data.blocksize} frames, round trip ${rtt}`;
+            }
+        } else if (data.type === "pitch") {
+            showPitch(data);
+        } else if (data.type === "loudness") {
+            showLoudness(data);
+        } else if (data.type === "metrics") {
+            window.audioMetrics = data;
+        } else if (data.type === "waveform_range") {
+            rangeInFlight = false;
+            renderFileRange(data);
+            sendPendingRange();
+        } else if (data.type === "spectrogram_tile") {
+            storeSpectrogramTile(data);
+        } else if (data.type === "render_progress") {
+            const label = document.getElementById('processing-progress');
+            if (label) label.textContent = `Processing... ${Math.round(100 * data.progress)}%`;
+        } else if (data.type === "render_cancelled") {
+            // superseded or chain_changed: a newer render of the same upload is
+            // already queued by the backend; anything else ends the wait
+            if (data.reason !== "superseded" && data.reason !== "chain_changed") {
+                console.warn("Render cancelled:", data.reason);
+                renderPending = false;
+                const label = document.getElementById('processing-progress');
+                if (label) label.textContent = "Processing...";
+                const resetButton = document.getElementById('loading-state-reset-trigger');
+                if (resetButton) resetButton.click();
+            }
         } else if (data.type === "file_processed") {
-            fullAudioOriginal = data.original_samples;
-            fullAudioProcessed = data.processed_samples;
+            renderPending = false;
+            const label = document.getElementById('processing-progress');
+            if (label) label.textContent = "Processing...";
+            fileFrames = data.frames;
+            fileDuration = data.duration;
             currentFileSampleRate = data.sample_rate;
-            window.audioB64Original = data.original_b64;
+            if (data.original_b64) window.audioB64Original = data.original_b64;
+            if (data.trace) {
+                console.table(data.trace.summary);
+                console.info("Render trace written to", data.trace.file);
+            }
+            if (data.loudness) showLoudness(data.loudness);
             window.audioB64Processed = data.processed_b64;
             const playerOrig = document.getElementById('player-original');
             const playerProc = document.getElementById('player-processed');
-            if (playerOrig) playerOrig.src = data.original_b64;
+            if (playerOrig) playerOrig.src = window.audioB64Original;
             if (playerProc) playerProc.src = data.processed_b64;
             updatePlotsForPlaybackTime(0);
+            if (data.spectrogram) {
+                spectro = { renderId: data.render_id, meta: data.spectrogram, tiles: new Map(), view: null };
+                showSpectrogram(0, fileDuration);
+            }
             const resetButton = document.getElementById('loading-state-reset-trigger');
             if (resetButton) resetButton.click();
         }
@@ -393,6 +549,202 @@ function connectWebSocket() {
     ws.onerror = (e) => console.error(e);
 }
 window.addEventListener('load', connectWebSocket);
+
+// --- FILE SPECTROGRAM ---
+// The backend keeps uint8 dB tiles (TILE columns x bins) of each render at
+// power-of-two time zoom levels; we fetch the tiles covering the view at the
+// level closest to one column per pixel and draw original/processed heatmaps.
+const SPECTRO_MAX_TILES = 256;
+const SPECTRO_SIGNALS = ['original', 'processed'];
+let spectro = null;
+let spectroRenderScheduled = false;
+
+function showSpectrogram(t0, t1) {
+    if (spectro === null) return;
+    const meta = spectro.meta;
+    const el = document.getElementById('spectrogram-graph');
+    const maxCols = el && el.clientWidth ? el.clientWidth : 1000;
+
+    const colDt0 = meta.hop / meta.sample_rate;
+    const wanted = Math.ceil(Math.log2(Math.max(1, (t1 - t0) / colDt0 / maxCols)));
+    const level = Math.max(0, Math.min(meta.levels.length - 1, wanted));
+    const colDt = colDt0 * Math.pow(2, level);
+    const c0 = Math.max(0, Math.floor(t0 / colDt));
+    const c1 = Math.max(c0 + 1, Math.min(meta.levels[level], Math.ceil(t1 / colDt)));
+    spectro.view = { t0: t0, t1: t1, level: level, i0: Math.floor(c0 / meta.tile_frames), i1: Math.floor((c1 - 1) / meta.tile_frames) };
+
+    for (const signal of SPECTRO_SIGNALS) {
+        for (let i = spectro.view.i0; i <= spectro.view.i1; i++) {
+            const key = `${signal}|${level}|${i}`;
+            if (spectro.tiles.has(key)) continue;
+            spectro.tiles.set(key, null);  // requested
+            sendRaw({ command: 'spectrogram_tile', render_id: spectro.renderId, signal: signal, level: level, index: i });
+        }
+    }
+    // keep the client cache bounded, oldest tiles outside the view first
+    for (const key of spectro.tiles.keys()) {
+        if (spectro.tiles.size <= SPECTRO_MAX_TILES) break;
+        const [, lvl, idx] = key.split('|').map(Number);
+        if (lvl === level && idx >= spectro.view.i0 && idx <= spectro.view.i1) continue;
+        spectro.tiles.delete(key);
+    }
+    scheduleSpectrogramRender();
+}
+
+function storeSpectrogramTile(data) {
+    if (spectro === null || data.render_id !== spectro.renderId) return;
+    const raw = atob(data.data);
+    const bytes = new Uint8Array(raw.length);
+    for (let i = 0; i < raw.length; i++) bytes[i] = raw.charCodeAt(i);
+    spectro.tiles.set(`${data.signal}|${data.level}|${data.index}`, { t_start: data.t_start, dt: data.dt, frames: data.frames, bins: data.bins, bytes: bytes });
+    scheduleSpectrogramRender();
+}
+
+function scheduleSpectrogramRender() {
+    if (spectroRenderScheduled) return;
+    spectroRenderScheduled = true;
+    requestAnimationFrame(() => { spectroRenderScheduled = false; renderSpectrogram(); });
+}
+
+function spectrogramTrace(signal, yaxis) {
+    // bins are pooled in pairs (max) to halve the cells Plotly has to draw
+    const view = spectro.view;
+    const rows = spectro.meta.bins / 2;
+    const x = [];
+    const z = Array.from({ length: rows }, () => []);
+    for (let i = view.i0; i <= view.i1; i++) {
+        const tile = spectro.tiles.get(`${signal}|${view.level}|${i}`);
+        if (!tile) continue;
+        for (let c = 0; c < tile.frames; c++) {
+            x.push(tile.t_start + c * tile.dt);
+            const base = c * tile.bins;
+            for (let r = 0; r < rows; r++) {
+                z[r].push(Math.max(tile.bytes[base + 2 * r], tile.bytes[base + 2 * r + 1]));
+            }
+        }
+    }
+    const binHz = 2 * spectro.meta.sample_rate / spectro.meta.n_fft;
+    return {
+        x: x, y: Array.from({ length: rows }, (_, r) => r * binHz), z: z,
+        type: 'heatmap', colorscale: 'Viridis', zmin: 0, zmax: 255,
+        showscale: false, hoverinfo: 'none', name: signal === 'original' ? 'Original' : 'Processed',
+        yaxis: yaxis
+    };
+}
+
+function renderSpectrogram() {
+    if (typeof Plotly === 'undefined' || spectro === null || spectro.view === null) return;
+    Plotly.react('spectrogram-graph', [spectrogramTrace('original', 'y'), spectrogramTrace('processed', 'y2')], {
+        ...COMMON_LAYOUT,
+        title: { text: 'Spectrogram (original / processed)', font: {size: 18}, x: 0, xanchor: 'left' },
+        showlegend: false,
+        xaxis: { ...COMMON_LAYOUT.xaxis, range: [spectro.view.t0, spectro.view.t1], title: { text: 'Time (s)', font: { size: 12 } } },
+        yaxis: { ...COMMON_LAYOUT.yaxis, domain: [0.52, 1], title: { text: 'Hz', font: { size: 12 } } },
+        yaxis2: { ...COMMON_LAYOUT.yaxis, domain: [0, 0.48], title: { text: 'Hz', font: { size: 12 } } }
+    });
+
+    const graph = document.getElementById('spectrogram-graph');
+    if (graph && typeof graph.on === 'function' && graph.dataset.hasZoomListener !== "true") {
+        graph.on('plotly_relayout', (ev) => {
+            if (spectro === null) return;
+            if (ev['xaxis.range[0]'] !== undefined) {
+                showSpectrogram(Math.max(0, ev['xaxis.range[0]']), Math.min(fileDuration, ev['xaxis.range[1]']));
+            } else if (ev['xaxis.autorange']) {
+                showSpectrogram(0, fileDuration);
+            }
+        });
+        graph.dataset.hasZoomListener = "true";
+    }
+}
+
+// --- COMMAND SEQUENCING / BATCHING ---
+// Commands get an increasing seq when the UI action creates them (sendCommand),
+// everything else when it is sent, so the backend can drop stale ones.
+// update_param bursts (slider drags) are coalesced per effect/param and sent
+// as one batch per animation frame; any other command flushes them first.
+let commandSeq = 0;
+let pendingParams = new Map();
+let paramFlushScheduled = false;
+// newest value sent per effect|param
+const latestParams = new Map();
+
+function sendRaw(message) {
+    if (!ws || ws.readyState !== 1) return;
+    if (message.seq === undefined) message.seq = ++commandSeq;
+    ws.send(JSON.stringify(message));
+}
+
+function flushParams() {
+    paramFlushScheduled = false;
+    if (pendingParams.size === 0) return;
+    const commands = Array.from(pendingParams.values());
+    pendingParams = new Map();
+    // members of a batch keep their own seq
+    sendRaw(commands.length === 1 ? commands[0] : { command: 'batch', commands: commands });
+}
+
+// build_chain configs come back from a Dash server round trip; slider moves
+// made meanwhile are newer than the config and win
+function withLatestParams(c) {
+    const config = c.config.map(eff => Object.assign({}, eff, { params: Object.assign({}, eff.params) }));
+    latestParams.forEach((value, key) => {
+        const [effectId, param] = key.split('|');
+        const effect = config.find(eff => eff.effect_id === effectId);
+        if (effect) effect.params[param] = value;
+    });
+    return Object.assign({}, c, { config: config });
+}
+
+let lastOutputFormat = undefined;
+// a process_file/render_file was sent and its file_processed has not arrived yet
+let renderPending = false;
+
+function sendCommand(c) {
+    c = Object.assign({}, c, { seq: ++commandSeq });
+    if (c.command === 'process_file') lastOutputFormat = c.output_format;
+    if (c.command === 'process_file' || c.command === 'render_file') renderPending = true;
+    if (c.command === 'build_chain') c = withLatestParams(c);
+    rememberStateCommand(c);
+    if (c.command === 'update_param') {
+        latestParams.set(`${c.effect_id}|${c.param}`, c.value);
+        pendingParams.set(`${c.effect_id}|${c.param}`, c);
+        if (!paramFlushScheduled) {
+            paramFlushScheduled = true;
+            requestAnimationFrame(flushParams);
+        }
+        return;
+    }
+    flushParams();
+    sendRaw(c);
+}
+
 window.dash_clientside = Object.assign({}, window.dash_clientside, {
-    ws_sender: { send_command: (c) => ws && ws.readyState === 1 && ws.send(JSON.stringify(c)) }
+    ws_sender: { send_command: sendCommand }
 });
+
+
+// --- PLOT FLOW CONTROL ---
+// Every plot_data frame is acked after it has been drawn; the backend keeps
+// only a couple of frames in flight and drops the rest. The requested fps
+// follows how long a render actually takes, and hidden tabs get nothing.
+const PLOT_MAX_FPS = 30;
+const PLOT_MIN_FPS = 5;
+let plotRenderMs = 0;
+let plotRequestedFps = null;
+
+function reportPlotFlow(force) {
+    const budget = plotRenderMs > 0 ? 1000 / (2 * plotRenderMs) : PLOT_MAX_FPS;
+    const fps = Math.max(PLOT_MIN_FPS, Math.min(PLOT_MAX_FPS, Math.floor(budget)));
+    // small hysteresis so render-time jitter does not turn into a message per frame
+    if (!force && plotRequestedFps !== null && Math.abs(fps - plotRequestedFps) < 3) return;
+    plotRequestedFps = fps;
+    sendRaw({ command: 'plot_flow', visible: !document.hidden, fps: fps });
+}
+
+function plotFrameRendered(frame, elapsedMs) {
+    plotRenderMs = plotRenderMs === 0 ? elapsedMs : 0.9 * plotRenderMs + 0.1 * elapsedMs;
+    if (frame !== undefined) sendRaw({ command: 'plot_ack', frame: frame });
+    reportPlotFlow(false);
+}
+
+document.addEventListener('visibilitychange', () => reportPlotFlow(true));
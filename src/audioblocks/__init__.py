@@ -1,8 +1,25 @@
+from .resample import PolyphaseResampler, SampleRateConverter, design_polyphase
+from .spsc import SPSCRing
+from .trace import Tracer, TraceSession, TRACER
+from .denormal import flush_denormal, enable_ftz, denormals_flushed, DENORMAL_FLOOR
+from .ring import ring_size, make_ring, ring_tap, ring_push, cubic_interp, ring_read_linear, ring_read_cubic, ring_read_allpass, ring_delay_block, ring_write_block, ring_read_block
+from .params import ParamStore, RAMP_LINEAR, RAMP_EXP, ramp_next, ramp_kernel, mix_ramped_kernel, effective_target, step_param, ramp_param
+from .modulation import LFO, EnvelopeFollower, ModulationMatrix, LFO_SHAPES, make_source
+from .metrics import AudioMetrics, metrics_to_text
+from .compiler import CompiledChain, FusedRun
 from .core import SmoothParam, EffectsChain, pick_devices, Effect, PlotDataTap
 from .delay import StereoDelayEffect
 from .reverb import ReverbEffect
-from .engine import AudioEngine, SAMPLE_RATE
 from .gate import NoiseGateEffect
 from .spectral import SpectralFilter
 from .octaver import OctaverEffect
 from .filter import FilterEffect
+from .chorus import ModulatedDelayEffect, ChorusEffect, FlangerEffect
+from .dynamics import CompressorEffect, LimiterEffect, sliding_max_push, make_sliding_max
+from .loudness import LoudnessMeter, LoudnessTap, measure_loudness, k_weighting
+from .pitch import PitchTracker, yin_cmnd, yin_pick, frequency_to_note
+from .offline import plan_segments, stitch_segments
+from .waveform import WaveformPyramid
+from .spectrogram import SpectrogramTiles, stft_db_u8
+from .simstream import SimulatedStream, WavSource, ToneSource, ControlLoad, run_harness
+from .engine import AudioEngine, SAMPLE_RATE, OUTPUT_CODECS, DEFAULT_CODEC, encode_audio, LATENCY_PROFILES, DEFAULT_LATENCY_PROFILE, EFFECT_TYPES, create_effect, build_modulation, build_file_chain, render_file_segment
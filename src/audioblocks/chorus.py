@@ -0,0 +1,192 @@
+from __future__ import annotations
+import math
+import numpy as np
+import numba
+
+import audioblocks as ab
+
+
+LFO_TABLE_SIZE = 2048  # one cycle; the table has a guard point for interpolation
+MAX_VOICES = 4
+MS_SLEW_PER_S = 40.0   # delay/depth smoothing, ms per second
+MIN_DELAY_SAMPLES = 3.0  # the cubic read needs two written samples past the tap
+
+
+def lfo_table(shape: str) -> np.ndarray:
+    """One bipolar LFO cycle (+ guard point) as float64, read with linear interpolation."""
+    p = np.arange(LFO_TABLE_SIZE + 1, dtype=np.float64) / LFO_TABLE_SIZE
+    if shape == 'triangle':
+        return 1.0 - 4.0 * np.abs(((p + 0.25) % 1.0) - 0.5)
+    return np.sin(2.0 * np.pi * p)
+
+
+_TABLES = {'sine': lfo_table('sine'), 'triangle': lfo_table('triangle')}
+
+
+# -------------------- Kernels --------------------
+
+@numba.njit(cache=True, fastmath=True)
+def modulated_delay_kernel(x_in, out, bufs, w, table, phase, inc, voices, spread,
+                           base, depth, feedback, mix_gain):
+    """
+    x_in, out: (N, C); bufs: (C, 2**k) rings, one per channel.
+    Every channel runs 'voices' taps whose delays (samples) sweep over
+    [base, base + depth] following the wavetable LFO; voice v is offset by v / voices
+    of a cycle and channel c by c * spread / 2 (spread 1 puts L and R in antiphase).
+    The averaged taps are fed back with 'feedback' and mixed per sample by mix_gain.
+    Returns the new write position and LFO phase.
+    """
+    N = x_in.shape[0]
+    C = x_in.shape[1]
+    mask = bufs.shape[1] - 1
+    tsize = table.shape[0] - 1
+    inv_v = 1.0 / voices
+    for n in range(N):
+        for c in range(C):
+            buf = bufs[c]
+            acc = 0.0
+            for v in range(voices):
+                p = phase + v * inv_v + c * spread * 0.5
+                p -= math.floor(p)
+                t = p * tsize
+                k = int(t)
+                lfo = table[k] + (t - k) * (table[k + 1] - table[k])
+                acc += ab.ring_read_cubic(buf, w, base + depth * (0.5 + 0.5 * lfo))
+            wet = acc * inv_v
+            x = x_in[n, c]
+            buf[w] = ab.flush_denormal(x + feedback * wet)
+            out[n, c] = x + (wet - x) * mix_gain[n]
+        w = (w + 1) & mask
+        phase += inc
+        if phase >= 1.0:
+            phase -= 1.0
+    return w, phase
+
+
+@numba.njit(cache=True, fastmath=True)
+def modulated_delay_step(x_in, out, params, args):
+    """Fused form of ModulatedDelayEffect.process_into (see Effect.fused_step)."""
+    (i_rate, i_depth, i_delay, i_spread, i_fb, i_mix, mix_mode, mix_step, fs, ms_step,
+     min_delay, bufs, w, phase, voices, table, mix_gain) = args
+    rate = ab.step_param(params, i_rate, 0.05)
+    depth_ms = ab.step_param(params, i_depth, ms_step)
+    delay_ms = ab.step_param(params, i_delay, ms_step)
+    spread = ab.step_param(params, i_spread, 0.05)
+    feedback = ab.step_param(params, i_fb, 0.01)
+
+    n = x_in.shape[0]
+    base = max(delay_ms * fs / 1000.0, min_delay)
+    ab.ramp_param(params, i_mix, mix_gain[:n], mix_step, mix_mode)
+    w[0], phase[0] = modulated_delay_kernel(x_in, out, bufs, w[0], table, phase[0], rate / fs, voices[0],
+                                            spread, base, depth_ms * fs / 1000.0, feedback, mix_gain[:n])
+
+
+# -------------------- Effects --------------------
+
+class ModulatedDelayEffect(ab.Effect):
+    """
+    Per-channel fractional delay lines swept by a wavetable LFO: the shared
+    engine of ChorusEffect and FlangerEffect, which only differ in ranges and defaults.
+    """
+    # (lo, hi) ranges, overridden by the subclasses
+    DELAY_RANGE = (1.0, 40.0)
+    DEPTH_RANGE = (0.0, 10.0)
+    FEEDBACK_RANGE = (0.0, 0.0)
+
+    def __init__(self, rate_hz=0.8, depth_ms=3.0, delay_ms=15.0, voices=3, spread=0.5, feedback=0.0,
+                 mix=0.5, shape='sine', mix_ramp_ms=10.0):
+        self.rate_hz = ab.SmoothParam(rate_hz, 0.01, 10.0)
+        self.depth_ms = ab.SmoothParam(depth_ms, *self.DEPTH_RANGE)
+        self.delay_ms = ab.SmoothParam(delay_ms, *self.DELAY_RANGE)
+        self.spread = ab.SmoothParam(spread, 0.0, 1.0)
+        self.feedback = ab.SmoothParam(feedback, *self.FEEDBACK_RANGE)
+        self.mix = ab.SmoothParam(mix, 0.0, 1.0)
+        # voice count is structural (not smoothed); an array so a fused chain sees changes
+        self._voices = np.array([min(max(int(voices), 1), MAX_VOICES)], dtype=np.int64)
+        self._table = _TABLES.get(shape, _TABLES['sine'])
+
+        self._fs = 48000
+        self._mix_ramp_ms = float(mix_ramp_ms)
+        self._mix_step = 1e-3
+        self._ms_step = 0.1
+        self._mix_gain = np.empty(1, dtype=np.float32)
+        self._bufs = np.zeros((2, 2), dtype=np.float32)
+        self._w = np.zeros(1, dtype=np.int64)
+        self._phase = np.zeros(1, dtype=np.float64)
+
+    def set_rate_hz(self, v): self.rate_hz.set_target(v)
+    def set_depth_ms(self, v): self.depth_ms.set_target(v)
+    def set_delay_ms(self, v): self.delay_ms.set_target(v)
+    def set_spread(self, v): self.spread.set_target(v)
+    def set_feedback(self, v): self.feedback.set_target(v)
+    def set_mix(self, v): self.mix.set_target(v)
+    def set_voices(self, v): self._voices[0] = min(max(int(round(v)), 1), MAX_VOICES)
+
+    @property
+    def voices(self) -> int:
+        return int(self._voices[0])
+
+    def prepare(self, sample_rate: int, channels_in: int, channels_out: int, blocksize: int):
+        self._fs = sample_rate
+        self._mix_step = 1000.0 / (max(self._mix_ramp_ms, 1e-3) * sample_rate)
+        self._ms_step = MS_SLEW_PER_S * blocksize / sample_rate
+        self._mix_gain = np.empty(blocksize, dtype=np.float32)
+        # longest sweep + the cubic taps
+        longest = int(sample_rate * (self.DELAY_RANGE[1] + self.DEPTH_RANGE[1]) / 1000.0) + 4
+        self._bufs = np.zeros((channels_out, ab.ring_size(longest)), dtype=np.float32)
+        self._w[0] = 0
+
+    def memory_samples(self) -> int:
+        longest = int(self._fs * (self.delay_ms.target + self.depth_ms.target) / 1000.0) + 4
+        fb = abs(self.feedback.target)
+        # every pass through the loop is 'feedback' times quieter; count them down to -80 dB
+        repeats = 1 if fb <= 1e-4 else 1 + int(np.ceil(np.log(1e-4) / np.log(fb)))
+        return repeats * longest
+
+    def seek(self, frame: int) -> None:
+        # the LFO runs freely; put it where a render from frame 0 would have it
+        self._phase[0] = (frame * self.rate_hz.target / self._fs) % 1.0
+
+    def fused_step(self):
+        args = (self.rate_hz._idx, self.depth_ms._idx, self.delay_ms._idx, self.spread._idx, self.feedback._idx,
+                self.mix._idx, self.mix.mode, self._mix_step, float(self._fs), self._ms_step, MIN_DELAY_SAMPLES,
+                self._bufs, self._w, self._phase, self._voices, self._table, self._mix_gain)
+        return modulated_delay_step, args
+
+    def process_into(self, x_in: np.ndarray, out: np.ndarray) -> None:
+        rate = self.rate_hz.step_towards(0.05)
+        depth_ms = self.depth_ms.step_towards(self._ms_step)
+        delay_ms = self.delay_ms.step_towards(self._ms_step)
+        spread = self.spread.step_towards(0.05)
+        feedback = self.feedback.step_towards(0.01)
+
+        n = x_in.shape[0]
+        fs = self._fs
+        mix_gain = self._mix_gain[:n]
+        self.mix.ramp_into(mix_gain, self._mix_step)
+        with ab.TRACER.kernel("modulated_delay_kernel"):
+            self._w[0], self._phase[0] = modulated_delay_kernel(
+                x_in, out, self._bufs, self._w[0], self._table, self._phase[0], rate / fs, self.voices,
+                spread, max(delay_ms * fs / 1000.0, MIN_DELAY_SAMPLES), depth_ms * fs / 1000.0, feedback, mix_gain)
+
+
+class ChorusEffect(ModulatedDelayEffect):
+    """Several slowly swept voices around 10-30 ms, spread across the stereo field."""
+    DELAY_RANGE = (5.0, 40.0)
+    DEPTH_RANGE = (0.0, 10.0)
+    FEEDBACK_RANGE = (0.0, 0.5)
+
+    def __init__(self, rate_hz=0.8, depth_ms=3.0, delay_ms=15.0, voices=3, spread=0.5, feedback=0.0,
+                 mix=0.5, shape='sine', mix_ramp_ms=10.0):
+        super().__init__(rate_hz, depth_ms, delay_ms, voices, spread, feedback, mix, shape, mix_ramp_ms)
+
+
+class FlangerEffect(ModulatedDelayEffect):
+    """One short swept voice with feedback (negative feedback gives the hollow variant)."""
+    DELAY_RANGE = (0.1, 10.0)
+    DEPTH_RANGE = (0.0, 5.0)
+    FEEDBACK_RANGE = (-0.95, 0.95)
+
+    def __init__(self, rate_hz=0.25, depth_ms=2.0, delay_ms=1.0, voices=1, spread=0.25, feedback=0.5,
+                 mix=0.5, shape='triangle', mix_ramp_ms=10.0):
+        super().__init__(rate_hz, depth_ms, delay_ms, voices, spread, feedback, mix, shape, mix_ramp_ms)
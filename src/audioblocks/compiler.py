@@ -0,0 +1,96 @@
+from __future__ import annotations
+import numpy as np
+import numba
+
+
+# generated run functions, keyed by their tuple of step functions; numba then
+# keeps one specialisation per argument types, so re-planning a known topology
+# (e.g. after a blocksize change) does not compile anything
+_RUN_CACHE: dict[tuple, object] = {}
+
+
+def _generate_run(steps: tuple):
+    """
+    Source for one njit function calling every step in order. Steps ping-pong
+    between the chain buffers like the interpreted loop; with an even count the
+    first step writes into 'tmp' instead, so the result always lands in 'dst'.
+    """
+    fn = _RUN_CACHE.get(steps)
+    if fn is not None:
+        return fn
+
+    k = len(steps)
+    other = 'src' if k % 2 else 'tmp'
+    lines = ["def fused_run(src, dst, tmp, params, args):"]
+    prev = 'src'
+    for i in range(k):
+        # counted back from the last step, which writes dst
+        target = 'dst' if (k - 1 - i) % 2 == 0 else other
+        lines.append(f"    s{i}({prev}, {target}, params, args[{i}])")
+        prev = target
+    namespace = {f"s{i}": step for i, step in enumerate(steps)}
+    exec("\n".join(lines), namespace)
+    fn = numba.njit(fastmath=True)(namespace['fused_run'])
+    _RUN_CACHE[steps] = fn
+    return fn
+
+
+class FusedRun:
+    """Consecutive fusable effects of a chain, run by one generated function per block."""
+    def __init__(self, effects: list, first: int, params: tuple, tmp: np.ndarray):
+        self.first = first
+        self.count = len(effects)
+        specs = [e.fused_step() for e in effects]
+        self.steps = tuple(step for step, _ in specs)
+        self.args = tuple(args for _, args in specs)
+        self.params = params
+        self.tmp = tmp
+        self.fn = _generate_run(self.steps)
+        self.name = "fused[" + ",".join(type(e).__name__ for e in effects) + "]"
+
+    def compile(self, src: np.ndarray, dst: np.ndarray):
+        """Compiles (or finds) the specialisation for these argument types without running it."""
+        sig = tuple(numba.typeof(a) for a in (src, dst, self.tmp, self.params, self.args))
+        self.fn.compile(sig)
+
+    def process_into(self, x_in: np.ndarray, out: np.ndarray) -> None:
+        self.fn(x_in, out, self.tmp, self.params, self.args)
+
+
+class CompiledChain:
+    """
+    Execution plan for one topology of an EffectsChain: maximal runs of effects
+    with a fused_step() become one FusedRun; the rest (taps, FFT- or dict-based
+    effects) stay interpreted between them. 'columns' maps each stage to the
+    metrics column of its first effect.
+
+    Only valid for the chain generation it was built for: adding effects or
+    re-preparing them (blocksize change) swaps their state arrays.
+    """
+    def __init__(self, chain):
+        self.generation = chain.generation
+        self.stages: list = []
+        self.columns: list[int] = []
+        params = chain.params.arrays()
+        tmp = np.zeros_like(chain._bufA)
+
+        run: list = []
+        for j, eff in enumerate(chain.effects + [None]):
+            if eff is not None and eff.fused_step() is not None:
+                run.append(eff)
+                continue
+            if run:
+                self.stages.append(FusedRun(run, j - len(run), params, tmp))
+                self.columns.append(j - len(run))
+                run = []
+            if eff is not None:
+                self.stages.append(eff)
+                self.columns.append(j)
+
+        for stage in self.stages:
+            if isinstance(stage, FusedRun):
+                stage.compile(chain._bufA, chain._bufB)
+
+    @property
+    def fused_effects(self) -> int:
+        return sum(s.count for s in self.stages if isinstance(s, FusedRun))
@@ -1,7 +1,15 @@
 from __future__ import annotations
 import numpy as np
+import time
 import threading
-import queue
+
+from .resample import SampleRateConverter
+from .metrics import AudioMetrics
+from .spsc import SPSCRing
+from .params import ParamStore, SmoothParam
+from .modulation import ModulationMatrix
+from .compiler import CompiledChain, FusedRun
+from .trace import TRACER
 
 try:
     import sounddevice as sd
@@ -53,57 +61,71 @@ def pick_devices(ch_in=1, ch_out=2, in_hint=('usb','mic'), out_hint=('system',))
     return None, None
 
 
-class SmoothParam:
-    def __init__(self, value, lo=-np.inf, hi=np.inf):
-        self.current = float(value)
-        self.target = float(value)
-        self.lo = float(lo)
-        self.hi = float(hi)
-        self._lock = threading.Lock()
-
-    def set_target(self, v):
-        with self._lock:
-            self.target = min(max(float(v), self.lo), self.hi)
-
-    def nudge(self, dv):
-        with self._lock:
-            self.target = min(max(self.target + float(dv), self.lo), self.hi)
-
-    def step_towards(self, max_step=1.0):
-        if max_step < 0:
-            raise ValueError("max_step must be >= 0")
-        with self._lock:
-            delta = self.target - self.current
-            self.current += min(max(delta, -max_step), max_step)
-            return self.current
-
-
 class Effect:
     """Base effect: prepare() for (re)alloc, process_into() to write output."""
     def prepare(self, sample_rate: int, channels_in: int, channels_out: int, blocksize: int):
         pass
     def process_into(self, x_in: np.ndarray, out: np.ndarray) -> None:
         raise NotImplementedError
+    def memory_samples(self) -> int | None:
+        """
+        Frames of input after which the state no longer depends on anything older
+        (at the current targets). None means unbounded or unknown, which keeps
+        offline renders of the chain sequential.
+        """
+        return None
+    def latency_samples(self) -> int:
+        """Frames (at the chain rate) by which the output lags the input, e.g. a lookahead."""
+        return 0
+    def process_offline(self, x: np.ndarray) -> np.ndarray | None:
+        """
+        Optional whole-signal form for offline renders with static params: x is
+        (N, channels_out) at the chain rate, N a whole number of blocks. Returns
+        what process_into() would write block by block (up to float rounding),
+        continuing from and updating the same state. None runs the blocks instead.
+        """
+        return None
+    def seek(self, frame: int) -> None:
+        """Offline renders: the next block starts at this frame of the timeline (for free-running oscillators)."""
+        pass
+    def fused_step(self) -> tuple | None:
+        """
+        Optional compiled form for chain fusion: (step, args), where step is an njit
+        function step(x_in, out, params, args) doing what process_into does, params
+        is ParamStore.arrays() and args holds this effect's state arrays and param
+        indices. Only valid until the next prepare(). None keeps the effect interpreted.
+        """
+        return None
     
 
 class PlotDataTap(Effect):
     """
-    A transparent effect that copies audio blocks to a thread-safe queue.
-    This allows a separate thread (e.g., a GUI) to receive data for plotting
-    without interrupting the real-time audio callback.
+    A transparent effect that copies channel 0 of each block into one column of
+    a lock-free SPSC ring, so a separate thread (e.g., a GUI) can read it for
+    plotting without interrupting the real-time audio callback.
+
+    An input tap (begin=True) and an output tap (commit=True) share the ring, so
+    input and output frames of the same block are always published together.
     """
 
-    def __init__(self, data_queue: queue.Queue):
-        self.queue = data_queue
+    def __init__(self, ring: SPSCRing, column: int, begin: bool = False, commit: bool = False):
+        self.ring = ring
+        self.column = column
+        self.begin = begin
+        self.commit = commit
+
+    def memory_samples(self) -> int:
+        return 0
 
     def process_into(self, x_in: np.ndarray, out: np.ndarray) -> None:
         # transparent audio passthrough
         out[:] = x_in
-        # try to copy block into queue without blocking the audio thread
-        try:
-            self.queue.put_nowait(x_in.copy())
-        except queue.Full:
-            pass
+        # one copy into preallocated ring memory, never blocks or allocates
+        if self.begin:
+            self.ring.begin_write(x_in.shape[0])
+        self.ring.write_column(self.column, x_in[:, 0])
+        if self.commit:
+            self.ring.commit_write()
     
 
 class EffectsChain:
@@ -115,10 +137,104 @@ class EffectsChain:
         self.effects: list[Effect] = []
         self._bufA = np.zeros((blocksize, channels_out), dtype=np.float32)
         self._bufB = np.zeros((blocksize, channels_out), dtype=np.float32)
+        self._src: SampleRateConverter | None = None
+        self.metrics: AudioMetrics | None = None
+        # every SmoothParam of the chain lives in this one array block
+        self.params = ParamStore()
+        self.modulation: ModulationMatrix | None = None
+        # bumped whenever effects are added or re-prepared; a CompiledChain is
+        # only used while its generation matches
+        self.generation = 0
+        self._plan: CompiledChain | None = None
 
     def add(self, effect: Effect):
+        self.params.adopt(effect)
         effect.prepare(self.sr, self.ci, self.co, self.bs)
         self.effects.append(effect)
+        self.generation += 1
+
+    def set_modulation(self, matrix: ModulationMatrix | None):
+        """Installs LFO/envelope routes; built against self.params after all effects are added."""
+        if matrix is not None:
+            matrix.prepare(self.sr, self.bs)
+        self.modulation = matrix
+        if matrix is None:
+            self.params.mod.fill(0.0)
+
+    def set_io_rate(self, io_rate: int | None):
+        """
+        Feed/pull audio at io_rate while the effects keep running at self.sr and
+        self.bs. Resampling kernels are cached per rate ratio, so this is cheap
+        and never re-prepares the effects.
+        """
+        if io_rate is None or int(io_rate) == self.sr:
+            self._src = None
+        else:
+            self._src = SampleRateConverter(int(io_rate), self.sr, self.ci, self.co, self.bs)
+
+    @property
+    def io_rate(self) -> int:
+        return self.sr if self._src is None else self._src.io_rate
+
+    @property
+    def latency(self) -> int:
+        """Frames (at io_rate) between input and output: the SRC edges plus effect lookaheads."""
+        effects = sum(eff.latency_samples() for eff in self.effects)
+        if self._src is None:
+            return effects
+        return int(round(self._src.latency + effects * self._src.io_rate / self.sr))
+
+    def memory(self) -> int | None:
+        """
+        Longest declared memory of the effects, in frames at self.sr; None if any
+        effect (or an LFO/envelope route) cannot bound it.
+        """
+        if self.modulation is not None and self.modulation.sources:
+            return None
+        total = 0
+        for eff in self.effects:
+            m = eff.memory_samples()
+            if m is None:
+                return None
+            # the chain is serial, so memories add up
+            total += int(m)
+        return total
+
+    def seek(self, frame: int):
+        for eff in self.effects:
+            eff.seek(frame)
+
+    def static(self) -> bool:
+        """No LFO/envelope routes and every param already on its target: nothing changes over time."""
+        if self.modulation is not None and self.modulation.sources:
+            return False
+        return self.params.settled()
+
+    @property
+    def compiled(self) -> bool:
+        plan = self._plan
+        return plan is not None and plan.generation == self.generation
+
+    def compile(self) -> bool:
+        """
+        Builds and installs a fused plan for the current topology. Blocking (numba
+        compiles the generated functions), so live chains use compile_async().
+        Returns False if the topology changed meanwhile.
+        """
+        plan = CompiledChain(self)
+        if plan.generation != self.generation:
+            return False
+        self._plan = plan
+        return True
+
+    def compile_async(self):
+        """compile() on a background thread; the interpreted chain runs until the plan is installed."""
+        def work():
+            try:
+                self.compile()
+            except Exception as e:
+                print(f"Warning: chain compilation failed, staying interpreted: {e}")
+        threading.Thread(target=work, name="chain-compiler", daemon=True).start()
 
     def _ensure_blocksize(self, frames: int):
         if frames != self.bs:
@@ -127,6 +243,14 @@ class EffectsChain:
             self._bufB = np.zeros((frames, self.co), dtype=np.float32)
             for e in self.effects:
                 e.prepare(self.sr, self.ci, self.co, frames)
+            if self.modulation is not None:
+                self.modulation.prepare(self.sr, frames)
+            # the fused plan holds the old state arrays; re-plan (already compiled
+            # topologies are cached, so this is quick)
+            self.generation += 1
+            if self._plan is not None:
+                self._plan = None
+                self.compile_async()
 
     def warmup(self):
         frames = self.bs
@@ -140,22 +264,132 @@ class EffectsChain:
         in_block: (frames, ci) float32
         out_block: (frames, co) float32
         """
-        frames = in_block.shape[0]
-        self._ensure_blocksize(frames)
+        with TRACER.span("EffectsChain.process", "chain"):
+            if self._src is not None:
+                # effects always see (self.bs, co) blocks at self.sr
+                self._src.process(in_block, out_block, self._process_block)
+                return
 
-        # Start signal in bufA (simple mapping mono->stereo or copy)
+            frames = in_block.shape[0]
+            self._ensure_blocksize(frames)
+            self._process_block(in_block, out_block)
+
+    def render(self, in_audio: np.ndarray, out_audio: np.ndarray, start_frame: int = 0, progress=None,
+               offline: bool = True) -> bool:
+        """
+        Offline helper: streams a whole signal through the chain in blocks of
+        self.bs frames, compensating the latency (SRC edges, lookaheads).
+        start_frame is where in_audio begins on the internal-rate timeline
+        (non-zero when rendering one segment of a longer file).
+        progress(done, total) is called after every block; if it returns False
+        the render stops, out_audio is left incomplete and False is returned.
+        With offline=True a static chain takes the whole-signal path instead
+        (see render_offline).
+        """
+        self.seek(start_frame)
+        n = in_audio.shape[0]
+        lat = self.latency
+        bs = self.bs
+        padded = np.zeros((n + lat + bs, self.ci), dtype=np.float32)
+        padded[:n] = in_audio
+        if offline and self.static():
+            return self.render_offline(padded, out_audio, progress)
+        rendered = np.zeros((n + lat + bs, self.co), dtype=np.float32)
+        for start in range(0, n + lat, bs):
+            self.process(padded[start:start + bs], rendered[start:start + bs])
+            if progress is not None and not progress(min(start + bs, n + lat), n + lat):
+                return False
+        out_audio[:] = rendered[lat:lat + n]
+        return True
+
+    def render_offline(self, padded: np.ndarray, out_audio: np.ndarray, progress=None) -> bool:
+        """
+        render() of a static chain on the whole signal at once: one resampler
+        call per edge, and per effect its process_offline() (or its blocks, for
+        effects without one) over the complete internal-rate signal. The blocks
+        fall on the same frames as in the streamed render, so the output matches
+        it up to float rounding. padded is the input with latency + self.bs zeros
+        appended; progress counts effects instead of blocks.
+        """
+        n = out_audio.shape[0]
+        lat = self.latency
+        with TRACER.span("EffectsChain.render_offline", "chain"):
+            if self._src is None:
+                x = padded[:padded.shape[0] - padded.shape[0] % self.bs]
+            else:
+                x = self._src.convert_in(padded)
+            y = np.empty((x.shape[0], self.co), dtype=np.float32)
+            self._spread(x, y)
+            for i, eff in enumerate(self.effects):
+                with TRACER.span(type(eff).__name__ + ".process_offline", "effect"):
+                    z = eff.process_offline(y)
+                    if z is None:
+                        z = np.empty_like(y)
+                        for start in range(0, y.shape[0], self.bs):
+                            eff.process_into(y[start:start + self.bs], z[start:start + self.bs])
+                y = z
+                if progress is not None and not progress(i + 1, len(self.effects)):
+                    return False
+            if self._src is not None:
+                y = self._src.convert_out(y)
+        rendered = y[lat:lat + n]
+        out_audio[:rendered.shape[0]] = rendered
+        out_audio[rendered.shape[0]:] = 0.0
+        return True
+
+    def _spread(self, in_block: np.ndarray, buf: np.ndarray):
+        """Maps the input channels onto the chain's (simple mapping mono->stereo or copy)."""
         if self.ci == 1 and self.co == 2:
-            self._bufA[:, 0:1] = in_block[:, 0:1]
-            self._bufA[:, 1:2] = in_block[:, 0:1]
+            buf[:, 0:1] = in_block[:, 0:1]
+            buf[:, 1:2] = in_block[:, 0:1]
         else:
             ch = min(self.ci, self.co)
-            self._bufA[:, :ch] = in_block[:, :ch]
+            buf[:, :ch] = in_block[:, :ch]
             if self.co > ch:
-                self._bufA[:, ch:self.co] = 0.0
+                buf[:, ch:self.co] = 0.0
+
+    def _process_block(self, in_block: np.ndarray, out_block: np.ndarray):
+        # Start signal in bufA
+        self._spread(in_block, self._bufA)
+
+        # modulation sources see the chain input and set param offsets for this block
+        if self.modulation is not None:
+            self.modulation.process(self._bufA)
+
+        # fused runs and interpreted effects share the same ping-pong protocol
+        stages, columns = self.effects, None
+        plan = self._plan
+        if plan is not None and plan.generation == self.generation:
+            stages, columns = plan.stages, plan.columns
 
         src, dst = self._bufA, self._bufB
-        for eff in self.effects:
-            eff.process_into(src, dst)
-            src, dst = dst, src  # ping-pong
+        metrics = self.metrics
+        if TRACER.active:
+            # one span per stage instead of the metrics row while a trace is recorded
+            for eff in stages:
+                if isinstance(eff, FusedRun):
+                    span = TRACER.kernel(eff.name)
+                else:
+                    span = TRACER.span(type(eff).__name__ + ".process_into", "effect")
+                with span:
+                    eff.process_into(src, dst)
+                src, dst = dst, src  # ping-pong
+        elif metrics is None:
+            for eff in stages:
+                eff.process_into(src, dst)
+                src, dst = dst, src  # ping-pong
+        else:
+            row = metrics.next_block_row()
+            n_slots = row.shape[0]
+            if columns is not None:
+                # a fused run is timed as a whole, under its first effect
+                row.fill(0)
+            for j, eff in enumerate(stages):
+                col = j if columns is None else columns[j]
+                t0 = time.perf_counter_ns()
+                eff.process_into(src, dst)
+                if col < n_slots:
+                    row[col] = time.perf_counter_ns() - t0
+                src, dst = dst, src  # ping-pong
 
         out_block[:, :] = src  # final buffer
\ No newline at end of file
@@ -4,93 +4,206 @@ import numba
 
 import audioblocks as ab
 
+# offline renders evaluate the comb a delay period at a time from this many samples
+# of delay; shorter delays are quicker as one kernel call over the whole signal
+OFFLINE_PERIOD_MIN = 2048
+
 @numba.njit(cache=True, fastmath=True)
-def delay_kernel(buf, w, size, x_block, wet_out, dS, feedback):
+def delay_kernel(buf, w, x_block, wet_out, dS, feedback, fb_target, fb_step):
     """
-    buf: (size,) float32 ring buffer
+    buf: power-of-two float32 ring (see audioblocks.ring)
     x_block, wet_out: (N,1) float32
+    feedback ramps linearly towards fb_target by at most fb_step per sample
     """
     N = x_block.shape[0]
     for n in range(N):
-        r = (w - dS) % size
-        delayed = buf[r]
+        feedback = ab.ramp_next(feedback, fb_target, fb_step, ab.RAMP_LINEAR)
+        delayed = ab.ring_tap(buf, w, dS)
         wet_out[n, 0] = delayed
-        buf[w] = x_block[n, 0] + delayed * feedback
-        w += 1
-        if w == size:
-            w = 0
-    return w
+        w = ab.ring_push(buf, w, ab.flush_denormal(x_block[n, 0] + delayed * feedback))
+    return w, feedback
+
+@numba.njit(cache=True, inline='always')
+def delay_samples(fs, delay_ms, size):
+    dS = int(fs * delay_ms / 1000.0)
+    if dS >= size:
+        dS = size - 1
+    return dS
+
+
+@numba.njit(cache=True, fastmath=True)
+def delay_step(x_in, out, params, args):
+    """Fused form of StereoDelayEffect.process_into (see Effect.fused_step)."""
+    (i_delay, i_fb, i_dry, i_wet, dry_mode, wet_mode, fs, max_delay_ms, offset,
+     delay_step_ms, fb_step, mix_step, size, bufL, wL, bufR, wR, wetL, wetR, dry_gain, wet_gain) = args
+    dL_now = ab.step_param(params, i_delay, delay_step_ms)
+    dR_now = min(dL_now + offset[0], max_delay_ms - 1.0)
+    fb_now = params[0][i_fb]
+    fb_target = ab.effective_target(params, i_fb)
+
+    xL = x_in[:, 0:1]
+    xR = x_in[:, 1:2]
+    wL[0], _ = delay_kernel(bufL, wL[0], xL, wetL,
+                            delay_samples(fs, dL_now, size), fb_now, fb_target, fb_step)
+    wR[0], fb_end = delay_kernel(bufR, wR[0], xR, wetR,
+                                 delay_samples(fs, dR_now, size), fb_now, fb_target, fb_step)
+    params[0][i_fb] = fb_end
+
+    ab.ramp_param(params, i_dry, dry_gain, mix_step, dry_mode)
+    ab.ramp_param(params, i_wet, wet_gain, mix_step, wet_mode)
+    ab.mix_ramped_kernel(xL, wetL, out[:, 0:1], dry_gain, wet_gain)
+    ab.mix_ramped_kernel(xR, wetR, out[:, 1:2], dry_gain, wet_gain)
+
 
 class DelayLine:
     def __init__(self):
         self.fs = 48000
         self.size = 1
         self.buf = np.zeros(1, dtype=np.float32)
-        self.w = 0
+        # write index, an array so a fused chain can advance it in place
+        self._w = np.zeros(1, dtype=np.int64)
+
+    @property
+    def w(self) -> int:
+        return int(self._w[0])
 
     def configure(self, fs: int, max_delay_ms: float):
         self.fs = fs
+        # longest delay + 1; the ring itself is rounded up to a power of two
         self.size = int(fs * max_delay_ms / 1000.0) + 1
-        self.buf  = np.zeros(self.size, dtype=np.float32)
-        self.w = 0
+        self.buf  = ab.make_ring(self.size)
+        self._w[0] = 0
+
+    def process_into(self, x_block: np.ndarray, wet_out: np.ndarray, delay_ms: float,
+                     feedback: float, fb_target: float, fb_step: float) -> float:
+        dS = delay_samples(self.fs, delay_ms, self.size)
+        with ab.TRACER.kernel("delay_kernel"):
+            self._w[0], feedback = delay_kernel(self.buf, self._w[0], x_block, wet_out, dS, feedback, fb_target, fb_step)
+        return feedback
 
-    def process_into(self, x_block: np.ndarray, wet_out: np.ndarray, delay_ms: float, feedback: float):
-        dS = int(self.fs * delay_ms / 1000.0)
-        if dS >= self.size:
-            dS = self.size - 1
-        self.w = delay_kernel(self.buf, self.w, self.size, x_block, wet_out, dS, feedback)
+    def process_offline(self, x: np.ndarray, delay_ms: float, feedback: float) -> np.ndarray:
+        """
+        Whole-signal process_into() at a fixed delay and feedback: the ring holds
+        v[n] = x[n] + feedback * v[n - d] and the wet signal is v[n - d], so each
+        delay period of v is one vector op on the period before it.
+        """
+        dS = delay_samples(self.fs, delay_ms, self.size)
+        N = x.shape[0]
+        if dS < OFFLINE_PERIOD_MIN:
+            wet = np.empty((N, 1), dtype=np.float32)
+            self._w[0], _ = delay_kernel(self.buf, self._w[0], x, wet, dS, feedback, feedback, 0.0)
+            return wet
+        v = np.empty((dS + N, 1), dtype=np.float32)
+        ab.ring_read_block(self.buf, self._w[0], dS, v[:dS])
+        for start in range(0, N, dS):
+            stop = min(N, start + dS)
+            v[dS + start:dS + stop] = x[start:stop] + feedback * v[start:stop]
+        # leave the ring as if every sample had been pushed
+        keep = min(N, self.buf.shape[0])
+        w = (self._w[0] + N - keep) & (self.buf.shape[0] - 1)
+        self._w[0] = ab.ring_write_block(self.buf, w, v[dS + N - keep:])
+        return v[:N]
 
 class StereoDelayEffect(ab.Effect):
     """
     Mono-in/stereo-out delay (or stereo-through), independent L/R delay lines.
     Uses a small offset on R for width. Mix = dry + wet inside the effect.
     """
-    def __init__(self, max_delay_ms=1500.0, mix_dry=0.8, mix_wet=0.8, offset_ms=30.0, delay_ms=375.0, feedback=0.2, fb_step=0.02, step_samples=2.0):
+    def __init__(self, max_delay_ms=1500.0, mix_dry=0.8, mix_wet=0.8, offset_ms=30.0, delay_ms=375.0, feedback=0.2, fb_slew_per_s=4.0, step_samples=2.0, mix_ramp_ms=10.0):
         self.max_delay_ms = max_delay_ms
-        self.mix_dry = mix_dry
-        self.mix_wet = mix_wet
-        self.offset_ms = offset_ms
+        # not smoothed; kept in an array so a fused chain sees live changes
+        self._offset = np.array([offset_ms], dtype=np.float64)
 
         self.delay_ms = ab.SmoothParam(delay_ms, 1.0, max_delay_ms - 1.0)
         self.feedback = ab.SmoothParam(feedback, 0.0, 0.95)
+        self.mix_dry = ab.SmoothParam(mix_dry, 0.0, 1.0)
+        self.mix_wet = ab.SmoothParam(mix_wet, 0.0, 1.0)
         # smoothing config
-        self._fb_step = fb_step            # feedback step per block (unitless)
+        self._fb_slew = fb_slew_per_s      # max feedback change per second (per-sample ramp)
         self._step_samples = step_samples  # convert to ms in prepare()
+        self._mix_ramp_ms = mix_ramp_ms    # time for a full 0..1 mix sweep
 
         self._dlL = DelayLine()
         self._dlR = DelayLine()
         self._wetL = np.empty((1, 1), dtype=np.float32)
         self._wetR = np.empty((1, 1), dtype=np.float32)
+        self._dry_gain = np.empty(1, dtype=np.float32)
+        self._wet_gain = np.empty(1, dtype=np.float32)
         self._delay_step_ms = 0.1
+        self._fb_step_sample = 1e-4
+        self._mix_step = 1e-3
 
     def set_delay_ms(self, v: float): self.delay_ms.set_target(v)
     def nudge_delay_ms(self, dv: float): self.delay_ms.nudge(dv)
     def set_feedback(self, v: float): self.feedback.set_target(v)
-    def set_mix_dry(self, v: float): self.mix_dry = v
-    def set_mix_wet(self, v: float): self.mix_wet = v
+    def set_mix_dry(self, v: float): self.mix_dry.set_target(v)
+    def set_mix_wet(self, v: float): self.mix_wet.set_target(v)
     def set_offset_ms(self, v: float): self.offset_ms = v
 
+    @property
+    def offset_ms(self) -> float:
+        return float(self._offset[0])
+
+    @offset_ms.setter
+    def offset_ms(self, v: float):
+        self._offset[0] = v
+
+    def fused_step(self):
+        args = (self.delay_ms._idx, self.feedback._idx, self.mix_dry._idx, self.mix_wet._idx,
+                self.mix_dry.mode, self.mix_wet.mode, float(self._dlL.fs), float(self.max_delay_ms), self._offset,
+                self._delay_step_ms, self._fb_step_sample, self._mix_step, self._dlL.size,
+                self._dlL.buf, self._dlL._w, self._dlR.buf, self._dlR._w,
+                self._wetL, self._wetR, self._dry_gain, self._wet_gain)
+        return delay_step, args
+
     def prepare(self, sample_rate: int, channels_in: int, channels_out: int, blocksize: int):
         self._dlL.configure(sample_rate, self.max_delay_ms)
         self._dlR.configure(sample_rate, self.max_delay_ms)
         self._wetL = np.empty((blocksize, 1), dtype=np.float32)
         self._wetR = np.empty((blocksize, 1), dtype=np.float32)
+        self._dry_gain = np.empty(blocksize, dtype=np.float32)
+        self._wet_gain = np.empty(blocksize, dtype=np.float32)
         self._delay_step_ms = 1000.0 * (self._step_samples / sample_rate)
+        self._fb_step_sample = self._fb_slew / sample_rate
+        self._mix_step = 1000.0 / (max(self._mix_ramp_ms, 1e-3) * sample_rate)
+
+    def memory_samples(self) -> int:
+        # every echo is 'feedback' times quieter; count repeats down to -80 dB
+        longest = int(self._dlR.fs * min(self.delay_ms.target + self.offset_ms, self.max_delay_ms - 1.0) / 1000.0) + 1
+        fb = self.feedback.target
+        repeats = 1 if fb <= 1e-4 else 1 + int(np.ceil(np.log(1e-4) / np.log(fb)))
+        return repeats * longest
+
+    def process_offline(self, x: np.ndarray) -> np.ndarray | None:
+        # static params: every gain is constant, so the mix is plain array arithmetic
+        dL = self.delay_ms.current
+        dR = min(dL + self.offset_ms, self.max_delay_ms - 1.0)
+        fb = self.feedback.current
+        wetL = self._dlL.process_offline(x[:, 0:1], dL, fb)
+        wetR = self._dlR.process_offline(x[:, 1:2], dR, fb)
+        out = np.empty_like(x)
+        out[:, 0:1] = self.mix_dry.current * x[:, 0:1] + self.mix_wet.current * wetL
+        out[:, 1:2] = self.mix_dry.current * x[:, 1:2] + self.mix_wet.current * wetR
+        return np.clip(out, -1.0, 1.0, out=out)
 
     def process_into(self, x_in: np.ndarray, out: np.ndarray):
-        # smooth parameters
+        # smooth parameters (delay time per block, gains per sample)
         dL_now = self.delay_ms.step_towards(self._delay_step_ms)
-        fb_now = self.feedback.step_towards(self._fb_step)
         dR_now = min(dL_now + self.offset_ms, self.max_delay_ms - 1.0)
+        fb_now, fb_target = self.feedback.begin_ramp()
 
         # Expect x_in to be stereo in the chain; if mono duplicated, both columns are the same
         xL = x_in[:, 0:1]
         xR = x_in[:, 1:2]
 
-        self._dlL.process_into(xL, self._wetL, dL_now, fb_now)
-        self._dlR.process_into(xR, self._wetR, dR_now, fb_now)
+        # both sides ramp from the same start, so they end on the same value
+        self._dlL.process_into(xL, self._wetL, dL_now, fb_now, fb_target, self._fb_step_sample)
+        fb_end = self._dlR.process_into(xR, self._wetR, dR_now, fb_now, fb_target, self._fb_step_sample)
+        self.feedback.end_ramp(fb_end)
 
         # Mix and clip
-        out[:, 0:1] = self.mix_dry * xL + self.mix_wet * self._wetL
-        out[:, 1:2] = self.mix_dry * xR + self.mix_wet * self._wetR
-        np.clip(out, -1.0, 1.0, out=out)
\ No newline at end of file
+        self.mix_dry.ramp_into(self._dry_gain, self._mix_step)
+        self.mix_wet.ramp_into(self._wet_gain, self._mix_step)
+        with ab.TRACER.kernel("mix_ramped_kernel"):
+            ab.mix_ramped_kernel(xL, self._wetL, out[:, 0:1], self._dry_gain, self._wet_gain)
+            ab.mix_ramped_kernel(xR, self._wetR, out[:, 1:2], self._dry_gain, self._wet_gain)
\ No newline at end of file
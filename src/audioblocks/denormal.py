@@ -0,0 +1,166 @@
+from __future__ import annotations
+import time
+import platform
+import argparse
+import contextlib
+import numpy as np
+import numba
+from numba import types
+from numba.core import cgutils
+from numba.extending import intrinsic
+from llvmlite import ir
+
+
+# feedback state below this magnitude (-300 dB) is flushed to zero in the kernels,
+# long before float32 reaches its subnormal range (~1.2e-38)
+DENORMAL_FLOOR = 1e-15
+# MXCSR flush-to-zero (bit 15) and denormals-are-zero (bit 6)
+MXCSR_FTZ_DAZ = 0x8040
+_X86 = platform.machine().lower() in ('x86_64', 'amd64', 'x86', 'i386', 'i686')
+
+
+@numba.njit(cache=True, inline='always')
+def flush_denormal(x):
+    """x, or 0 when it is too small to matter (keeps decaying feedback out of subnormals)."""
+    return x if abs(x) > DENORMAL_FLOOR else 0.0
+
+
+@intrinsic
+def _mxcsr_update(typingctx, set_bits, clear_bits):
+    """Sets then clears bits of the calling thread's MXCSR; returns the previous value."""
+    sig = types.uint32(types.uint32, types.uint32)
+
+    def codegen(context, builder, signature, args):
+        i32 = ir.IntType(32)
+        i8p = ir.IntType(8).as_pointer()
+        fnty = ir.FunctionType(ir.VoidType(), [i8p])
+        stmxcsr = cgutils.get_or_insert_function(builder.module, fnty, "llvm.x86.sse.stmxcsr")
+        ldmxcsr = cgutils.get_or_insert_function(builder.module, fnty, "llvm.x86.sse.ldmxcsr")
+        slot = cgutils.alloca_once(builder, i32)
+        ptr = builder.bitcast(slot, i8p)
+        builder.call(stmxcsr, [ptr])
+        old = builder.load(slot)
+        builder.store(builder.and_(builder.or_(old, args[0]), builder.not_(args[1])), slot)
+        builder.call(ldmxcsr, [ptr])
+        return old
+
+    return sig, codegen
+
+
+def _compile_swap():
+    # compiled at import (from the cache after the first run): the first call must
+    # not stall an audio callback
+    @numba.njit("uint32(uint32, uint32)", cache=True)
+    def swap_mxcsr(set_bits, clear_bits):
+        return _mxcsr_update(set_bits, clear_bits)
+    return swap_mxcsr
+
+
+_swap_mxcsr = None
+if _X86:
+    try:
+        _swap_mxcsr = _compile_swap()
+    except Exception as e:
+        print(f"Warning: flush-to-zero unavailable, relying on in-kernel flushing: {e}")
+
+
+def _set_ftz(on: bool) -> int | None:
+    """Switches FTZ/DAZ for the calling thread; previous MXCSR, or None where unsupported."""
+    if _swap_mxcsr is None:
+        return None
+    bits = np.uint32(MXCSR_FTZ_DAZ)
+    zero = np.uint32(0)
+    try:
+        return int(_swap_mxcsr(bits, zero) if on else _swap_mxcsr(zero, bits))
+    except Exception as e:
+        print(f"Warning: cannot set flush-to-zero on this platform: {e}")
+        return None
+
+
+def enable_ftz() -> bool:
+    """
+    Flush-to-zero / denormals-are-zero for the calling thread only (MXCSR is
+    per thread), so call it from the audio callback or worker that runs the
+    kernels. Returns False where the platform does not allow it; the in-kernel
+    flush_denormal() still protects the feedback paths there.
+    """
+    return _set_ftz(True) is not None
+
+
+@contextlib.contextmanager
+def denormals_flushed():
+    """FTZ/DAZ for the duration of a block of work on this thread (e.g. an offline render)."""
+    old = _set_ftz(True)
+    try:
+        yield
+    finally:
+        if old is not None and not old & MXCSR_FTZ_DAZ:
+            _set_ftz(False)
+
+
+# -------------------- Benchmark --------------------
+
+# short decays, so the tails reach float32 subnormals (~ -760 dB) within a 10 s run
+TAIL_EFFECTS = {
+    'delay': {'feedback': 0.95, 'delay_ms': 5.0},
+    'reverb': {'rt60_s': 0.6, 'damp': 0.2},
+    'filter': {'filter_type': 0, 'cutoff_hz': 200.0, 'q': 8.0},
+}
+
+
+def benchmark_tail(effect_type: str, params: dict, tail_s: float = 10.0, ftz: bool = False,
+                   fs: int = 48000, blocksize: int = 1024) -> dict:
+    """
+    Feeds one effect a 0.5 s noise burst and then 'tail_s' seconds of silence;
+    returns the median per-block cost (us) during the burst and during the tail.
+    """
+    import audioblocks as ab
+
+    chain = ab.build_file_chain([{'type': effect_type, 'params': params}], [], fs)
+    rng = np.random.default_rng(0)
+    burst = int(0.5 * fs) // blocksize
+    tail = int(tail_s * fs) // blocksize
+    x = np.zeros((blocksize, 1), dtype=np.float32)
+    y = np.zeros((blocksize, chain.co), dtype=np.float32)
+
+    timings = np.zeros(burst + tail)
+    old = _set_ftz(ftz)
+    try:
+        for b in range(burst + tail):
+            if b < burst:
+                x[:, 0] = 0.5 * rng.standard_normal(blocksize)
+            else:
+                x.fill(0.0)
+            t0 = time.perf_counter_ns()
+            chain.process(x, y)
+            timings[b] = time.perf_counter_ns() - t0
+    finally:
+        if old is not None:
+            _set_ftz(bool(old & MXCSR_FTZ_DAZ))
+
+    # subnormals only last a second or two of the decay: also report the worst
+    # 1 s window (medians, so scheduler noise does not masquerade as a slow tail)
+    window = max(1, int(fs / blocksize))
+    tail_t = timings[burst:]
+    worst = max(np.median(tail_t[i:i + window]) for i in range(0, max(1, tail_t.shape[0] - window + 1), max(1, window // 4)))
+    return {
+        'effect': effect_type,
+        'ftz': ftz,
+        'burst_us': round(float(np.median(timings[:burst])) / 1e3, 2),
+        'tail_us': round(float(np.median(tail_t)) / 1e3, 2),
+        'tail_worst_s_us': round(float(worst) / 1e3, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-block cost of feedback effect tails, with and without FTZ.")
+    parser.add_argument('--tail-s', type=float, default=10.0)
+    parser.add_argument('--effects', nargs='*', default=list(TAIL_EFFECTS))
+    args = parser.parse_args(argv)
+    for name in args.effects:
+        for ftz in (False, True):
+            print(benchmark_tail(name, TAIL_EFFECTS[name], args.tail_s, ftz))
+
+
+if __name__ == "__main__":
+    main()
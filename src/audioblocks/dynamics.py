@@ -0,0 +1,300 @@
+from __future__ import annotations
+import math
+import numpy as np
+import numba
+
+import audioblocks as ab
+
+
+MAX_LOOKAHEAD_MS = 20.0  # limiter buffers are sized for this, so lookahead can change live
+DETECTOR_WINDOW_MS = 5.0  # compressor peak-hold window
+
+
+# -------------------- Sliding maximum --------------------
+# Monotonic deque over the last 'window' samples: values in the deque are
+# decreasing, so the front is the maximum. Every sample is pushed and popped at
+# most once, so the cost per sample is O(1) amortised whatever the window.
+# dq_val/dq_idx are power-of-two rings; st = [head, tail, t] (absolute counters).
+# A shrinking window takes effect at once; samples dropped under a shorter window
+# are gone, so a grown window is exact again once it has been refilled.
+
+def make_sliding_max(max_window: int):
+    """(dq_val, dq_idx, st) state for sliding_max_push with windows up to max_window."""
+    size = ab.ring_size(max_window + 1)
+    return np.zeros(size, dtype=np.float64), np.zeros(size, dtype=np.int64), np.zeros(3, dtype=np.int64)
+
+
+@numba.njit(cache=True, inline='always')
+def sliding_max_push(dq_val, dq_idx, st, v, window):
+    """Adds v as the newest sample; returns the maximum of the last 'window' samples."""
+    mask = dq_val.shape[0] - 1
+    head = st[0]
+    tail = st[1]
+    t = st[2]
+    while tail > head and dq_val[(tail - 1) & mask] <= v:
+        tail -= 1
+    dq_val[tail & mask] = v
+    dq_idx[tail & mask] = t
+    tail += 1
+    # 'while': the window may have shrunk since the last sample
+    while dq_idx[head & mask] <= t - window:
+        head += 1
+    st[0] = head
+    st[1] = tail
+    st[2] = t + 1
+    return dq_val[head & mask]
+
+
+@numba.njit(cache=True, inline='always')
+def time_coeff(time_ms, fs):
+    """One-pole smoothing coefficient for a time constant in ms."""
+    return 1.0 - math.exp(-1.0 / (max(time_ms, 1e-3) * 1e-3 * fs))
+
+
+@numba.njit(cache=True, inline='always')
+def soft_knee_gain_db(level_db, threshold_db, ratio, knee_db):
+    """Gain change (<= 0 dB) of a soft-knee compressor curve for an input level."""
+    over = level_db - threshold_db
+    if 2.0 * over <= -knee_db:
+        return 0.0
+    if 2.0 * abs(over) <= knee_db:
+        k = over + 0.5 * knee_db
+        return (1.0 / ratio - 1.0) * k * k / (2.0 * knee_db)
+    return (1.0 / ratio - 1.0) * over
+
+
+# -------------------- Kernels --------------------
+
+@numba.njit(cache=True, fastmath=True)
+def compressor_kernel(x_in, out, dq_val, dq_idx, st, window, gr_state,
+                      threshold_db, ratio, knee_db, att_coeff, rel_coeff, makeup_db):
+    """
+    Stereo-linked feed-forward compressor. Level = peak over the last 'window'
+    samples (sliding max), gain reduction smoothed in dB with attack/release.
+    gr_state: [current reduction dB, deepest reduction of this block]. No latency.
+    """
+    gr = gr_state[0]
+    deepest = 0.0
+    for n in range(x_in.shape[0]):
+        peak = 0.0
+        for c in range(x_in.shape[1]):
+            a = abs(x_in[n, c])
+            if a > peak:
+                peak = a
+        level = sliding_max_push(dq_val, dq_idx, st, peak, window)
+        target = soft_knee_gain_db(20.0 * math.log10(level + 1e-12), threshold_db, ratio, knee_db)
+        coeff = att_coeff if target < gr else rel_coeff
+        gr = ab.flush_denormal(gr + coeff * (target - gr))
+        if gr < deepest:
+            deepest = gr
+        g = 10.0 ** ((gr + makeup_db) / 20.0)
+        for c in range(out.shape[1]):
+            out[n, c] = x_in[n, c] * g
+    gr_state[0] = gr
+    gr_state[1] = deepest
+
+
+@numba.njit(cache=True, fastmath=True)
+def limiter_kernel(x_in, out, delay, w, dq_val, dq_idx, st, tgt, box, lookahead, gain_state,
+                   ceiling, rel_coeff):
+    """
+    Brickwall lookahead limiter, output delayed by 'lookahead' samples.
+    delay: (C, 2**k) audio rings; tgt: ring of per-window gain targets;
+    box: [running sum of the last L targets, L it was summed over].
+    The target at each input sample is ceiling / (peak of the next L = lookahead + 1
+    samples); averaging the last L targets gives a gain that reaches every peak's
+    target by the time the peak leaves the delay, with a smooth L-sample attack.
+    Release is a one-pole rise towards that gain. Returns the write position.
+    """
+    L = lookahead + 1
+    mask = delay.shape[1] - 1
+    tmask = tgt.shape[0] - 1
+    t0 = st[2]
+    # window changed (or first block): re-sum the targets over the new length
+    if box[1] != L:
+        s = 0.0
+        for j in range(L):
+            s += tgt[(t0 - 1 - j) & tmask] if t0 - 1 - j >= 0 else 1.0
+        box[0] = s
+        box[1] = L
+    total = box[0]
+    g = gain_state[0]
+    deepest = 1.0
+    for n in range(x_in.shape[0]):
+        peak = 0.0
+        for c in range(x_in.shape[1]):
+            a = abs(x_in[n, c])
+            if a > peak:
+                peak = a
+            delay[c, w] = x_in[n, c]
+        t = st[2]
+        level = sliding_max_push(dq_val, dq_idx, st, peak, L)
+        target = ceiling / level if level > ceiling else 1.0
+        old = tgt[(t - L) & tmask] if t - L >= 0 else 1.0
+        tgt[t & tmask] = target
+        total += target - old
+        smooth = total / L
+        if smooth > 1.0:
+            smooth = 1.0
+        g = smooth if smooth < g else g + rel_coeff * (smooth - g)
+        if g < deepest:
+            deepest = g
+        r = (w - lookahead) & mask
+        for c in range(out.shape[1]):
+            y = delay[c, r] * g
+            # rounding in the running sum must not let a sample through above the ceiling
+            if y > ceiling:
+                y = ceiling
+            elif y < -ceiling:
+                y = -ceiling
+            out[n, c] = y
+        w = (w + 1) & mask
+    box[0] = total
+    gain_state[0] = g
+    gain_state[1] = deepest
+    return w
+
+
+@numba.njit(cache=True, fastmath=True)
+def compressor_step(x_in, out, params, args):
+    """Fused form of CompressorEffect.process_into (see Effect.fused_step)."""
+    i_th, i_ratio, i_knee, i_att, i_rel, i_makeup, fs, dq_val, dq_idx, st, window, gr_state = args
+    th = ab.step_param(params, i_th, 1.0)
+    ratio = ab.step_param(params, i_ratio, 0.5)
+    knee = ab.step_param(params, i_knee, 1.0)
+    att = ab.step_param(params, i_att, 5.0)
+    rel = ab.step_param(params, i_rel, 10.0)
+    makeup = ab.step_param(params, i_makeup, 0.5)
+    compressor_kernel(x_in, out, dq_val, dq_idx, st, window, gr_state,
+                      th, ratio, knee, time_coeff(att, fs), time_coeff(rel, fs), makeup)
+
+
+@numba.njit(cache=True, fastmath=True)
+def limiter_step(x_in, out, params, args):
+    """Fused form of LimiterEffect.process_into (see Effect.fused_step)."""
+    i_ceiling, i_rel, fs, delay, w, dq_val, dq_idx, st, tgt, box, lookahead, gain_state = args
+    ceiling_db = ab.step_param(params, i_ceiling, 0.5)
+    rel = ab.step_param(params, i_rel, 10.0)
+    w[0] = limiter_kernel(x_in, out, delay, w[0], dq_val, dq_idx, st, tgt, box, lookahead[0], gain_state,
+                          10.0 ** (ceiling_db / 20.0), time_coeff(rel, fs))
+
+
+# -------------------- Effects --------------------
+
+class CompressorEffect(ab.Effect):
+    """Feed-forward, stereo-linked, soft-knee compressor with makeup gain."""
+    def __init__(self, threshold_db=-20.0, ratio=4.0, knee_db=6.0, attack_ms=10.0, release_ms=120.0, makeup_db=0.0):
+        self.threshold_db = ab.SmoothParam(threshold_db, -60.0, 0.0)
+        self.ratio = ab.SmoothParam(ratio, 1.0, 20.0)
+        self.knee_db = ab.SmoothParam(knee_db, 0.0, 24.0)
+        self.attack_ms = ab.SmoothParam(attack_ms, 0.1, 200.0)
+        self.release_ms = ab.SmoothParam(release_ms, 5.0, 2000.0)
+        self.makeup_db = ab.SmoothParam(makeup_db, 0.0, 24.0)
+
+        self._fs = 48000.0
+        self._window = 1
+        self._dq_val, self._dq_idx, self._st = make_sliding_max(1)
+        # [current gain reduction dB, deepest reduction of the last block]
+        self._gr = np.zeros(2, dtype=np.float64)
+
+    def set_threshold_db(self, v): self.threshold_db.set_target(v)
+    def set_ratio(self, v): self.ratio.set_target(v)
+    def set_knee_db(self, v): self.knee_db.set_target(v)
+    def set_attack_ms(self, v): self.attack_ms.set_target(v)
+    def set_release_ms(self, v): self.release_ms.set_target(v)
+    def set_makeup_db(self, v): self.makeup_db.set_target(v)
+
+    @property
+    def gain_reduction_db(self) -> float:
+        """Deepest gain reduction of the last block (<= 0)."""
+        return float(self._gr[1])
+
+    def prepare(self, sample_rate: int, channels_in: int, channels_out: int, blocksize: int):
+        self._fs = float(sample_rate)
+        self._window = max(1, int(sample_rate * DETECTOR_WINDOW_MS / 1000.0))
+        self._dq_val, self._dq_idx, self._st = make_sliding_max(self._window)
+
+    def memory_samples(self) -> int:
+        slowest_ms = max(self.attack_ms.target, self.release_ms.target)
+        return self._window + int(np.ceil(6.0 * slowest_ms * 1e-3 * self._fs))
+
+    def fused_step(self):
+        args = (self.threshold_db._idx, self.ratio._idx, self.knee_db._idx, self.attack_ms._idx,
+                self.release_ms._idx, self.makeup_db._idx, self._fs,
+                self._dq_val, self._dq_idx, self._st, self._window, self._gr)
+        return compressor_step, args
+
+    def process_into(self, x_in: np.ndarray, out: np.ndarray) -> None:
+        th = self.threshold_db.step_towards(1.0)
+        ratio = self.ratio.step_towards(0.5)
+        knee = self.knee_db.step_towards(1.0)
+        att = self.attack_ms.step_towards(5.0)
+        rel = self.release_ms.step_towards(10.0)
+        makeup = self.makeup_db.step_towards(0.5)
+        with ab.TRACER.kernel("compressor_kernel"):
+            compressor_kernel(x_in, out, self._dq_val, self._dq_idx, self._st, self._window, self._gr,
+                              th, ratio, knee, time_coeff(att, self._fs), time_coeff(rel, self._fs), makeup)
+
+
+class LimiterEffect(ab.Effect):
+    """
+    Brickwall lookahead limiter: no output sample exceeds the ceiling. Delays the
+    signal by the lookahead, which it reports through latency_samples().
+    """
+    def __init__(self, ceiling_db=-1.0, lookahead_ms=5.0, release_ms=80.0):
+        self.ceiling_db = ab.SmoothParam(ceiling_db, -24.0, 0.0)
+        self.release_ms = ab.SmoothParam(release_ms, 5.0, 2000.0)
+        self.lookahead_ms = min(max(float(lookahead_ms), 0.0), MAX_LOOKAHEAD_MS)
+
+        self._fs = 48000.0
+        # lookahead in samples, an array so a fused chain sees live changes
+        self._lookahead = np.zeros(1, dtype=np.int64)
+        self._delay = np.zeros((2, 2), dtype=np.float32)
+        self._w = np.zeros(1, dtype=np.int64)
+        self._dq_val, self._dq_idx, self._st = make_sliding_max(1)
+        self._tgt = np.ones(2, dtype=np.float64)
+        self._box = np.zeros(2, dtype=np.float64)
+        # [current gain, lowest gain of the last block]
+        self._gain = np.ones(2, dtype=np.float64)
+
+    def set_ceiling_db(self, v): self.ceiling_db.set_target(v)
+    def set_release_ms(self, v): self.release_ms.set_target(v)
+
+    def set_lookahead_ms(self, v):
+        self.lookahead_ms = min(max(float(v), 0.0), MAX_LOOKAHEAD_MS)
+        self._lookahead[0] = int(round(self._fs * self.lookahead_ms / 1000.0))
+
+    @property
+    def gain_reduction_db(self) -> float:
+        """Deepest gain reduction of the last block (<= 0)."""
+        return 20.0 * math.log10(max(float(self._gain[1]), 1e-6))
+
+    def latency_samples(self) -> int:
+        return int(self._lookahead[0])
+
+    def prepare(self, sample_rate: int, channels_in: int, channels_out: int, blocksize: int):
+        self._fs = float(sample_rate)
+        self._lookahead[0] = int(round(sample_rate * self.lookahead_ms / 1000.0))
+        longest = int(np.ceil(sample_rate * MAX_LOOKAHEAD_MS / 1000.0)) + 1
+        self._delay = np.zeros((channels_out, ab.ring_size(longest)), dtype=np.float32)
+        self._w[0] = 0
+        self._dq_val, self._dq_idx, self._st = make_sliding_max(longest)
+        self._tgt = np.ones(ab.ring_size(longest), dtype=np.float64)
+        self._box[:] = 0.0
+        self._gain[:] = 1.0
+
+    def memory_samples(self) -> int:
+        return 2 * (int(self._lookahead[0]) + 1) + int(np.ceil(6.0 * self.release_ms.target * 1e-3 * self._fs))
+
+    def fused_step(self):
+        args = (self.ceiling_db._idx, self.release_ms._idx, self._fs, self._delay, self._w,
+                self._dq_val, self._dq_idx, self._st, self._tgt, self._box, self._lookahead, self._gain)
+        return limiter_step, args
+
+    def process_into(self, x_in: np.ndarray, out: np.ndarray) -> None:
+        ceiling_db = self.ceiling_db.step_towards(0.5)
+        rel = self.release_ms.step_towards(10.0)
+        with ab.TRACER.kernel("limiter_kernel"):
+            self._w[0] = limiter_kernel(x_in, out, self._delay, self._w[0], self._dq_val, self._dq_idx, self._st,
+                                        self._tgt, self._box, int(self._lookahead[0]), self._gain,
+                                        10.0 ** (ceiling_db / 20.0), time_coeff(rel, self._fs))
@@ -1,11 +1,18 @@
 from __future__ import annotations
 import json
-import queue
 import base64
 import io
+import asyncio
+import time
+import os
+import math
+import multiprocessing
+import tempfile
+import itertools
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import soundfile as sf
-import scipy.io
 
 import audioblocks as ab
 
@@ -16,117 +23,679 @@ except (ImportError, OSError):
 
 
 SAMPLE_RATE  = 48000
-BLOCKSIZE    = 256
 CHANNELS_IN  = 1
 CHANNELS_OUT  = 2
+# effects always run at this rate, device/file audio is converted at the chain edges
+# (set to None to build chains at the native rate instead)
+INTERNAL_SAMPLE_RATE: int | None = SAMPLE_RATE
+
+# named mic stream profiles, ordered from lowest to highest latency
+LATENCY_PROFILES = {
+    'ultra':  {'blocksize': 64,  'latency': 'low'},
+    'low':    {'blocksize': 128, 'latency': 'low'},
+    'normal': {'blocksize': 256, 'latency': 'low'},
+    'safe':   {'blocksize': 512, 'latency': 'high'},
+}
+DEFAULT_LATENCY_PROFILE = 'normal'
+# adaptive mode: step up when more than this many xruns happen between checks,
+# step back down after this many seconds without any
+ADAPT_XRUN_THRESHOLD = 2
+ADAPT_STABLE_S = 30.0
+
+# name -> (soundfile format, subtype, mime type)
+OUTPUT_CODECS = {
+    'wav16': ('WAV', 'PCM_16', 'audio/wav'),
+    'wav32f': ('WAV', 'FLOAT', 'audio/wav'),
+    'flac': ('FLAC', 'PCM_16', 'audio/flac'),
+    'ogg': ('OGG', 'VORBIS', 'audio/ogg'),
+}
+DEFAULT_CODEC = 'wav16'
+
+FILE_BLOCKSIZE = 1024
+# offline renders of chains with bounded memory are split across processes;
+# shorter files are not worth the pool round trip
+PARALLEL_RENDER_MIN_S = 60.0
+PARALLEL_RENDER_WORKERS = max(1, (os.cpu_count() or 1) - 1)
+RENDER_CROSSFADE = 256  # frames faded between neighbouring segments
+RENDER_PROGRESS_INTERVAL_S = 0.1  # render_progress messages while a render job runs
+RENDER_SHARE = 0.9  # of a job's progress; encoding and plots take the rest
+# fuse live chains into generated numba functions (compiled in the background)
+COMPILE_CHAINS = True
+# file renders of static chains (no LFO/envelope routes) process the whole signal
+# per effect (Effect.process_offline) instead of streaming blocks
+OFFLINE_FAST_PATH = True
+SPECTROGRAM_CACHE_RENDERS = 4  # renders whose spectrogram tiles stay available
+LOUDNESS_RING_FRAMES = 2 ** 17  # chain output buffered for the loudness meter (~2.7 s at 48 kHz)
+# set flush-to-zero/denormals-are-zero on the threads running kernels (audio
+# callback, render workers); the kernels also flush their feedback state themselves
+FLUSH_DENORMALS = True
+# debug renders write their Chrome trace here (open in ui.perfetto.dev)
+TRACE_DIR = os.environ.get("AUDIO_TRACE_DIR", tempfile.gettempdir())
+# decoded uploads are parked here (memory-mapped) so they can be re-rendered without a new upload
+SCRATCH_DIR = os.environ.get("AUDIO_SCRATCH_DIR", tempfile.gettempdir())
+
+
+def encode_audio(samples: np.ndarray, sample_rate: int, codec: str = DEFAULT_CODEC) -> str:
+    """
+    Encodes (frames, channels) float32 samples with the given codec and returns a
+    base64 data URL. CPU-bound: run it in an executor, not on the event loop.
+    """
+    if codec not in OUTPUT_CODECS:
+        print(f"Warning: unknown output codec '{codec}', using '{DEFAULT_CODEC}'")
+        codec = DEFAULT_CODEC
+    fmt, subtype, mime = OUTPUT_CODECS[codec]
+
+    with io.BytesIO() as out_io:
+        # libsndfile does the float -> PCM conversion inside this call
+        with ab.TRACER.span(f"sf.write[{subtype}]", "io"):
+            sf.write(out_io, samples, sample_rate, format=fmt, subtype=subtype)
+        with ab.TRACER.span("base64.encode", "io"):
+            b64_string = base64.b64encode(out_io.getvalue()).decode('ascii')
+
+    return f"data:{mime};base64,{b64_string}"
+
+
+EFFECT_TYPES = {
+    'delay': ab.StereoDelayEffect,
+    'reverb': ab.ReverbEffect,
+    'gate': ab.NoiseGateEffect,
+    'spectral': ab.SpectralFilter,
+    'octaver': ab.OctaverEffect,
+    'filter': ab.FilterEffect,
+    'chorus': ab.ChorusEffect,
+    'flanger': ab.FlangerEffect,
+    'compressor': ab.CompressorEffect,
+    'limiter': ab.LimiterEffect,
+}
+
+
+def create_effect(effect_type: str, params: dict):
+    """Instantiates an effect from its config type, or None for unknown types."""
+    cls = EFFECT_TYPES.get(effect_type)
+    if cls is None:
+        return None
+    return cls(**params)
+
+
+def build_modulation(chain: ab.EffectsChain, effects_map: dict, mod_config: list[dict]) -> ab.ModulationMatrix:
+    """
+    mod_config: [{'source': {'type': 'lfo', ...}, 'effect_id': ..., 'param': ..., 'depth': 0.2}, ...]
+    Routes to unknown effects, non-SmoothParam attributes or with an invalid
+    source are skipped with a warning.
+    """
+    matrix = ab.ModulationMatrix(chain.params)
+    for route in mod_config:
+        effect_id, param_name = route.get('effect_id'), route.get('param')
+        param = getattr(effects_map.get(effect_id), param_name, None) if param_name else None
+        source = ab.make_source(route.get('source', {}))
+        if not isinstance(param, ab.SmoothParam) or source is None:
+            print(f"Warning: cannot modulate '{param_name}' in effect '{effect_id}'")
+            continue
+        matrix.add_route(source, param, route.get('depth', 0.0))
+    return matrix
+
+
+def build_file_chain(chain_config: list[dict], mod_config: list[dict], fs: int) -> ab.EffectsChain:
+    """Chain for offline renders: no plot taps or metrics, io at the file rate."""
+    chain = ab.EffectsChain(INTERNAL_SAMPLE_RATE or fs, CHANNELS_IN, CHANNELS_OUT, FILE_BLOCKSIZE)
+    chain.set_io_rate(fs)
+    file_effects = {}
+    for config in chain_config:
+        fx = create_effect(config.get('type'), config.get('params', {}))
+        if fx is None: continue
+        chain.add(fx)
+        file_effects[config.get('effect_id')] = fx
+    chain.set_modulation(build_modulation(chain, file_effects, mod_config))
+    chain.warmup()
+    return chain
+
+
+def render_sequential(chain: ab.EffectsChain, audio: np.ndarray, out: np.ndarray, progress=None) -> bool:
+    """Whole-file render on the calling thread (an executor thread for file jobs)."""
+    if FLUSH_DENORMALS:
+        with ab.denormals_flushed():
+            return chain.render(audio, out, progress=progress, offline=OFFLINE_FAST_PATH)
+    return chain.render(audio, out, progress=progress, offline=OFFLINE_FAST_PATH)
+
+
+# jobs with an id up to this are cancelled; shared with the render pool workers
+_render_cancel = None
+
+
+def _init_render_worker(cancel):
+    global _render_cancel
+    _render_cancel = cancel
+
+
+def render_file_segment(chain_config: list[dict], fs: int, audio: np.ndarray, start_frame: int,
+                        job_id: int = 0) -> np.ndarray | None:
+    """Process pool worker: renders one segment of a file on a chain of its own (None if the job was cancelled)."""
+    if FLUSH_DENORMALS:
+        ab.enable_ftz()
+    chain = build_file_chain(chain_config, [], fs)
+    out = np.zeros((audio.shape[0], chain.co), dtype=np.float32)
+    # job_id 0: not cancellable
+    alive = lambda done, total: job_id == 0 or _render_cancel is None or _render_cancel.value < job_id
+    return out if chain.render(audio, out, start_frame, alive, offline=OFFLINE_FAST_PATH) else None
+
+
+def plan_file_render(chain: ab.EffectsChain, frames: int) -> list[tuple[int, int, int, int]]:
+    """
+    Segments for a parallel render of 'frames' (at the chain's io rate), or a single
+    segment when the chain's memory is unbounded or the file is too short.
+    """
+    memory = chain.memory()
+    fs = chain.io_rate
+    if memory is None or PARALLEL_RENDER_WORKERS < 2 or frames < PARALLEL_RENDER_MIN_S * fs:
+        return [(0, frames, 0, frames)]
+    # effect memory in io frames, plus the SRC filters settling on each side
+    pre_roll = int(math.ceil(memory * fs / chain.sr)) + 2 * chain.latency
+    # start every segment where the resampler phases and the internal block grid
+    # line up with a render from frame 0, so segments see exactly the same blocks
+    g = math.gcd(fs, chain.sr)
+    align = (fs // g) * (chain.bs // math.gcd(chain.bs, chain.sr // g))
+    return ab.plan_segments(frames, PARALLEL_RENDER_WORKERS, pre_roll, chain.latency, RENDER_CROSSFADE,
+                            align=align, min_frames=int(PARALLEL_RENDER_MIN_S * fs / 4))
+
+
+_render_pool: ProcessPoolExecutor | None = None
+
+
+def render_pool() -> ProcessPoolExecutor:
+    # spawn, not fork: the parent has PortAudio and event loop threads running
+    global _render_pool, _render_cancel
+    if _render_pool is None:
+        ctx = multiprocessing.get_context('spawn')
+        _render_cancel = ctx.Value('q', 0, lock=False)
+        _render_pool = ProcessPoolExecutor(PARALLEL_RENDER_WORKERS, mp_context=ctx,
+                                           initializer=_init_render_worker, initargs=(_render_cancel,))
+    return _render_pool
+
+
+_job_ids = itertools.count(1)
+
+
+class RenderCancelled(Exception):
+    pass
+
+
+class RenderJob:
+    """
+    One queued file render. The render thread writes progress and checks
+    cancelled between blocks; ids increase across all sessions, so the pool
+    workers can be told 'everything up to id N is cancelled' with one shared value.
+    """
+    def __init__(self, contents, client, output_format=DEFAULT_CODEC, echo_original=True, debug=False):
+        self.id = next(_job_ids)
+        self.contents = contents
+        # returns the socket to send to at send time (None while the client is away)
+        self.client = client
+        self.output_format = output_format
+        self.echo_original = echo_original
+        self.debug = debug
+        self.progress = 0.0
+        self.cancelled: str | None = None  # the reason, once cancelled
+        self.finished = asyncio.Event()
+
+    def cancel(self, reason: str):
+        if self.cancelled is None:
+            self.cancelled = reason
+            if _render_cancel is not None:
+                _render_cancel.value = max(_render_cancel.value, self.id)
+
+    def check(self):
+        if self.cancelled is not None:
+            raise RenderCancelled(self.cancelled)
+
+    def alive(self, done: int, total: int) -> bool:
+        """EffectsChain.render progress callback (runs on the render thread)."""
+        self.progress = RENDER_SHARE * done / max(total, 1)
+        return self.cancelled is None
+
+    async def send(self, message: dict):
+        # progress and cancel notices are best effort: the client may be reconnecting
+        websocket = self.client()
+        if websocket is None:
+            return
+        try:
+            await websocket.send(json.dumps(message))
+        except Exception:
+            pass
+
+
+def plot_list(values: np.ndarray) -> list[float]:
+    # 4 decimals is below a pixel and keeps JSON small (float32 reprs are ~20 chars)
+    return np.round(values.astype(np.float64), 4).tolist()
+
+
+def build_waveforms(original: np.ndarray, processed: np.ndarray, fs: int):
+    return ab.WaveformPyramid(original, fs), ab.WaveformPyramid(processed, fs)
+
+
+def traced(name: str, fn, *args):
+    """Calls fn(*args) inside a span; for work handed to executors (through TRACER.bind)."""
+    with ab.TRACER.span(name, "executor"):
+        return fn(*args)
+
+
+def write_trace(render_id: int, session: ab.TraceSession) -> str | None:
+    """Writes a render's trace session as Chrome trace JSON; returns the path."""
+    path = os.path.join(TRACE_DIR, f"render-{os.getpid()}-{render_id}.trace.json")
+    try:
+        session.write(path)
+    except OSError as e:
+        print(f"Warning: could not write trace {path}: {e}")
+        return None
+    return path
 
 
 class AudioEngine:
-    def __init__(self, data_queues: dict[str, queue.Queue]):
+    def __init__(self, plot_ring: ab.SPSCRing):
         self.stream = None
+        # callable with sd.Stream's keyword arguments; None uses the sound card
+        self.stream_factory = None
         self.effects_chain = None
-        self.data_queues = data_queues
+        self.plot_ring = plot_ring
         self.is_running = False
         self.effects_map = {}
         self.last_chain_config = []
-        self.is_processing_file = False
+        self.last_mod_config = []
+        # file renders run one at a time; a new one cancels whatever is queued or running
+        self.render_queue: deque[RenderJob] = deque()
+        self.current_job: RenderJob | None = None
+        self._render_runner: asyncio.Task | None = None
+        # socket of the connected client, None while it is away (set by the backend)
+        self.client = None
+        # (original, processed) pyramids of the last rendered file, for range queries
+        self.waveforms: tuple[ab.WaveformPyramid, ab.WaveformPyramid] | None = None
+        # render_id -> {'original': tiles, 'processed': tiles}, oldest first
+        self.spectrograms: OrderedDict[int, dict[str, ab.SpectrogramTiles]] = OrderedDict()
+        self.render_count = 0
+        # decoded mono upload in a memory-mapped scratch file, and its sample rate
+        self.parked_audio: np.memmap | None = None
+        self.parked_rate = 0
+        self._parked_path: str | None = None
+        # what the client needs to show the last render again (file_processed minus the audio)
+        self.last_file: dict | None = None
         self.status_count = 0
         self.current_sample_rate = SAMPLE_RATE
+        self.metrics = ab.AudioMetrics()
+        # the output tap only copies into this ring; update_loudness() meters it off the audio thread
+        self.loudness_ring = ab.SPSCRing(LOUDNESS_RING_FRAMES, CHANNELS_OUT)
+        self.loudness: ab.LoudnessMeter | None = None
+        self._loudness_reset = False
+        # tuner on the input column of the plot ring, fed by the plot sender
+        self.pitch: ab.PitchTracker | None = None
+
+        self.latency_profile = DEFAULT_LATENCY_PROFILE
+        self.blocksize = LATENCY_PROFILES[DEFAULT_LATENCY_PROFILE]['blocksize']
+        self.adaptive_latency = False
+        self._xruns_seen = 0
+        # time source of the adaptive profile logic; the load harness swaps in its simulated clock
+        self.clock = time.monotonic
+        self._stable_since = self.clock()
 
         self.build_chain([])
 
     def build_chain(self, effects_config: list[dict]):
+        if effects_config != self.last_chain_config:
+            # a render of the old chain would only be thrown away
+            self.restart_renders()
+        with ab.TRACER.span("build_chain", "control", effects=len(effects_config)):
+            self._build_chain(effects_config)
+
+    def _build_chain(self, effects_config: list[dict]):
         self.last_chain_config = effects_config
-        chain = ab.EffectsChain(self.current_sample_rate, CHANNELS_IN, CHANNELS_OUT, BLOCKSIZE)
+        chain = ab.EffectsChain(INTERNAL_SAMPLE_RATE or self.current_sample_rate, CHANNELS_IN, CHANNELS_OUT, self.blocksize)
+        chain.set_io_rate(self.current_sample_rate)
         self.effects_map.clear()
 
-        chain.add(ab.PlotDataTap(self.data_queues['input']))
+        # column 0 = input, column 1 = output
+        chain.add(ab.PlotDataTap(self.plot_ring, 0, begin=True))
+        labels = ['input_tap']
 
         for config in effects_config:
             effect_id = config.get("effect_id")
             effect_type = config.get('type')
             params = config.get('params', {})
 
-            if effect_type == 'delay': fx = ab.StereoDelayEffect(**params)
-            elif effect_type == 'reverb': fx = ab.ReverbEffect(**params)
-            elif effect_type == 'gate': fx = ab.NoiseGateEffect(**params)
-            elif effect_type == 'spectral': fx = ab.SpectralFilter(**params)
-            elif effect_type == 'octaver': fx = ab.OctaverEffect(**params)
-            elif effect_type == 'filter': fx = ab.FilterEffect(**params)
-            else: continue
+            fx = create_effect(effect_type, params)
+            if fx is None: continue
             chain.add(fx)
+            labels.append(f"{len(labels)}:{effect_type}")
 
             if effect_id:
                 self.effects_map[effect_id] = fx
 
-        chain.add(ab.PlotDataTap(self.data_queues['output']))
+        chain.add(ab.PlotDataTap(self.plot_ring, 1, commit=True))
+        labels.append('output_tap')
+        chain.add(ab.LoudnessTap(self.loudness_ring))
+        labels.append('loudness_tap')
+        chain.set_modulation(build_modulation(chain, self.effects_map, self.last_mod_config))
+
+        if self.pitch is None or self.pitch.fs != chain.sr:
+            self.pitch = ab.PitchTracker(chain.sr)
 
         chain.warmup()
+        self.metrics.set_effects(labels)
+        chain.metrics = self.metrics
         self.effects_chain = chain
+        if COMPILE_CHAINS:
+            chain.compile_async()
+
+    def set_modulation(self, mod_config: list[dict]):
+        """Replaces every modulation route of the live chain (no rebuild needed)."""
+        # built before anything is stored, so a config that fails never sticks
+        matrix = build_modulation(self.effects_chain, self.effects_map, mod_config) if self.effects_chain else None
+        if mod_config != self.last_mod_config:
+            self.restart_renders()
+        self.last_mod_config = mod_config
+        if matrix is not None:
+            self.effects_chain.set_modulation(matrix)
+
+    def reset_loudness(self):
+        """Starts a new measurement; applied by the next update_loudness()."""
+        self._loudness_reset = True
+
+    def update_loudness(self) -> dict | None:
+        """
+        Meters everything the loudness tap published since the last call (the only
+        consumer of loudness_ring). Blocking, run it in an executor. None if no new audio.
+        """
+        ring = self.loudness_ring
+        sr = self.effects_chain.sr
+        if self._loudness_reset or self.loudness is None or self.loudness.fs != sr:
+            self._loudness_reset = False
+            ring.advance(ring.readable())
+            self.loudness = ab.LoudnessMeter(sr, ring.channels)
+        views = ring.read_views()
+        if not views:
+            return None
+        with ab.TRACER.span("loudness.feed", "metrics"):
+            for view in views:
+                self.loudness.feed(view)
+                ring.advance(view.shape[0])
+        return {'type': 'loudness', **self.loudness.snapshot(), 'dropped': ring.overruns}
 
-    async def process_wav_file(self, contents, websocket):
-        if self.is_processing_file:
-            print("Warning. A file is already being process. Ignoring new request")
+    def metrics_snapshot(self) -> dict:
+        return self.metrics.snapshot(queue_drops=self.plot_ring.overruns)
+
+    def park_audio(self, audio: np.ndarray, fs: int) -> np.memmap:
+        """Moves decoded (N, 1) audio into a scratch file kept for re-renders; returns the mapped copy."""
+        self.release_audio()
+        fd, path = tempfile.mkstemp(prefix="upload-", suffix=".f32", dir=SCRATCH_DIR)
+        os.close(fd)
+        parked = np.memmap(path, dtype=np.float32, mode='w+', shape=audio.shape)
+        parked[:] = audio
+        parked.flush()
+        self.parked_audio, self.parked_rate, self._parked_path = parked, int(fs), path
+        return parked
+
+    def release_audio(self):
+        if self._parked_path is None:
             return
-        
-        self.is_processing_file = True
+        path, self._parked_path = self._parked_path, None
+        # drop the mapping before the file (required on Windows)
+        self.parked_audio = None
+        try:
+            os.remove(path)
+        except OSError as e:
+            print(f"Warning: could not remove scratch file {path}: {e}")
+
+    def close(self):
+        """Ends the session: stops the stream and deletes the scratch file."""
+        self.stop_stream()
+        self.release_audio()
+
+    def submit_render(self, contents, output_format=DEFAULT_CODEC, echo_original=True, debug=False) -> RenderJob:
+        """
+        Queues a file render (contents=None re-renders the parked upload). Whatever
+        is queued or running is cancelled first: only the newest request is heard.
+        Messages go to self.client as it is when they are sent, so a client that
+        reconnects mid-render still gets the result.
+        """
+        self.cancel_renders("superseded")
+        return self._queue_render(RenderJob(contents, lambda: self.client, output_format, echo_original, debug))
+
+    def _queue_render(self, job: RenderJob) -> RenderJob:
+        self.render_queue.append(job)
+        if self._render_runner is None or self._render_runner.done():
+            self._render_runner = asyncio.create_task(self._run_renders())
+        return job
+
+    def restart_renders(self):
+        """
+        Cancels the render in flight (reason chain_changed) and queues it again,
+        to run with the chain as it is once the caller has changed it. A running
+        job has parked its upload before its first await, so it restarts from
+        the parked audio; a queued one has not been decoded yet and keeps its upload.
+        """
+        live = [job for job in (self.current_job, *self.render_queue) if job is not None and job.cancelled is None]
+        self.cancel_renders("chain_changed")
+        if not live:
+            return
+        job = live[-1]
+        contents = None if job is self.current_job else job.contents
+        self._queue_render(RenderJob(contents, job.client, job.output_format, job.echo_original, job.debug))
+
+    def cancel_renders(self, reason: str):
+        for job in self.render_queue:
+            job.cancel(reason)
+        if self.current_job is not None:
+            self.current_job.cancel(reason)
+
+    def rendering(self) -> bool:
+        """True while a render is running or queued (and not cancelled)."""
+        jobs = [self.current_job, *self.render_queue]
+        return any(job is not None and job.cancelled is None for job in jobs)
+
+    async def process_wav_file(self, contents, output_format=DEFAULT_CODEC, echo_original=True, debug=False):
+        """Submits a render and waits until it is done or cancelled."""
+        job = self.submit_render(contents, output_format, echo_original, debug)
+        await job.finished.wait()
+
+    async def _run_renders(self):
+        while self.render_queue:
+            job = self.render_queue.popleft()
+            self.current_job = job
+            try:
+                if job.cancelled is None:
+                    await self._run_render(job)
+                if job.cancelled is not None:
+                    print(f"Info: render {job.id} cancelled ({job.cancelled})")
+                    await job.send({'type': 'render_cancelled', 'job': job.id, 'reason': job.cancelled})
+            finally:
+                self.current_job = None
+                job.finished.set()
+
+    async def _await_progress(self, job: RenderJob, awaitable):
+        """Awaits a render stage, sending render_progress every RENDER_PROGRESS_INTERVAL_S."""
+        task = asyncio.ensure_future(awaitable)
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=RENDER_PROGRESS_INTERVAL_S)
+            if done:
+                return task.result()
+            await job.send({'type': 'render_progress', 'job': job.id, 'progress': round(job.progress, 3)})
+
+    async def _run_render(self, job: RenderJob):
+        """Decodes and parks the upload (unless re-rendering), renders it and sends file_processed."""
+        contents, output_format, debug = job.contents, job.output_format, job.debug
+        # debug renders are traced (this task and the executor work it starts)
+        # and get a per-stage summary in the response
+        tr = ab.TRACER
+        trace = tr.start_session() if debug else None
         try:
             print("Info: Processing WAV")
-            content_type, content_string = contents.split(',')
-            decoded_bytes = base64.b64decode(content_string)
+            with tr.span("process_wav_file", "file", job=job.id):
+                if contents is None:
+                    if self.parked_audio is None:
+                        print("Warning: no uploaded file to render")
+                        # _run_renders tells the client, which stops waiting
+                        job.cancel("no_upload")
+                        return
+                    audio_data_mono, fs = self.parked_audio, self.parked_rate
+                else:
+                    with tr.span("base64.decode", "io"):
+                        content_type, content_string = contents.split(',')
+                        decoded_bytes = base64.b64decode(content_string)
 
-            with io.BytesIO(decoded_bytes) as wav_io:
-                audio_data, fs = sf.read(wav_io, dtype='float32')
+                    with tr.span("sf.read", "io"), io.BytesIO(decoded_bytes) as wav_io:
+                        audio_data, fs = sf.read(wav_io, dtype='float32')
 
-            if audio_data.ndim > 1:
-                audio_data_mono = audio_data.mean(axis=1, keepdims=True)
-            else:
-                audio_data_mono = audio_data.reshape(-1, 1)
-
-            ch_in, ch_out = 1, 2
-            file_blocksize = 1024
-            chain = ab.EffectsChain(fs, ch_in, ch_out, file_blocksize)
-            for config in self.last_chain_config:
-                effect_type, params = config.get('type'), config.get('params', {})
-                if effect_type == "delay": fx = ab.StereoDelayEffect(**params)
-                elif effect_type == "reverb": fx = ab.ReverbEffect(**params)
-                elif effect_type == "gate": fx = ab.NoiseGateEffect(**params)
-                elif effect_type == "spectral": fx = ab.SpectralFilter(**params)
-                elif effect_type == "octaver": fx = ab.OctaverEffect(**params)
-                elif effect_type == 'filter': fx = ab.FilterEffect(**params)
-                else: continue
-                chain.add(fx)
-            chain.warmup()
-
-            processed_audio = np.zeros((len(audio_data_mono), ch_out), dtype=np.float32)
-            chain.process(audio_data_mono, processed_audio)
-
-            processed_audio = np.clip(processed_audio, -1.0, 1.0)
-            processed_int16 = (processed_audio * 32767).astype(np.int16)
-
-            with io.BytesIO() as out_io:
-                scipy.io.wavfile.write(out_io, fs, processed_int16)
-                out_io.seek(0)
-                processed_b64_bytes = base64.b64encode(out_io.read())
-
-            processed_b64_string = processed_b64_bytes.decode('ascii')
-            processed_data_url = f"data:audio/wav;base64,{processed_b64_string}"
-
-            response = {
-                'type': 'file_processed',
-                'original_b64': contents,
-                'processed_b64': processed_data_url,
-                'sample_rate': fs,
-                'original_samples': audio_data_mono.flatten().tolist(),
-                'processed_samples': processed_audio.mean(axis=1).flatten().tolist()
-            }
-            await websocket.send(json.dumps(response))
-        
+                    if audio_data.ndim > 1:
+                        audio_data_mono = audio_data.mean(axis=1, keepdims=True)
+                    else:
+                        audio_data_mono = audio_data.reshape(-1, 1)
+                    with tr.span("park_audio", "io"):
+                        audio_data_mono = self.park_audio(audio_data_mono, fs)
+                job.check()
+
+                # the input spectrogram does not depend on the chain: compute it while rendering
+                loop = asyncio.get_running_loop()
+                original_spectrogram = loop.run_in_executor(None, tr.bind(traced), "spectrogram[original]", ab.SpectrogramTiles, audio_data_mono[:, 0], fs)
+
+                with tr.span("build_file_chain", "control"):
+                    chain = build_file_chain(self.last_chain_config, self.last_mod_config, fs)
+                processed_audio = np.zeros((len(audio_data_mono), CHANNELS_OUT), dtype=np.float32)
+                with tr.span("render", "file", frames=len(audio_data_mono)):
+                    await self._await_progress(job, self._render_file(chain, audio_data_mono, processed_audio, job))
+                job.check()
+
+                processed_audio = np.clip(processed_audio, -1.0, 1.0)
+
+                # encoding, plot pyramids and spectrograms are CPU-bound, keep them off the event loop
+                processed_mono = processed_audio.mean(axis=1)
+                processed_data_url, waveforms, processed_spectrogram, loudness = await asyncio.gather(
+                    loop.run_in_executor(None, tr.bind(traced), "encode_audio", encode_audio, processed_audio, fs, output_format),
+                    loop.run_in_executor(None, tr.bind(traced), "build_waveforms", build_waveforms, audio_data_mono[:, 0], processed_mono, fs),
+                    loop.run_in_executor(None, tr.bind(traced), "spectrogram[processed]", ab.SpectrogramTiles, processed_mono, fs),
+                    loop.run_in_executor(None, tr.bind(traced), "measure_loudness", ab.measure_loudness, processed_audio, fs)
+                )
+                original_spectrogram = await original_spectrogram
+                job.check()
+                self.waveforms = waveforms
+                render_id = self._cache_spectrograms(original_spectrogram, processed_spectrogram)
+
+                response = {
+                    'type': 'file_processed',
+                    'job': job.id,
+                    'processed_b64': processed_data_url,
+                    'output_format': output_format if output_format in OUTPUT_CODECS else DEFAULT_CODEC,
+                    'sample_rate': fs,
+                    # plots fetch what they show with waveform_range requests
+                    'frames': len(audio_data_mono),
+                    'duration': len(audio_data_mono) / fs,
+                    # spectrogram tiles of this render are fetched with spectrogram_tile
+                    'render_id': render_id,
+                    'spectrogram': processed_spectrogram.describe(),
+                    'loudness': loudness
+                }
+                self.last_file = {k: v for k, v in response.items() if k not in ('type', 'job', 'processed_b64')}
+                # the client keeps its own copy of the upload unless it asks for it back
+                if job.echo_original and contents is not None:
+                    response['original_b64'] = contents
+                if debug:
+                    # the summary cannot include the encoding of the message that carries it
+                    response['trace'] = {
+                        'summary': trace.summary(),
+                        'file': write_trace(render_id, trace),
+                    }
+                with tr.span("json.dumps", "io"):
+                    message = json.dumps(response)
+                websocket = job.client()
+                if websocket is None:
+                    # the client is away; a resumed client asks for a re-render
+                    print("Warning: client disconnected, render result dropped")
+                    return
+                with tr.span("websocket.send", "io", bytes=len(message)):
+                    await websocket.send(message)
+                print("Success: Finished processing WAV file")
+
+        except RenderCancelled:
+            pass
         except Exception as e:
             print(f"Error processing WAV file: {e}")
         finally:
-            print("Success: Finished processing WAV file")
-            self.is_processing_file = False
+            if trace is not None:
+                tr.stop_session(trace)
+
+    async def _render_file(self, chain: ab.EffectsChain, audio: np.ndarray, out: np.ndarray, job: RenderJob | None = None):
+        """
+        Segment-parallel render when the chain allows it, else (or on pool failure)
+        sequential on an executor thread. Returns early, with out incomplete, once
+        the job is cancelled.
+        """
+        segments = plan_file_render(chain, audio.shape[0])
+        job_id = job.id if job is not None else 0
+        if len(segments) > 1:
+            try:
+                print(f"Info: rendering {len(segments)} segments in parallel")
+                loop = asyncio.get_running_loop()
+                pool = render_pool()
+                futures = [
+                    loop.run_in_executor(pool, render_file_segment, self.last_chain_config, chain.io_rate,
+                                         audio[pre_start:post_stop], pre_start * chain.sr // chain.io_rate, job_id)
+                    for (_, _, pre_start, post_stop) in segments
+                ]
+                if job is not None:
+                    # progress by whole segments, the workers cannot report finer
+                    for f in futures:
+                        f.add_done_callback(lambda _: setattr(job, 'progress', job.progress + RENDER_SHARE / len(futures)))
+                parts = await asyncio.gather(*futures)
+                if job is not None and job.cancelled is not None:
+                    return
+                ab.stitch_segments(segments, parts, out, RENDER_CROSSFADE)
+                return
+            except Exception as e:
+                print(f"Warning: parallel render failed ({e}), rendering sequentially")
+        alive = job.alive if job is not None else None
+        await asyncio.get_running_loop().run_in_executor(None, ab.TRACER.bind(render_sequential), chain, audio, out, alive)
+
+    def _cache_spectrograms(self, original: ab.SpectrogramTiles, processed: ab.SpectrogramTiles) -> int:
+        self.render_count += 1
+        self.spectrograms[self.render_count] = {'original': original, 'processed': processed}
+        while len(self.spectrograms) > SPECTROGRAM_CACHE_RENDERS:
+            self.spectrograms.popitem(last=False)
+        return self.render_count
+
+    def spectrogram_tile(self, render_id: int, signal: str, level: int, index: int) -> dict | None:
+        """One uint8 tile (frames x bins, row-major, base64) of a cached render, or None."""
+        tiles = self.spectrograms.get(render_id, {}).get(signal)
+        if tiles is None:
+            return None
+        data = tiles.tile(level, index)
+        if data is None:
+            return None
+        return {
+            'type': 'spectrogram_tile',
+            'render_id': render_id,
+            'signal': signal,
+            'level': level,
+            'index': index,
+            'frames': data.shape[0],
+            'bins': data.shape[1],
+            't_start': tiles.column_time(level, index * tiles.tile_frames),
+            'dt': tiles.column_time(level, 1),
+            'data': base64.b64encode(np.ascontiguousarray(data).tobytes()).decode('ascii')
+        }
+
+    def waveform_range(self, t0: float, t1: float, n_points: int, raw_frames: int = 0) -> dict | None:
+        """
+        Min/max/RMS of both signals of the last file over [t0, t1), at the level
+        that fits n_points, plus the last raw_frames samples before t1 for spectra.
+        """
+        if self.waveforms is None:
+            return None
+        response = {'type': 'waveform_range', 't0': t0, 't1': t1, 'sample_rate': self.waveforms[0].sample_rate}
+        for name, pyramid in zip(('original', 'processed'), self.waveforms):
+            view = pyramid.range(t0, t1, n_points)
+            response['level'] = view['level']
+            response['t_start'] = view['t_start']
+            response['dt'] = view['dt']
+            response[name] = {key: plot_list(view[key]) for key in ('min', 'max', 'rms')}
+            if raw_frames > 0:
+                response[name]['raw'] = plot_list(pyramid.raw(t1, raw_frames))
+        return response
 
     def update_param(self, effect_id: str, param_name: str, value: float):
         if effect_id not in self.effects_map:
@@ -143,17 +712,31 @@ class AudioEngine:
             att.set_target(value)
         else:
             print(f"Warning: parameter '{param_name}' in effect '{effect_id}' could not be updated")
+            return
+
+        # file renders, re-renders and resumed sessions build from the config
+        for config in self.last_chain_config:
+            if config.get('effect_id') == effect_id:
+                config.setdefault('params', {})[param_name] = value
+                break
 
     def start_mic_stream(self):
         if self.is_running:
             print(f"Warning: stream is already running")
             return
 
-        if sd is None:
+        if sd is None and self.stream_factory is None:
             print("Server Mode: Microphone hardware not available. Stream ignored.")
             return
         
-        def callback(indata, outdata, frames, time, status):
+        # MXCSR is per thread: set it from inside the callback, once per stream
+        ftz_pending = [FLUSH_DENORMALS]
+
+        def callback(indata, outdata, frames, time_info, status):
+            t0 = time.perf_counter_ns()
+            if ftz_pending[0]:
+                ftz_pending[0] = False
+                ab.enable_ftz()
             if status:
                 self.status_count += 1
             
@@ -162,12 +745,17 @@ class AudioEngine:
             else:
                 outdata.fill(0)
 
+            deadline_ns = frames * 1_000_000_000 // self.current_sample_rate
+            self.metrics.record_callback(time.perf_counter_ns() - t0, deadline_ns, bool(status))
+
+        self.reset_loudness()
         try:
-            self.stream = sd.Stream(
+            factory = self.stream_factory or sd.Stream
+            self.stream = factory(
                 samplerate=self.current_sample_rate,
-                blocksize=BLOCKSIZE,
+                blocksize=self.blocksize,
                 dtype='float32',
-                latency='low',
+                latency=LATENCY_PROFILES[self.latency_profile]['latency'],
                 channels=(CHANNELS_IN, CHANNELS_OUT),
                 callback=callback,
                 prime_output_buffers_using_stream_callback=True
@@ -177,8 +765,12 @@ class AudioEngine:
             actual_rate = self.stream.samplerate
             if actual_rate != self.current_sample_rate:
                 self.current_sample_rate = int(actual_rate)
-                print(f"Rebuilding effects chain for {self.current_sample_rate} Hz...")
-                self.build_chain(self.last_chain_config)
+                if INTERNAL_SAMPLE_RATE is not None and self.effects_chain:
+                    print(f"Converting {self.current_sample_rate} Hz <-> {INTERNAL_SAMPLE_RATE} Hz at the chain edges")
+                    self.effects_chain.set_io_rate(self.current_sample_rate)
+                else:
+                    print(f"Rebuilding effects chain for {self.current_sample_rate} Hz...")
+                    self.build_chain(self.last_chain_config)
         except Exception as e:
             print(f"Error on stream start: {e}")
 
@@ -190,3 +782,73 @@ class AudioEngine:
             self.is_running = False
 
     
+
+    def set_latency_profile(self, name: str):
+        """Switches to a named profile, or 'adaptive' to let xruns drive the blocksize."""
+        if name == 'adaptive':
+            self.adaptive_latency = True
+            self._xruns_seen = self.metrics.xruns
+            self._stable_since = self.clock()
+            return
+        if name not in LATENCY_PROFILES:
+            print(f"Error: unknown latency profile '{name}'")
+            return
+        self.adaptive_latency = False
+        self._apply_latency_profile(name)
+
+    def _apply_latency_profile(self, name: str):
+        self.latency_profile = name
+        frames = LATENCY_PROFILES[name]['blocksize']
+        if frames == self.blocksize:
+            return
+        self.blocksize = frames
+        # the new chain is prepared and warmed here, on the control thread,
+        # then swapped in before the stream is reopened with the new blocksize
+        self.build_chain(self.last_chain_config)
+        if self.is_running:
+            self.stop_stream()
+            self.start_mic_stream()
+
+    def adapt_latency(self) -> bool:
+        """Periodic check for adaptive mode. Returns True if the profile changed."""
+        if not self.adaptive_latency or not self.is_running:
+            return False
+
+        now = self.clock()
+        new_xruns = self.metrics.xruns - self._xruns_seen
+        self._xruns_seen = self.metrics.xruns
+
+        order = list(LATENCY_PROFILES)
+        idx = order.index(self.latency_profile)
+        if new_xruns > ADAPT_XRUN_THRESHOLD:
+            self._stable_since = now
+            if idx + 1 < len(order):
+                print(f"Info: {new_xruns} xruns, raising latency profile to '{order[idx + 1]}'")
+                self._apply_latency_profile(order[idx + 1])
+                return True
+        elif new_xruns > 0:
+            self._stable_since = now
+        elif now - self._stable_since > ADAPT_STABLE_S and idx > 0:
+            self._stable_since = now
+            print(f"Info: stream stable, lowering latency profile to '{order[idx - 1]}'")
+            self._apply_latency_profile(order[idx - 1])
+            return True
+        return False
+
+    def latency_report(self) -> dict:
+        """Round trip = device input + output latency + chain latency (SRC edges, lookaheads)."""
+        round_trip_ms = None
+        if self.stream is not None:
+            in_lat, out_lat = self.stream.latency
+            round_trip_ms = 1000.0 * (in_lat + out_lat)
+            if self.effects_chain:
+                round_trip_ms += 1000.0 * self.effects_chain.latency / self.current_sample_rate
+            round_trip_ms = round(round_trip_ms, 2)
+        return {
+            'type': 'latency',
+            'profile': self.latency_profile,
+            'adaptive': self.adaptive_latency,
+            'blocksize': self.blocksize,
+            'sample_rate': self.current_sample_rate,
+            'round_trip_ms': round_trip_ms
+        }
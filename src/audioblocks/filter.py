@@ -2,8 +2,17 @@ from __future__ import annotations
 import numpy as np
 import numba
 import math
+import scipy.signal
 import audioblocks as ab
 
+# cutoff and Q move between coefficient updates every FILTER_SUBBLOCK samples
+# (per-sample biquad coefficients cost more than the filter itself), by at most
+# these fractions of the current cutoff / absolute Q per update: the 10% and
+# 0.1 per 256-sample block this used to step, now independent of the blocksize
+FILTER_SUBBLOCK = 32
+CUTOFF_STEP = 0.0125
+Q_STEP = 0.0125
+
 # Direct Form I Biquad Kernel
 @numba.njit(cache=True, fastmath=True)
 def biquad_kernel(x_in, x_out, b0, b1, b2, a1, a2, state):
@@ -33,11 +42,87 @@ def biquad_kernel(x_in, x_out, b0, b1, b2, a1, a2, state):
             y2 = y1
             y1 = y0
         
-        # Save state back
-        state[c, 0] = x1
-        state[c, 1] = x2
-        state[c, 2] = y1
-        state[c, 3] = y2
+        # Save state back (flushed: a decaying tail would otherwise enter subnormals)
+        state[c, 0] = ab.flush_denormal(x1)
+        state[c, 1] = ab.flush_denormal(x2)
+        state[c, 2] = ab.flush_denormal(y1)
+        state[c, 3] = ab.flush_denormal(y2)
+
+
+@numba.njit(cache=True)
+def rbj_coeffs(f_type_val, fc, q, fs):
+    # RBJ Cookbook Biquad Formulas
+    w0 = 2.0 * math.pi * fc / fs
+    cos_w0 = math.cos(w0)
+    sin_w0 = math.sin(w0)
+    alpha = sin_w0 / (2.0 * q)
+
+    b0 = b1 = b2 = a0 = a1 = a2 = 0.0
+    
+    # Determine integer type
+    t = int(round(f_type_val))
+
+    if t == 0: # Low Pass
+        b0 =  (1 - cos_w0) / 2
+        b1 =   1 - cos_w0
+        b2 =  (1 - cos_w0) / 2
+        a0 =   1 + alpha
+        a1 =  -2 * cos_w0
+        a2 =   1 - alpha
+    elif t == 1: # High Pass
+        b0 =  (1 + cos_w0) / 2
+        b1 = -(1 + cos_w0)
+        b2 =  (1 + cos_w0) / 2
+        a0 =   1 + alpha
+        a1 =  -2 * cos_w0
+        a2 =   1 - alpha
+    else: # Band Pass (constant skirt gain, peak = Q)
+        # Normalize to 0dB peak gain for musical utility
+        b0 =   alpha
+        b1 =   0.0
+        b2 =  -alpha
+        a0 =   1 + alpha
+        a1 =  -2 * cos_w0
+        a2 =   1 - alpha
+
+    # Normalize by a0
+    return (b0/a0, b1/a0, b2/a0, a1/a0, a2/a0)
+
+
+@numba.njit(cache=True)
+def ramped_biquad_kernel(x_in, x_out, f_type, fc, fc_target, q, q_target, fs, state):
+    """
+    biquad_kernel with cutoff and Q ramping towards their targets, the
+    coefficients recomputed every FILTER_SUBBLOCK samples while they move.
+    Returns the (cutoff, Q) reached at the end of the block.
+    """
+    frames = x_in.shape[0]
+    start = 0
+    while start < frames:
+        if fc == fc_target and q == q_target:
+            # settled: the rest of the block in one go
+            stop = frames
+        else:
+            stop = min(start + FILTER_SUBBLOCK, frames)
+            fc_step = fc * CUTOFF_STEP
+            fc += min(max(fc_target - fc, -fc_step), fc_step)
+            q += min(max(q_target - q, -Q_STEP), Q_STEP)
+        b0, b1, b2, a1, a2 = rbj_coeffs(f_type, fc, q, fs)
+        biquad_kernel(x_in[start:stop], x_out[start:stop], b0, b1, b2, a1, a2, state)
+        start = stop
+    return fc, q
+
+
+@numba.njit(cache=True, fastmath=True)
+def filter_step(x_in, out, params, args):
+    """Fused form of FilterEffect.process_into (see Effect.fused_step)."""
+    i_type, i_fc, i_q, fs, state = args
+    f_type = ab.step_param(params, i_type, 1.0)
+    fc, q_val = ramped_biquad_kernel(x_in, out, f_type,
+                                     params[0][i_fc], ab.effective_target(params, i_fc),
+                                     params[0][i_q], ab.effective_target(params, i_q), fs, state)
+    params[0][i_fc] = fc
+    params[0][i_q] = q_val
 
 class FilterEffect(ab.Effect):
     def __init__(self, filter_type=0.0, cutoff_hz=1000.0, q=0.707):
@@ -60,54 +145,44 @@ class FilterEffect(ab.Effect):
             self._state = np.zeros((channels_out, 4), dtype=np.float32)
 
     def _calc_coeffs(self, f_type_val, fc, q):
-        # RBJ Cookbook Biquad Formulas
-        w0 = 2.0 * math.pi * fc / self._fs
-        cos_w0 = math.cos(w0)
-        sin_w0 = math.sin(w0)
-        alpha = sin_w0 / (2.0 * q)
+        return rbj_coeffs(f_type_val, fc, q, self._fs)
 
-        b0 = b1 = b2 = a0 = a1 = a2 = 0.0
-        
-        # Determine integer type
-        t = int(round(f_type_val))
-
-        if t == 0: # Low Pass
-            b0 =  (1 - cos_w0) / 2
-            b1 =   1 - cos_w0
-            b2 =  (1 - cos_w0) / 2
-            a0 =   1 + alpha
-            a1 =  -2 * cos_w0
-            a2 =   1 - alpha
-        elif t == 1: # High Pass
-            b0 =  (1 + cos_w0) / 2
-            b1 = -(1 + cos_w0)
-            b2 =  (1 + cos_w0) / 2
-            a0 =   1 + alpha
-            a1 =  -2 * cos_w0
-            a2 =   1 - alpha
-        else: # Band Pass (constant skirt gain, peak = Q)
-            # Normalize to 0dB peak gain for musical utility
-            b0 =   alpha
-            b1 =   0
-            b2 =  -alpha
-            a0 =   1 + alpha
-            a1 =  -2 * cos_w0
-            a2 =   1 - alpha
-
-        # Normalize by a0
-        return (b0/a0, b1/a0, b2/a0, a1/a0, a2/a0)
+    def fused_step(self):
+        args = (self.filter_type._idx, self.cutoff_hz._idx, self.q._idx, float(self._fs), self._state)
+        return filter_step, args
+
+    def memory_samples(self) -> int | None:
+        # impulse response decays as r**n, r = largest pole radius; run it down to -100 dB
+        _, _, _, a1, a2 = self._calc_coeffs(self.filter_type.target, self.cutoff_hz.target, self.q.target)
+        r = float(np.max(np.abs(np.roots([1.0, a1, a2]))))
+        if r >= 1.0:
+            return None
+        if r <= 1e-6:
+            return 2
+        return int(np.ceil(np.log(1e-5) / np.log(r))) + 2
+
+    def process_offline(self, x: np.ndarray) -> np.ndarray | None:
+        # static params: one biquad section over the whole signal, every channel at once
+        b0, b1, b2, a1, a2 = self._calc_coeffs(self.filter_type.current, self.cutoff_hz.current, self.q.current)
+        b = np.array([b0, b1, b2])
+        a = np.array([1.0, a1, a2])
+        # Direct Form I state -> the transposed Direct Form II state sosfilt carries
+        zi = np.stack([scipy.signal.lfiltic(b, a, s[[2, 3]], s[[0, 1]]) for s in self._state.astype(np.float64)], axis=1)
+        y = scipy.signal.sosfilt(np.concatenate([b, a])[None, :], x, axis=0, zi=zi[None])[0]
+        if x.shape[0] >= 2:
+            for i, v in enumerate((x[-1], x[-2], y[-1], y[-2])):
+                self._state[:, i] = [ab.flush_denormal(float(s)) for s in v]
+        return y.astype(np.float32)
 
     def process_into(self, x_in: np.ndarray, out: np.ndarray) -> None:
         # 1. Update params
         f_type = self.filter_type.step_towards(1.0) # Changes instantly (snap to int logic)
-        fc = self.cutoff_hz.step_towards(self.cutoff_hz.current * 0.1) # Log-ish feel
-        q_val = self.q.step_towards(0.1)
+        fc, fc_target = self.cutoff_hz.begin_ramp()
+        q_val, q_target = self.q.begin_ramp()
 
-        # 2. Calculate coefficients for this block
-        b0, b1, b2, a1, a2 = self._calc_coeffs(f_type, fc, q_val)
-
-        # 3. Ensure input matches output channels (copy mono to stereo if needed for state)
-        # But standard Effect chain handles buffers. We assume out has correct shape.
-        
-        # 4. Run Kernel
-        biquad_kernel(x_in, out, b0, b1, b2, a1, a2, self._state)
+        # 2. Run Kernel (coefficients follow cutoff/Q within the block, see FILTER_SUBBLOCK)
+        # We assume out has the correct shape: the chain handles the buffers.
+        with ab.TRACER.kernel("biquad_kernel"):
+            fc, q_val = ramped_biquad_kernel(x_in, out, f_type, fc, fc_target, q_val, q_target, self._fs, self._state)
+        self.cutoff_hz.end_ramp(fc)
+        self.q.end_ramp(q_val)
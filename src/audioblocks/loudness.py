@@ -0,0 +1,303 @@
+from __future__ import annotations
+import math
+import numpy as np
+import numba
+
+import audioblocks as ab
+
+
+# ITU-R BS.1770-4 / EBU R128 (Tech 3341, 3342)
+STEP_S = 0.1             # every measurement is built from 100 ms sub-blocks
+MOMENTARY_STEPS = 4      # 400 ms window (also the gating block of the integrated loudness)
+SHORT_TERM_STEPS = 30    # 3 s window
+ABSOLUTE_GATE = -70.0    # LUFS
+RELATIVE_GATE = -10.0    # LU below the gated mean (integrated loudness)
+LRA_RELATIVE_GATE = -20.0
+LRA_PERCENTILES = (10.0, 95.0)
+HIST_MAX = 10.0          # gated loudness histograms cover [ABSOLUTE_GATE, HIST_MAX) LUFS
+HIST_RESOLUTION = 0.01   # dB per histogram bin
+TRUE_PEAK_TAPS = 12      # per phase of the true-peak oversampling filter
+
+
+def k_weighting(fs: float) -> np.ndarray:
+    """
+    (2, 5) biquads [b0, b1, b2, a1, a2]: the BS.1770 pre-filter (high shelf) and
+    RLB high-pass, re-derived for fs from their analog prototypes (exact at 48 kHz).
+    """
+    # shelf
+    f0, gain_db, q = 1681.974450955533, 3.999843853973347, 0.7071752369554196
+    k = math.tan(math.pi * f0 / fs)
+    vh = 10.0 ** (gain_db / 20.0)
+    vb = vh ** 0.4996667741545416
+    a0 = 1.0 + k / q + k * k
+    shelf = [(vh + vb * k / q + k * k) / a0, 2.0 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0,
+             2.0 * (k * k - 1.0) / a0, (1.0 - k / q + k * k) / a0]
+    # high-pass
+    f0, q = 38.13547087602444, 0.5003270373238773
+    k = math.tan(math.pi * f0 / fs)
+    a0 = 1.0 + k / q + k * k
+    highpass = [1.0, -2.0, 1.0, 2.0 * (k * k - 1.0) / a0, (1.0 - k / q + k * k) / a0]
+    return np.array([shelf, highpass], dtype=np.float64)
+
+
+def true_peak_factor(fs: int) -> int:
+    """Oversampling needed to see inter-sample peaks (4x at 44.1/48 kHz)."""
+    return 4 if fs < 96000 else 2 if fs < 192000 else 1
+
+
+def loudness(power: float) -> float:
+    """LUFS of a channel-summed mean square (-inf for silence)."""
+    return -0.691 + 10.0 * math.log10(power) if power > 0.0 else -math.inf
+
+
+# -------------------- Kernels --------------------
+
+@numba.njit(cache=True, fastmath=True)
+def k_weighted_energy_kernel(x, coeffs, state, acc, step, done):
+    """
+    x: (N, C). K-weights every channel (two biquads, state (C, 2, 4) = [x1, x2, y1, y2])
+    and sums the squares over channels. acc = [sum, count] of the unfinished 100 ms
+    sub-block; every sub-block that completes (count == step) has its mean square
+    stored in done. Returns how many completed.
+    """
+    N = x.shape[0]
+    C = x.shape[1]
+    s = acc[0]
+    count = int(acc[1])
+    m = 0
+    for n in range(N):
+        e = 0.0
+        for c in range(C):
+            v = float(x[n, c])
+            for j in range(2):
+                y = (coeffs[j, 0] * v + coeffs[j, 1] * state[c, j, 0] + coeffs[j, 2] * state[c, j, 1]
+                     - coeffs[j, 3] * state[c, j, 2] - coeffs[j, 4] * state[c, j, 3])
+                state[c, j, 1] = state[c, j, 0]
+                state[c, j, 0] = v
+                state[c, j, 3] = state[c, j, 2]
+                state[c, j, 2] = y
+                v = y
+            e += v * v
+        s += e
+        count += 1
+        if count == step:
+            done[m] = s / step
+            m += 1
+            s = 0.0
+            count = 0
+    for c in range(C):
+        for j in range(2):
+            for i in range(4):
+                state[c, j, i] = ab.flush_denormal(state[c, j, i])
+    acc[0] = s
+    acc[1] = count
+    return m
+
+
+@numba.njit(cache=True, fastmath=True)
+def true_peak_kernel(bank, hist, x):
+    """
+    bank: (up, taps) polyphase interpolator; hist: (taps - 1, C) previous input.
+    Largest |sample| of x (N, C) upsampled by 'up' (every phase of every input).
+    """
+    N = x.shape[0]
+    C = x.shape[1]
+    up = bank.shape[0]
+    taps = bank.shape[1]
+    H = taps - 1
+    peak = 0.0
+    for c in range(C):
+        for n in range(N):
+            for p in range(up):
+                acc = 0.0
+                if n >= H:
+                    for i in range(taps):
+                        acc += bank[p, i] * x[n - i, c]
+                else:
+                    for i in range(taps):
+                        k = n - i
+                        acc += bank[p, i] * (x[k, c] if k >= 0 else hist[H + k, c])
+                if abs(acc) > peak:
+                    peak = abs(acc)
+    # slide history
+    if N >= H:
+        for j in range(H):
+            for c in range(C):
+                hist[j, c] = x[N - H + j, c]
+    else:
+        for j in range(H - N):
+            for c in range(C):
+                hist[j, c] = hist[j + N, c]
+        for j in range(N):
+            for c in range(C):
+                hist[H - N + j, c] = x[j, c]
+    return peak
+
+
+# -------------------- Meter --------------------
+
+class GatedHistogram:
+    """
+    Loudness values binned at HIST_RESOLUTION above the absolute gate, with the
+    power summed per bin: adding a value is O(1) and gated means/percentiles
+    cost a fixed number of bins however long the programme is.
+    """
+    def __init__(self):
+        self.bins = int(round((HIST_MAX - ABSOLUTE_GATE) / HIST_RESOLUTION))
+        self.counts = np.zeros(self.bins, dtype=np.int64)
+        self.power = np.zeros(self.bins, dtype=np.float64)
+
+    def add(self, power: float):
+        lufs = loudness(power)
+        if lufs < ABSOLUTE_GATE:
+            return
+        i = min(int((lufs - ABSOLUTE_GATE) / HIST_RESOLUTION), self.bins - 1)
+        self.counts[i] += 1
+        self.power[i] += power
+
+    def _above(self, relative_gate: float) -> int | None:
+        """First bin above the relative gate, None when nothing passed the absolute gate."""
+        n = self.counts.sum()
+        if n == 0:
+            return None
+        gate = loudness(self.power.sum() / n) + relative_gate
+        return max(0, int(math.ceil((gate - ABSOLUTE_GATE) / HIST_RESOLUTION)))
+
+    def gated_loudness(self, relative_gate: float) -> float | None:
+        first = self._above(relative_gate)
+        if first is None:
+            return None
+        n = self.counts[first:].sum()
+        return loudness(self.power[first:].sum() / n) if n else None
+
+    def gated_range(self, relative_gate: float, percentiles: tuple[float, float]) -> float | None:
+        first = self._above(relative_gate)
+        if first is None:
+            return None
+        cum = np.cumsum(self.counts[first:])
+        if cum.size == 0 or cum[-1] == 0:
+            return None
+        lo, hi = (np.searchsorted(cum, p / 100.0 * cum[-1]) for p in percentiles)
+        return float(hi - lo) * HIST_RESOLUTION
+
+
+class LoudnessMeter:
+    """
+    Incremental EBU R128 meter: momentary, short-term and integrated loudness,
+    loudness range and true peak. feed() any block size; the work per block is
+    the K-weighting and oversampling plus O(1) per completed 100 ms sub-block.
+    """
+    def __init__(self, fs: int, channels: int):
+        self.fs = int(fs)
+        self.channels = channels
+        self.step = int(round(fs * STEP_S))
+        self._coeffs = k_weighting(fs)
+        self._state = np.zeros((channels, 2, 4), dtype=np.float64)
+        self._acc = np.zeros(2, dtype=np.float64)
+        self._done = np.zeros(16, dtype=np.float64)
+        # mean squares of the last SHORT_TERM_STEPS sub-blocks
+        self._steps = np.zeros(SHORT_TERM_STEPS, dtype=np.float64)
+        self.n_steps = 0
+        self._bank = ab.design_polyphase(true_peak_factor(self.fs), 1, TRUE_PEAK_TAPS)
+        self._tp_hist = np.zeros((TRUE_PEAK_TAPS - 1, channels), dtype=np.float32)
+        self.frames = 0
+        self.true_peak = 0.0
+        self.max_momentary = -math.inf
+        self.max_short_term = -math.inf
+        self._integrated = GatedHistogram()
+        self._short_term = GatedHistogram()
+
+    def feed(self, x: np.ndarray):
+        """x: (N, channels) float32."""
+        n = x.shape[0]
+        if n == 0:
+            return
+        if self._done.shape[0] < n // self.step + 1:
+            self._done = np.zeros(n // self.step + 1, dtype=np.float64)
+        self.frames += n
+        self.true_peak = max(self.true_peak, true_peak_kernel(self._bank, self._tp_hist, x))
+        m = k_weighted_energy_kernel(x, self._coeffs, self._state, self._acc, self.step, self._done)
+        for j in range(m):
+            self._add_step(float(self._done[j]))
+
+    def _add_step(self, power: float):
+        self._steps[self.n_steps % SHORT_TERM_STEPS] = power
+        self.n_steps += 1
+        if self.n_steps >= MOMENTARY_STEPS:
+            block = self._window(MOMENTARY_STEPS)
+            self._integrated.add(block)
+            self.max_momentary = max(self.max_momentary, loudness(block))
+        if self.n_steps >= SHORT_TERM_STEPS:
+            block = self._window(SHORT_TERM_STEPS)
+            self._short_term.add(block)
+            self.max_short_term = max(self.max_short_term, loudness(block))
+
+    def _window(self, steps: int) -> float:
+        """Mean square of the newest 'steps' sub-blocks (at most 30 adds)."""
+        total = 0.0
+        for j in range(1, steps + 1):
+            total += self._steps[(self.n_steps - j) % SHORT_TERM_STEPS]
+        return total / steps
+
+    @property
+    def momentary(self) -> float | None:
+        return loudness(self._window(MOMENTARY_STEPS)) if self.n_steps >= MOMENTARY_STEPS else None
+
+    @property
+    def short_term(self) -> float | None:
+        return loudness(self._window(SHORT_TERM_STEPS)) if self.n_steps >= SHORT_TERM_STEPS else None
+
+    @property
+    def integrated(self) -> float | None:
+        return self._integrated.gated_loudness(RELATIVE_GATE)
+
+    @property
+    def loudness_range(self) -> float | None:
+        return self._short_term.gated_range(LRA_RELATIVE_GATE, LRA_PERCENTILES)
+
+    @property
+    def true_peak_db(self) -> float | None:
+        return 20.0 * math.log10(self.true_peak) if self.true_peak > 0.0 else None
+
+    def snapshot(self) -> dict:
+        """JSON-ready values rounded to 0.1 (None while undefined or silent)."""
+        def r(v):
+            return None if v is None or not math.isfinite(v) else round(v, 1)
+        return {
+            'momentary': r(self.momentary),
+            'short_term': r(self.short_term),
+            'integrated': r(self.integrated),
+            'lra': r(self.loudness_range),
+            'true_peak': r(self.true_peak_db),
+            'max_momentary': r(self.max_momentary),
+            'max_short_term': r(self.max_short_term),
+            'duration': round(self.frames / self.fs, 1),
+        }
+
+
+def measure_loudness(audio: np.ndarray, fs: int, blocksize: int = 65536) -> dict:
+    """Snapshot of a whole file (N, C) through a fresh meter."""
+    audio = np.ascontiguousarray(audio, dtype=np.float32)
+    meter = LoudnessMeter(fs, audio.shape[1])
+    for i in range(0, audio.shape[0], blocksize):
+        meter.feed(audio[i:i + blocksize])
+    return meter.snapshot()
+
+
+class LoudnessTap(ab.Effect):
+    """
+    Transparent effect copying every channel of each block into an SPSC ring;
+    the meter drains it on another thread (see AudioEngine.update_loudness).
+    """
+    def __init__(self, ring: ab.SPSCRing):
+        self.ring = ring
+
+    def memory_samples(self) -> int:
+        return 0
+
+    def process_into(self, x_in: np.ndarray, out: np.ndarray) -> None:
+        out[:] = x_in
+        if self.ring.begin_write(x_in.shape[0]):
+            for c in range(self.ring.channels):
+                self.ring.write_column(c, x_in[:, min(c, x_in.shape[1] - 1)])
+            self.ring.commit_write()
@@ -0,0 +1,88 @@
+from __future__ import annotations
+import numpy as np
+
+
+class AudioMetrics:
+    """
+    Preallocated rings written from the audio thread (plain index stores, no
+    allocation) and aggregated from a control thread with snapshot().
+    Reads are not synchronised with writes: a torn row only skews one sample.
+    """
+    def __init__(self, capacity: int = 2048, max_effects: int = 32):
+        self.capacity = capacity
+        self.max_effects = max_effects
+
+        # per PortAudio callback
+        self.callback_ns = np.zeros(capacity, dtype=np.int64)
+        self.deadline_ns = np.zeros(capacity, dtype=np.int64)
+        self.callbacks = 0
+        self.xruns = 0
+
+        # per chain block (differs from callbacks when the chain resamples)
+        self.effect_ns = np.zeros((capacity, max_effects), dtype=np.int64)
+        self.blocks = 0
+        self.effect_labels: list[str] = []
+
+    def set_effects(self, labels: list[str]):
+        """Called when a new chain is attached; columns follow the chain order."""
+        self.effect_labels = list(labels[:self.max_effects])
+        self.effect_ns.fill(0)
+        self.blocks = 0
+
+    def record_callback(self, duration_ns: int, deadline_ns: int, xrun: bool = False):
+        i = self.callbacks % self.capacity
+        self.callback_ns[i] = duration_ns
+        self.deadline_ns[i] = deadline_ns
+        self.callbacks += 1
+        if xrun:
+            self.xruns += 1
+
+    def next_block_row(self) -> np.ndarray:
+        """Row of effect_ns to fill for the chain block about to run."""
+        row = self.effect_ns[self.blocks % self.capacity]
+        self.blocks += 1
+        return row
+
+    @staticmethod
+    def _summary(values: np.ndarray) -> dict:
+        if values.size == 0:
+            return {'p50': 0.0, 'p99': 0.0, 'max': 0.0}
+        p50, p99 = np.percentile(values, (50, 99))
+        return {'p50': round(float(p50), 2), 'p99': round(float(p99), 2), 'max': round(float(values.max()), 2)}
+
+    def snapshot(self, queue_drops: int = 0) -> dict:
+        n_cb = min(self.callbacks, self.capacity)
+        cb_us = self.callback_ns[:n_cb] / 1e3
+        deadline = np.maximum(self.deadline_ns[:n_cb], 1)
+        load_pct = 100.0 * self.callback_ns[:n_cb] / deadline
+
+        n_blk = min(self.blocks, self.capacity)
+        effects = {}
+        for j, label in enumerate(self.effect_labels):
+            effects[label] = self._summary(self.effect_ns[:n_blk, j] / 1e3)
+
+        return {
+            'callbacks': self.callbacks,
+            'xruns': self.xruns,
+            'queue_drops': int(queue_drops),
+            'callback_us': self._summary(cb_us),
+            'cpu_load_pct': self._summary(load_pct),
+            'effect_us': effects,
+        }
+
+
+def metrics_to_text(snapshot: dict, prefix: str = "audio") -> str:
+    """Plain-text (Prometheus exposition style) rendering of a snapshot."""
+    lines = [
+        f"{prefix}_callbacks_total {snapshot['callbacks']}",
+        f"{prefix}_xruns_total {snapshot['xruns']}",
+        f"{prefix}_queue_drops_total {snapshot['queue_drops']}",
+    ]
+    quantiles = (('p50', '0.5'), ('p99', '0.99'), ('max', '1'))
+    for name in ('callback_us', 'cpu_load_pct'):
+        for key, q in quantiles:
+            lines.append(f'{prefix}_{name}{{quantile="{q}"}} {snapshot[name][key]}')
+    for label, summary in snapshot['effect_us'].items():
+        for key, q in quantiles:
+            lines.append(f'{prefix}_effect_us{{effect="{label}",quantile="{q}"}} {summary[key]}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,193 @@
+from __future__ import annotations
+import math
+import numpy as np
+import numba
+
+from .params import ParamStore, SmoothParam
+
+
+LFO_SHAPES = {'sine': 0, 'triangle': 1, 'square': 2, 'sample_hold': 3}
+
+
+# -------------------- Kernels --------------------
+
+@numba.njit(cache=True, fastmath=True)
+def lfo_kernel(n, phase, inc, shape, held, seed):
+    """
+    Advances the LFO by n samples in closed form and returns its bipolar value
+    in [-1, 1] at the last of them, with the new phase/held/seed.
+    phase in [0, 1), inc = rate / fs (< 1); 'held'/'seed' carry the sample & hold state
+    """
+    last = phase + (n - 1) * inc
+    wraps_last = math.floor(last)
+    wraps = math.floor(phase + n * inc)
+    for w in range(wraps):
+        if w == wraps_last:
+            # the level the last sample holds
+            held_last = held
+        # new random level once per cycle (LCG, no allocation)
+        seed = (seed * 1103515245 + 12345) & 0x7fffffff
+        held = 2.0 * (seed / 2147483647.0) - 1.0
+    if wraps == wraps_last:
+        held_last = held
+
+    p = last - wraps_last
+    if shape == 0:
+        v = math.sin(2.0 * np.pi * p)
+    elif shape == 1:
+        v = 4.0 * abs(p - 0.5) - 1.0
+    elif shape == 2:
+        v = 1.0 if p < 0.5 else -1.0
+    else:
+        v = held_last
+    return v, phase + n * inc - wraps, held, seed
+
+
+@numba.njit(cache=True, fastmath=True)
+def envelope_kernel(x, env, att_coeff, rel_coeff, gain):
+    """
+    x: (N, C) audio. Peak follower on the loudest channel with separate
+    attack/release; returns the envelope state after the block.
+    """
+    for n in range(x.shape[0]):
+        lvl = 0.0
+        for c in range(x.shape[1]):
+            a = abs(x[n, c])
+            if a > lvl:
+                lvl = a
+        lvl *= gain
+        coeff = att_coeff if lvl > env else rel_coeff
+        env += coeff * (lvl - env)
+    return env
+
+
+# no fastmath: it assumes finite values and folds the unbounded-range check away
+@numba.njit(cache=True)
+def apply_routes_kernel(mod, lo, hi, size, route_param, route_src, route_depth, src_values):
+    """
+    Rewrites the whole modulation offset block: mod[p] = sum(depth * value * range).
+    Depth is a fraction of the parameter range (absolute units if unbounded).
+    """
+    for i in range(size):
+        mod[i] = 0.0
+    for r in range(route_param.shape[0]):
+        p = route_param[r]
+        span = hi[p] - lo[p]
+        if not math.isfinite(span):
+            span = 1.0
+        mod[p] += route_depth[r] * src_values[route_src[r]] * span
+
+
+# -------------------- Sources --------------------
+
+class LFO:
+    """
+    Sine/triangle/square/sample & hold. With 'bpm' set, one cycle lasts 'beats' beats.
+    Like every source, it yields one value per block (its last sample).
+    """
+    def __init__(self, shape='sine', rate_hz=1.0, bpm=None, beats=1.0, phase=0.0, seed=1):
+        self.shape = LFO_SHAPES.get(shape, 0)
+        self.rate_hz = float(rate_hz)
+        self.bpm = None if bpm is None else float(bpm)
+        self.beats = max(float(beats), 1e-3)
+        self.phase = float(phase) % 1.0
+        self._held = 0.0
+        self._seed = int(seed)
+        self._fs = 48000.0
+
+    @property
+    def rate(self) -> float:
+        if self.bpm is not None:
+            return self.bpm / 60.0 / self.beats
+        return self.rate_hz
+
+    def prepare(self, sample_rate: int, blocksize: int):
+        self._fs = float(sample_rate)
+
+    def process(self, x_block: np.ndarray) -> float:
+        value, self.phase, self._held, self._seed = lfo_kernel(
+            x_block.shape[0], self.phase, self.rate / self._fs, self.shape, self._held, self._seed
+        )
+        return value
+
+
+class EnvelopeFollower:
+    """Follows the chain input level; sensitivity scales it before the [0, 1] clamp."""
+    def __init__(self, attack_ms=10.0, release_ms=150.0, sensitivity=2.0):
+        self.attack_ms = float(attack_ms)
+        self.release_ms = float(release_ms)
+        self.sensitivity = float(sensitivity)
+        self._env = 0.0
+        self._att = 1.0
+        self._rel = 1.0
+
+    def _coeff(self, time_ms, fs):
+        return 1.0 - math.exp(-1.0 / (max(time_ms, 0.01) * 1e-3 * fs))
+
+    def prepare(self, sample_rate: int, blocksize: int):
+        self._att = self._coeff(self.attack_ms, sample_rate)
+        self._rel = self._coeff(self.release_ms, sample_rate)
+
+    def process(self, x_block: np.ndarray) -> float:
+        self._env = envelope_kernel(x_block, self._env, self._att, self._rel, self.sensitivity)
+        return min(self._env, 1.0)
+
+
+SOURCE_TYPES = {
+    'lfo': (LFO, ('shape', 'rate_hz', 'bpm', 'beats', 'phase', 'seed')),
+    'envelope': (EnvelopeFollower, ('attack_ms', 'release_ms', 'sensitivity')),
+}
+
+
+def make_source(config: dict):
+    """
+    {'type': 'lfo', 'shape': ..., 'rate_hz': ..., 'bpm': ..., 'beats': ...} or {'type': 'envelope', ...}.
+    None for an unknown type or key, or a value the source cannot take.
+    """
+    cls, keys = SOURCE_TYPES.get(config.get('type', 'lfo'), (None, ()))
+    kwargs = {k: v for k, v in config.items() if k != 'type'}
+    if cls is None or any(k not in keys for k in kwargs):
+        return None
+    try:
+        return cls(**kwargs)
+    except (TypeError, ValueError):
+        return None
+
+
+# -------------------- Routing --------------------
+
+class ModulationMatrix:
+    """
+    Runs every source once per chain block (on the chain input) and writes the
+    summed offsets into the chain's ParamStore.mod, which SmoothParam adds to
+    the user target. Modulation is control rate: one value per source and block,
+    which the per-sample parameter ramps then interpolate across the next block.
+    Nothing here goes through the network or per-sample Python.
+    """
+    def __init__(self, store: ParamStore):
+        self.store = store
+        self.sources: list = []
+        self._route_param = np.zeros(0, dtype=np.int64)
+        self._route_src = np.zeros(0, dtype=np.int64)
+        self._route_depth = np.zeros(0, dtype=np.float64)
+        self._values = np.zeros(0, dtype=np.float64)
+
+    def add_route(self, source, param: SmoothParam, depth: float):
+        if param._store is not self.store:
+            raise ValueError("parameter does not belong to this chain")
+        self.sources.append(source)
+        self._route_param = np.append(self._route_param, param._idx)
+        self._route_src = np.append(self._route_src, len(self.sources) - 1)
+        self._route_depth = np.append(self._route_depth, float(depth))
+        self._values = np.zeros(len(self.sources), dtype=np.float64)
+
+    def prepare(self, sample_rate: int, blocksize: int):
+        for src in self.sources:
+            src.prepare(sample_rate, blocksize)
+
+    def process(self, x_block: np.ndarray):
+        for i, src in enumerate(self.sources):
+            self._values[i] = src.process(x_block)
+        st = self.store
+        apply_routes_kernel(st.mod, st.lo, st.hi, st.size,
+                            self._route_param, self._route_src, self._route_depth, self._values)
@@ -4,62 +4,27 @@ import numba
 import audioblocks as ab
 import math
 
-# 1. Helper for Cubic Interpolation (Hermite)
-# significantly reduces "fuzz" and aliasing compared to linear
-@numba.njit(cache=True, inline='always')
-def cubic_interp(x, y0, y1, y2, y3):
-    c0 = y1
-    c1 = 0.5 * (y2 - y0)
-    c2 = y0 - 2.5 * y1 + 2.0 * y2 - 0.5 * y3
-    c3 = 0.5 * (y3 - y0) + 1.5 * (y1 - y2)
-    return ((c3 * x + c2) * x + c1) * x + c0
-
 @numba.njit(cache=True, fastmath=True)
 def pitch_shift_kernel_cubic(buf, w, size, x_in, x_out, phasor, step):
+    """
+    Two Hann-windowed grains reading the power-of-two ring 'buf' (see
+    audioblocks.ring) at delays sweeping over the last 'size' samples.
+    """
     frames = x_in.shape[0]
     PI_2 = 2.0 * np.pi
-    
-    # Pre-calculate safe size mask for faster wrapping
-    # (Assumes power of 2 size would be faster with bitwise & size-1, 
-    # but modulo is fine here)
-    
+
     for i in range(frames):
-        # 1. Write input
-        val_in = x_in[i, 0]
-        buf[w] = val_in
+        # 1. Write input (reads below see it at delay 0)
+        buf[w] = x_in[i, 0]
         
         # 2. Calculate Phasors
         p1 = phasor
         p2 = phasor + 0.5
         if p2 >= 1.0: p2 -= 1.0
 
-        # --- TAP 1 (Cubic) ---
-        # Calculate precise read position
-        # We add 'size' before modulo to ensure positivity
-        raw_idx1 = float(w) - (p1 * float(size)) + float(size)
-        idx1_floor = int(raw_idx1)
-        frac1 = raw_idx1 - idx1_floor
-        
-        # Get 4 samples for cubic interpolation
-        # Using simple modulo for safety on all taps
-        i1_0 = (idx1_floor - 1) % size
-        i1_1 = idx1_floor % size
-        i1_2 = (idx1_floor + 1) % size
-        i1_3 = (idx1_floor + 2) % size
-        
-        samp1 = cubic_interp(frac1, buf[i1_0], buf[i1_1], buf[i1_2], buf[i1_3])
-
-        # --- TAP 2 (Cubic) ---
-        raw_idx2 = float(w) - (p2 * float(size)) + float(size)
-        idx2_floor = int(raw_idx2)
-        frac2 = raw_idx2 - idx2_floor
-        
-        i2_0 = (idx2_floor - 1) % size
-        i2_1 = idx2_floor % size
-        i2_2 = (idx2_floor + 1) % size
-        i2_3 = (idx2_floor + 2) % size
-        
-        samp2 = cubic_interp(frac2, buf[i2_0], buf[i2_1], buf[i2_2], buf[i2_3])
+        # --- TAPS (Cubic interpolation, masked indexing) ---
+        samp1 = ab.ring_read_cubic(buf, w, p1 * size)
+        samp2 = ab.ring_read_cubic(buf, w, p2 * size)
 
         # 3. Windowing (Hanning)
         # 0.5 * (1 - cos) is standard Hanning.
@@ -71,8 +36,7 @@ def pitch_shift_kernel_cubic(buf, w, size, x_in, x_out, phasor, step):
         x_out[i, 0] = wet_sig
 
         # 4. Advance pointers
-        w += 1
-        if w >= size: w = 0
+        w = (w + 1) & (buf.shape[0] - 1)
         
         phasor += step
         # Handle wrapping in both directions (for pitch up or down)
@@ -81,8 +45,41 @@ def pitch_shift_kernel_cubic(buf, w, size, x_in, x_out, phasor, step):
 
     return w, phasor
 
+
+@numba.njit(cache=True, fastmath=True)
+def octaver_mix_kernel(x_in, wet, out, wet_gain):
+    """Dry from each input channel (channel 0 for extra outputs) blended with the mono wet signal."""
+    C = x_in.shape[1]
+    for ch in range(out.shape[1]):
+        src = ch if ch < C else 0
+        for i in range(out.shape[0]):
+            inp = x_in[i, src]
+            out[i, ch] = inp + (wet[i, 0] - inp) * wet_gain[i]
+
+
+@numba.njit(cache=True, fastmath=True)
+def octaver_step(x_in, out, params, args):
+    """Fused form of OctaverEffect.process_into (see Effect.fused_step)."""
+    i_semi, i_mix, mix_mode, mix_step, buf, size, w, phasor, mono, wet, mix_gain = args
+    semi = ab.step_param(params, i_semi, 0.5)
+    ratio = 2.0 ** (semi / 12.0)
+    step = (1.0 - ratio) / size
+
+    n = x_in.shape[0]
+    C = x_in.shape[1]
+    for i in range(n):
+        acc = 0.0
+        for c in range(C):
+            acc += x_in[i, c]
+        mono[i, 0] = acc / C
+
+    w[0], phasor[0] = pitch_shift_kernel_cubic(buf, w[0], size, mono[:n], wet[:n], phasor[0], step)
+    ab.ramp_param(params, i_mix, mix_gain[:n], mix_step, mix_mode)
+    octaver_mix_kernel(x_in, wet[:n], out, mix_gain[:n])
+
+
 class OctaverEffect(ab.Effect):
-    def __init__(self, semitones=-12.0, mix=0.5, window_ms=40.0):
+    def __init__(self, semitones=-12.0, mix=0.5, window_ms=40.0, mix_ramp_ms=10.0):
         # Parameters
         self.semitones = ab.SmoothParam(semitones, -24.0, 24.0)
         self.mix = ab.SmoothParam(mix, 0.0, 1.0)
@@ -93,58 +90,102 @@ class OctaverEffect(ab.Effect):
         self._fs = 48000
         
         self.buf = np.zeros(1, dtype=np.float32)
-        self.w = 0
-        self.phasor = 0.0
+        # read/write position and grain phase, as arrays so a fused chain updates them in place
+        self._w = np.zeros(1, dtype=np.int64)
+        self._phasor = np.zeros(1, dtype=np.float64)
         self.size = 1
+        self._mono = np.zeros((1, 1), dtype=np.float32)
+        self._wet = np.zeros((1, 1), dtype=np.float32)
+
+        # per-sample mix ramp
+        self._mix_ramp_ms = float(mix_ramp_ms)
+        self._mix_step = 1e-3
+        self._mix_gain = np.empty(1, dtype=np.float32)
+
+    @property
+    def w(self) -> int:
+        return int(self._w[0])
+
+    @w.setter
+    def w(self, v):
+        self._w[0] = v
+
+    @property
+    def phasor(self) -> float:
+        return float(self._phasor[0])
+
+    @phasor.setter
+    def phasor(self, v):
+        self._phasor[0] = v
 
     def set_semitones(self, v): self.semitones.set_target(v)
     def set_mix(self, v): self.mix.set_target(v)
 
     def prepare(self, sample_rate: int, channels_in: int, channels_out: int, blocksize: int):
         self._fs = sample_rate
+        self._mix_step = 1000.0 / (max(self._mix_ramp_ms, 1e-3) * sample_rate)
+        self._mix_gain = np.empty(blocksize, dtype=np.float32)
+        self._mono = np.zeros((blocksize, 1), dtype=np.float32)
+        self._wet = np.zeros((blocksize, 1), dtype=np.float32)
         # Ensure minimum buffer size to prevent crash
         req_size = max(int(self._fs * self.window_ms / 1000.0), 16)
         
         if req_size != self.size:
             self.size = req_size
-            self.buf = np.zeros(self.size, dtype=np.float32)
+            # +2 for the cubic taps around the oldest read
+            self.buf = ab.make_ring(self.size + 2)
             # We don't reset w/phasor here to avoid clicks if parameters change live,
             # but we must ensure w is within bounds.
             self.w = 0 
             self.phasor = 0.0
 
+    def memory_samples(self) -> int:
+        # the grains only ever read the last 'size' samples (+2 for the cubic taps)
+        return self.size + 2
+
+    def seek(self, frame: int) -> None:
+        # the grain phasor runs freely; put it where a render from frame 0 would have it
+        ratio = 2.0 ** (self.semitones.target / 12.0)
+        self.phasor = (frame * (1.0 - ratio) / self.size) % 1.0
+
+    def fused_step(self):
+        args = (self.semitones._idx, self.mix._idx, self.mix.mode, self._mix_step, self.buf, self.size,
+                self._w, self._phasor, self._mono, self._wet, self._mix_gain)
+        return octaver_step, args
+
     def process_into(self, x_in: np.ndarray, out: np.ndarray) -> None:
         semi = self.semitones.step_towards(0.5)
-        mix_now = self.mix.step_towards(0.05)
 
         # Calculate step
         ratio = 2.0 ** (semi / 12.0)
         step = (1.0 - ratio) / self.size
 
         # Create mono input (average of channels)
+        n = x_in.shape[0]
+        mono_in = self._mono[:n]
         if x_in.shape[1] > 1:
-            mono_in = np.mean(x_in, axis=1, keepdims=True)
+            np.mean(x_in, axis=1, keepdims=True, out=mono_in)
         else:
-            mono_in = x_in
+            mono_in[:] = x_in
 
         # Helper buffer for wet output
-        mono_wet = np.zeros_like(mono_in)
+        mono_wet = self._wet[:n]
         
         # Run Kernel (Outputs Pure Wet Signal)
-        self.w, self.phasor = pitch_shift_kernel_cubic(
-            self.buf, self.w, self.size, 
-            mono_in, mono_wet, 
-            self.phasor, step
-        )
+        with ab.TRACER.kernel("pitch_shift_kernel_cubic"):
+            self._w[0], self._phasor[0] = pitch_shift_kernel_cubic(
+                self.buf, self._w[0], self.size, 
+                mono_in, mono_wet, 
+                self._phasor[0], step
+            )
 
         # Mix Dry/Wet in the wrapper, not the kernel
         # This prevents gain staging errors.
-        # Equal Power crossfade or simple linear blend:
-        dry_gain = 1.0 - mix_now
-        wet_gain = mix_now
+        # Simple linear blend, with the mix ramped per sample:
+        wet_gain = self._mix_gain[:n]
+        self.mix.ramp_into(wet_gain, self._mix_step)
         
-        # If input is stereo, we apply mono wet signal to both channels
-        for ch in range(out.shape[1]):
-            # Use input channel for dry component to preserve stereo image of dry signal
-            inp_ch = x_in[:, ch] if ch < x_in.shape[1] else x_in[:, 0]
-            out[:, ch] = (inp_ch * dry_gain) + (mono_wet[:, 0] * wet_gain)
+        # If input is stereo, we apply mono wet signal to both channels,
+        # using each input channel for the dry component to preserve its stereo image
+        with ab.TRACER.kernel("octaver_mix_kernel"):
+            octaver_mix_kernel(x_in, mono_wet, out, wet_gain)
@@ -0,0 +1,50 @@
+from __future__ import annotations
+import numpy as np
+
+
+def plan_segments(n: int, workers: int, pre_roll: int, post_roll: int, crossfade: int,
+                  align: int = 1, min_frames: int = 0) -> list[tuple[int, int, int, int]]:
+    """
+    Splits n frames into at most 'workers' segments (start, stop, pre_start, post_stop):
+    [start, stop) is kept, [stop, stop + crossfade) overlaps the next segment and
+    [pre_start, post_stop) is what gets rendered. pre_start leaves pre_roll frames
+    of context for the effect state and is rounded down to a multiple of 'align'.
+    Segments shorter than max(min_frames, 2 * pre_roll) are not worth it, so fewer
+    are used, down to a single one (a plain sequential render).
+    """
+    workers = max(1, int(workers))
+    min_len = max(int(min_frames), 2 * int(pre_roll), 1)
+    count = max(1, min(workers, n // min_len))
+
+    bounds = [(i * n) // count for i in range(count + 1)]
+    segments = []
+    for i in range(count):
+        start, stop = bounds[i], bounds[i + 1]
+        pre_start = 0 if i == 0 else max(0, start - pre_roll)
+        pre_start -= pre_start % align
+        tail = 0 if i == count - 1 else crossfade
+        segments.append((start, stop, pre_start, min(n, stop + tail + post_roll)))
+    return segments
+
+
+def stitch_segments(segments: list[tuple[int, int, int, int]], parts: list[np.ndarray],
+                    out: np.ndarray, crossfade: int):
+    """
+    parts[i] is the render of audio[pre_start:post_stop] for segments[i]. Writes
+    the kept frames into out, with a linear crossfade where neighbours overlap.
+    """
+    for i, ((start, stop, pre_start, _), part) in enumerate(zip(segments, parts)):
+        k = start - pre_start
+        length = stop - start
+        if i == 0:
+            out[start:stop] = part[k:k + length]
+        else:
+            # the previous segment already wrote its overlap into out[start:start + fade]
+            fade = min(crossfade, length)
+            ramp = np.linspace(0.0, 1.0, fade, endpoint=False, dtype=np.float32)[:, None]
+            out[start:start + fade] = out[start:start + fade] * (1.0 - ramp) + part[k:k + fade] * ramp
+            out[start + fade:stop] = part[k + fade:k + length]
+        if i + 1 < len(segments):
+            next_start, next_stop = segments[i + 1][:2]
+            fade = min(crossfade, next_stop - next_start)
+            out[stop:stop + fade] = part[k + length:k + length + fade]
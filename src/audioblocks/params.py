@@ -0,0 +1,212 @@
+from __future__ import annotations
+import numpy as np
+import numba
+
+
+RAMP_LINEAR = 0
+RAMP_EXP = 1
+
+
+@numba.njit(cache=True, inline='always')
+def ramp_next(cur, target, step, mode):
+    """
+    One sample of smoothing towards target.
+    linear: step is the max change per sample; exp: step is the one-pole coefficient.
+    """
+    delta = target - cur
+    if mode == RAMP_LINEAR:
+        if delta > step:
+            return cur + step
+        if delta < -step:
+            return cur - step
+        return target
+    if abs(delta) < 1e-7:
+        return target
+    return cur + step * delta
+
+
+@numba.njit(cache=True, fastmath=True)
+def ramp_kernel(out, cur, target, step, mode):
+    """Fills out (N,) with the per-sample ramp and returns the last value."""
+    for n in range(out.shape[0]):
+        cur = ramp_next(cur, target, step, mode)
+        out[n] = cur
+    return cur
+
+
+@numba.njit(cache=True, fastmath=True)
+def mix_ramped_kernel(dry, wet, out, dry_gain, wet_gain):
+    """
+    dry, wet, out: (N, C); dry_gain, wet_gain: (N,) ramps from SmoothParam.ramp_into.
+    out = dry * dry_gain + wet * wet_gain, clipped to [-1, 1].
+    """
+    for n in range(out.shape[0]):
+        gd = dry_gain[n]
+        gw = wet_gain[n]
+        for c in range(out.shape[1]):
+            y = gd * dry[n, c] + gw * wet[n, c]
+            if y > 1.0:
+                y = 1.0
+            elif y < -1.0:
+                y = -1.0
+            out[n, c] = y
+
+
+# -------------------- compiled-chain access --------------------
+# 'params' is the (current, target, mod, lo, hi) tuple of a ParamStore, see ParamStore.arrays()
+
+@numba.njit(cache=True, inline='always')
+def effective_target(params, i):
+    """Same as SmoothParam._effective_target, for fused effect steps."""
+    v = params[1][i] + params[2][i]
+    return min(max(v, params[3][i]), params[4][i])
+
+
+@numba.njit(cache=True)
+def step_param(params, i, max_step):
+    """Same as SmoothParam.step_towards, for fused effect steps."""
+    cur = params[0][i]
+    delta = effective_target(params, i) - cur
+    cur += min(max(delta, -max_step), max_step)
+    params[0][i] = cur
+    return cur
+
+
+@numba.njit(cache=True)
+def ramp_param(params, i, out, step, mode):
+    """Same as SmoothParam.ramp_into, for fused effect steps."""
+    cur = ramp_kernel(out, params[0][i], effective_target(params, i), step, mode)
+    params[0][i] = cur
+    return cur
+
+
+class ParamStore:
+    """
+    Array-backed parameter block, one per EffectsChain.
+
+    Control threads write 'target'; the audio thread reads targets and owns
+    'current'. Each slot is a single float store,
+    so neither side takes a lock. Slots are only added while a chain is being
+    built, before the audio thread sees it.
+
+    'mod' holds offsets written by the chain's ModulationMatrix; params smooth
+    towards clamp(target + mod).
+    """
+    def __init__(self, capacity: int = 32):
+        self.size = 0
+        self.current = np.zeros(capacity, dtype=np.float64)
+        self.target = np.zeros(capacity, dtype=np.float64)
+        self.lo = np.zeros(capacity, dtype=np.float64)
+        self.hi = np.zeros(capacity, dtype=np.float64)
+        self.mod = np.zeros(capacity, dtype=np.float64)
+
+    def _grow(self):
+        cap = 2 * self.current.shape[0]
+        for name in ('current', 'target', 'lo', 'hi', 'mod'):
+            old = getattr(self, name)
+            new = np.zeros(cap, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def allocate(self, value: float, lo: float, hi: float) -> int:
+        if self.size == self.current.shape[0]:
+            self._grow()
+        i = self.size
+        self.current[i] = value
+        self.target[i] = value
+        self.lo[i] = lo
+        self.hi[i] = hi
+        self.size += 1
+        return i
+
+    def arrays(self) -> tuple:
+        """(current, target, mod, lo, hi): what compiled chains read and write. Replaced on _grow()."""
+        return (self.current, self.target, self.mod, self.lo, self.hi)
+
+    def settled(self) -> bool:
+        """True when every slot's current value sits on its (modulated, clamped) target."""
+        n = self.size
+        goal = np.clip(self.target[:n] + self.mod[:n], self.lo[:n], self.hi[:n])
+        return bool(np.all(self.current[:n] == goal))
+
+    def adopt(self, obj):
+        """Moves every SmoothParam attribute of obj into this store."""
+        for value in vars(obj).values():
+            if isinstance(value, SmoothParam):
+                value.bind(self)
+
+
+class SmoothParam:
+    """Handle to one ParamStore slot; standalone params get a private store."""
+    def __init__(self, value, lo=-np.inf, hi=np.inf, mode=RAMP_LINEAR):
+        self.mode = mode
+        self._store = ParamStore(1)
+        self._idx = self._store.allocate(float(value), float(lo), float(hi))
+
+    def bind(self, store: ParamStore):
+        if store is self._store:
+            return
+        old, i = self._store, self._idx
+        idx = store.allocate(old.current[i], old.lo[i], old.hi[i])
+        store.target[idx] = old.target[i]
+        self._store, self._idx = store, idx
+
+    @property
+    def lo(self) -> float:
+        return float(self._store.lo[self._idx])
+
+    @property
+    def hi(self) -> float:
+        return float(self._store.hi[self._idx])
+
+    @property
+    def current(self) -> float:
+        return float(self._store.current[self._idx])
+
+    @property
+    def target(self) -> float:
+        return float(self._store.target[self._idx])
+
+    # -------------------- control side --------------------
+
+    def set_target(self, v):
+        st, i = self._store, self._idx
+        st.target[i] = min(max(float(v), st.lo[i]), st.hi[i])
+
+    def nudge(self, dv):
+        st, i = self._store, self._idx
+        st.target[i] = min(max(st.target[i] + float(dv), st.lo[i]), st.hi[i])
+
+    # -------------------- audio side --------------------
+
+    def _effective_target(self) -> float:
+        st, i = self._store, self._idx
+        return min(max(float(st.target[i] + st.mod[i]), st.lo[i]), st.hi[i])
+
+    def step_towards(self, max_step=1.0):
+        """Block-rate smoothing: moves current by at most max_step and returns it."""
+        if max_step < 0:
+            raise ValueError("max_step must be >= 0")
+        st, i = self._store, self._idx
+        cur = float(st.current[i])
+        delta = self._effective_target() - cur
+        cur += min(max(delta, -max_step), max_step)
+        st.current[i] = cur
+        return cur
+
+    def ramp_into(self, out: np.ndarray, step: float) -> float:
+        """
+        Sample-rate smoothing: fills out (N,) with a linear or exponential ramp
+        (see ramp_next for the meaning of step) and returns the last value.
+        """
+        st, i = self._store, self._idx
+        cur = ramp_kernel(out, st.current[i], self._effective_target(), step, self.mode)
+        st.current[i] = cur
+        return cur
+
+    def begin_ramp(self):
+        """(current, target) for kernels that ramp inline with ramp_next; finish with end_ramp."""
+        return self._store.current[self._idx], self._effective_target()
+
+    def end_ramp(self, value: float):
+        self._store.current[self._idx] = value
@@ -0,0 +1,181 @@
+from __future__ import annotations
+import math
+import time
+import threading
+import numpy as np
+import numba
+
+import audioblocks as ab
+
+
+WINDOW_S = 0.05         # analysis window; half of it is the longest period searched
+HOP_S = 0.01
+FMIN = 40.0             # Hz, the open E of a 4-string bass is 41.2 Hz
+FMAX = 1500.0
+YIN_THRESHOLD = 0.15    # first CMND dip below this is taken as the period
+MIN_CONFIDENCE = 0.5    # 1 - CMND at the chosen period; lower is reported unvoiced
+SILENCE_DB = -50.0      # windows quieter than this (RMS dBFS) are not analysed
+PENDING_FRAMES = 2 ** 15  # input samples buffered between the plot sender and the tracker
+NOTE_NAMES = ('C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B')
+
+
+def yin_cmnd(frames: np.ndarray, tau_max: int) -> np.ndarray:
+    """
+    frames: (K, W) windows -> (K, tau_max + 1) cumulative mean normalized
+    difference (YIN steps 2-3) over an integration window of W - tau_max samples.
+    The autocorrelation term is one batched rfft/irfft instead of O(W * tau_max).
+    """
+    K, W = frames.shape
+    n_int = W - tau_max
+    nfft = 1 << int(math.ceil(math.log2(W + n_int)))
+    spec = np.fft.rfft(frames, nfft, axis=1)
+    head = np.fft.rfft(frames[:, :n_int], nfft, axis=1)
+    # acf[tau] = sum_j x[j] * x[j + tau], j < n_int
+    acf = np.fft.irfft(spec * np.conj(head), nfft, axis=1)[:, :tau_max + 1]
+    # energy of x[tau : tau + n_int] for every tau
+    sq = np.concatenate([np.zeros((K, 1)), np.cumsum(frames.astype(np.float64) ** 2, axis=1)], axis=1)
+    energy = sq[:, n_int:n_int + tau_max + 1] - sq[:, :tau_max + 1]
+    diff = np.maximum(energy[:, :1] + energy - 2.0 * acf, 0.0)
+    cmnd = np.ones_like(diff)
+    running = np.cumsum(diff[:, 1:], axis=1)
+    taus = np.arange(1, tau_max + 1)
+    cmnd[:, 1:] = diff[:, 1:] * taus / np.maximum(running, 1e-12)
+    return cmnd
+
+
+@numba.njit(cache=True)
+def yin_pick(cmnd, tau_min, threshold):
+    """
+    YIN steps 4-5 on one CMND row: the first dip under threshold (followed down to
+    its local minimum), else the global minimum; refined by a parabola through
+    its neighbours. Returns (period in samples, CMND value there).
+    """
+    tau_max = cmnd.shape[0] - 1
+    best = -1
+    tau = tau_min
+    while tau < tau_max:
+        if cmnd[tau] < threshold:
+            while tau + 1 < tau_max and cmnd[tau + 1] < cmnd[tau]:
+                tau += 1
+            best = tau
+            break
+        tau += 1
+    if best < 0:
+        best = tau_min
+        for t in range(tau_min, tau_max):
+            if cmnd[t] < cmnd[best]:
+                best = t
+    if best <= 0 or best >= tau_max:
+        return float(best), cmnd[best]
+    a = cmnd[best - 1]
+    b = cmnd[best]
+    c = cmnd[best + 1]
+    den = a - 2.0 * b + c
+    shift = 0.5 * (a - c) / den if den > 0.0 else 0.0
+    return best + shift, b
+
+
+def frequency_to_note(freq: float, reference_hz: float = 440.0) -> tuple[str, float]:
+    """('E2', cents off) for a frequency, equal temperament around A4 = reference_hz."""
+    midi = 69.0 + 12.0 * math.log2(freq / reference_hz)
+    nearest = int(round(midi))
+    return f"{NOTE_NAMES[nearest % 12]}{nearest // 12 - 1}", 100.0 * (midi - nearest)
+
+
+class PitchTracker:
+    """
+    Monophonic YIN tracker over the input column of the plot ring. The plot
+    sender hands it every frame it drains (push(), a copy into an SPSC ring), and
+    update() analyses all complete hops since the last call, on another thread.
+    Each side holds its own lock, so the ring keeps a single producer and a
+    single consumer even while two connections' senders overlap (a session
+    takeover with an update() still running in an executor).
+    """
+    def __init__(self, fs: int, window_s: float = WINDOW_S, hop_s: float = HOP_S,
+                 fmin: float = FMIN, fmax: float = FMAX, reference_hz: float = 440.0):
+        self.fs = int(fs)
+        self.hop = max(1, int(round(fs * hop_s)))
+        self.tau_max = int(math.ceil(fs / fmin))
+        self.window = max(int(round(fs * window_s)), 2 * self.tau_max)
+        self.tau_min = max(2, int(fs / fmax))
+        self.reference_hz = reference_hz
+        self._pending = ab.SPSCRing(PENDING_FRAMES, 1)
+        self._push_lock = threading.Lock()
+        self._update_lock = threading.Lock()
+        # the last window - hop samples, the start of the next window
+        self._tail = np.zeros(self.window - self.hop, dtype=np.float32)
+        self._silence = 10.0 ** (SILENCE_DB / 20.0)
+        self.hops = 0
+        self.last = None
+        # per-window cost of the last update, microseconds
+        self.cost_us = 0.0
+
+    @property
+    def dropped(self) -> int:
+        return self._pending.overruns
+
+    def push(self, views: list[np.ndarray]):
+        """Producer side: views are (frames, 2) plot ring slices, column 0 = input."""
+        with self._push_lock:
+            for view in views:
+                if self._pending.begin_write(view.shape[0]):
+                    self._pending.write_column(0, view[:, 0])
+                    self._pending.commit_write()
+
+    def update(self) -> dict | None:
+        """
+        Analyses every complete hop pushed so far; the estimate of the newest window,
+        or None (also while another update() is running).
+        """
+        if not self._update_lock.acquire(blocking=False):
+            return None
+        try:
+            return self._update()
+        finally:
+            self._update_lock.release()
+
+    def _update(self) -> dict | None:
+        views = self._pending.read_views()
+        k = sum(v.shape[0] for v in views) // self.hop
+        if k == 0:
+            return None
+        # the tail plus k hops of new input hold exactly k windows
+        used = k * self.hop
+        T = self._tail.shape[0]
+        signal = np.concatenate([self._tail] + [v[:, 0] for v in views])[:T + used]
+        self._pending.advance(used)
+        self._tail = signal[-T:].copy()
+        frames = np.lib.stride_tricks.sliding_window_view(signal, self.window)[::self.hop][:k]
+        self.hops += k
+
+        t0 = time.perf_counter_ns()
+        estimates = self.analyse(frames)
+        self.cost_us = (time.perf_counter_ns() - t0) / 1e3 / k
+        self.last = estimates[-1]
+        return self.last
+
+    def analyse(self, frames: np.ndarray) -> list[dict]:
+        """frames: (K, window) -> one estimate per window."""
+        rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+        voiced = rms > self._silence
+        cmnd = yin_cmnd(frames[voiced], self.tau_max) if voiced.any() else None
+        estimates = []
+        j = 0
+        for i in range(frames.shape[0]):
+            if not voiced[i]:
+                estimates.append(self._estimate(None, 0.0))
+                continue
+            period, value = yin_pick(cmnd[j], self.tau_min, YIN_THRESHOLD)
+            j += 1
+            confidence = max(0.0, 1.0 - float(value))
+            freq = self.fs / period if confidence >= MIN_CONFIDENCE and period > 0 else None
+            estimates.append(self._estimate(freq, confidence))
+        return estimates
+
+    def _estimate(self, freq: float | None, confidence: float) -> dict:
+        if freq is None:
+            return {'type': 'pitch', 'frequency': None, 'note': None, 'cents': None,
+                    'confidence': round(confidence, 2)}
+        note, cents = frequency_to_note(freq, self.reference_hz)
+        return {'type': 'pitch', 'frequency': round(freq, 2), 'note': note, 'cents': round(cents, 1),
+                'confidence': round(confidence, 2)}
@@ -0,0 +1,206 @@
+from __future__ import annotations
+import math
+import functools
+import numpy as np
+import numba
+import scipy.signal
+
+
+TAPS_PER_PHASE = 64
+KAISER_BETA = 8.0
+PASSBAND = 0.92  # fraction of the lower Nyquist kept before the transition band
+
+
+@functools.lru_cache(maxsize=None)
+def design_polyphase(up: int, down: int, taps_per_phase: int = TAPS_PER_PHASE, beta: float = KAISER_BETA) -> np.ndarray:
+    """
+    Kaiser-windowed lowpass split into 'up' phases: bank[p, i] = h[i * up + p].
+    Designed once per rate ratio and shared (read-only) by every resampler using it.
+    """
+    cutoff = PASSBAND / max(up, down)
+    h = scipy.signal.firwin(taps_per_phase * up, cutoff, window=('kaiser', beta)) * up
+    bank = np.ascontiguousarray(h.reshape(taps_per_phase, up).T, dtype=np.float32)
+    bank.flags.writeable = False
+    return bank
+
+
+@numba.njit(cache=True, fastmath=True)
+def polyphase_kernel(bank, hist, x, y, t, up, down):
+    """
+    bank: (up, taps) polyphase filter bank
+    hist: (taps-1, C) last input samples of the previous block
+    x: (N, C) input block, y: (M, C) output scratch, M >= ceil(N * up / down)
+    t: position of the next output on the upsampled grid, relative to x[0]
+    Returns (outputs written, t for the next block).
+    """
+    N = x.shape[0]
+    C = x.shape[1]
+    taps = bank.shape[1]
+    H = taps - 1
+    limit = N * up
+
+    m = 0
+    while t < limit:
+        n = t // up
+        p = t - n * up
+        n_cur = min(taps, n + 1)
+        for c in range(C):
+            acc = 0.0
+            for i in range(n_cur):
+                acc += bank[p, i] * x[n - i, c]
+            for i in range(n_cur, taps):
+                acc += bank[p, i] * hist[H + n - i, c]
+            y[m, c] = acc
+        m += 1
+        t += down
+
+    # slide history
+    if N >= H:
+        for j in range(H):
+            for c in range(C):
+                hist[j, c] = x[N - H + j, c]
+    else:
+        for j in range(H - N):
+            for c in range(C):
+                hist[j, c] = hist[j + N, c]
+        for j in range(N):
+            for c in range(C):
+                hist[H - N + j, c] = x[j, c]
+
+    return m, t - limit
+
+
+class PolyphaseResampler:
+    """Streaming rational resampler; output count per block varies with the phase."""
+    def __init__(self, rate_in: int, rate_out: int, channels: int):
+        g = math.gcd(int(rate_in), int(rate_out))
+        self.up = int(rate_out) // g
+        self.down = int(rate_in) // g
+        self.channels = channels
+        self.bank = design_polyphase(self.up, self.down)
+        taps = self.bank.shape[1]
+        self.hist = np.zeros((taps - 1, channels), dtype=np.float32)
+        self.t = 0
+        # group delay in input samples
+        self.delay = (taps * self.up - 1) / (2.0 * self.up)
+        self.out = np.zeros((1, channels), dtype=np.float32)
+
+    def max_out(self, frames: int) -> int:
+        return -(-frames * self.up // self.down) + 1
+
+    def configure(self, max_frames: int):
+        self.out = np.zeros((self.max_out(max_frames), self.channels), dtype=np.float32)
+
+    def process(self, x: np.ndarray, out: np.ndarray | None = None) -> int:
+        """Resamples x into self.out (or out, sized with max_out()) and returns the number of valid rows."""
+        m, self.t = polyphase_kernel(self.bank, self.hist, x, self.out if out is None else out,
+                                     self.t, self.up, self.down)
+        return m
+
+
+class SampleRateConverter:
+    """
+    SRC at the edges of an EffectsChain: io_rate audio in and out, while the
+    chain itself always runs at internal_rate in fixed blocks of 'blocksize'.
+    FIFOs absorb the varying number of resampled frames per device block.
+    """
+    def __init__(self, io_rate: int, internal_rate: int, channels_in: int, channels_out: int, blocksize: int):
+        self.io_rate = int(io_rate)
+        self.internal_rate = int(internal_rate)
+        self.ci = channels_in
+        self.co = channels_out
+        self.bs = blocksize
+        self.ratio = self.io_rate / self.internal_rate
+        self.underruns = 0
+
+        self._up = PolyphaseResampler(self.io_rate, self.internal_rate, channels_in)
+        self._down = PolyphaseResampler(self.internal_rate, self.io_rate, channels_out)
+        self._down.configure(blocksize)
+        self._mid = np.zeros((blocksize, channels_out), dtype=np.float32)
+
+        # zeros queued on the output side so the device never waits for a full internal block
+        self.prefill = int(math.ceil(blocksize * self.ratio)) + 4
+        latency = self.prefill + self._up.delay + self._down.delay * self.ratio
+        # start the input phase early so the total delay lands (almost) on a whole frame
+        shift = int(round((latency - math.floor(latency)) * self._up.up))
+        self._up.t = shift
+        self.latency = latency - shift / self._up.up
+
+        self._frames = 0
+        self._in_fifo = np.zeros((1, channels_in), dtype=np.float32)
+        self._in_count = 0
+        self._out_fifo = np.zeros((self.prefill, channels_out), dtype=np.float32)
+        self._out_count = self.prefill
+
+    def _configure(self, frames: int):
+        self._frames = frames
+        self._up.configure(frames)
+        in_fifo = np.zeros((self.bs + self._up.max_out(frames), self.ci), dtype=np.float32)
+        in_fifo[:self._in_count] = self._in_fifo[:self._in_count]
+        self._in_fifo = in_fifo
+
+        cap = self.prefill + 4 * (frames + self._down.max_out(self.bs)) + 64
+        out_fifo = np.zeros((cap, self.co), dtype=np.float32)
+        out_fifo[:self._out_count] = self._out_fifo[:self._out_count]
+        self._out_fifo = out_fifo
+
+    def convert_in(self, x: np.ndarray) -> np.ndarray:
+        """
+        Offline counterpart of the input side of process(): resamples all of x
+        in one call and returns every whole block now available at the internal
+        rate, queued frames first. The remainder stays queued.
+        """
+        if self._in_fifo.shape[0] < self.bs:
+            self._configure(self.bs)
+        q = self._in_count
+        mid = np.empty((q + self._up.max_out(x.shape[0]), self.ci), dtype=np.float32)
+        mid[:q] = self._in_fifo[:q]
+        k = q + self._up.process(x, mid[q:])
+        whole = k - k % self.bs
+        self._in_fifo[:k - whole] = mid[whole:k]
+        self._in_count = k - whole
+        return mid[:whole]
+
+    def convert_out(self, y: np.ndarray) -> np.ndarray:
+        """
+        Offline counterpart of the output side of process(): y is what the chain
+        made of convert_in()'s blocks. Returns the whole io-rate output stream,
+        queued frames (the prefill) first, and leaves the output queue empty.
+        """
+        q = self._out_count
+        out = np.empty((q + self._down.max_out(y.shape[0]), self.co), dtype=np.float32)
+        out[:q] = self._out_fifo[:q]
+        k = q + self._down.process(y, out[q:])
+        self._out_count = 0
+        return out[:k]
+
+    def process(self, in_block: np.ndarray, out_block: np.ndarray, process_block) -> None:
+        """process_block(x, out) runs the chain on one (blocksize, ...) block at the internal rate."""
+        frames = in_block.shape[0]
+        if frames > self._frames:
+            self._configure(frames)
+
+        k = self._up.process(in_block)
+        self._in_fifo[self._in_count:self._in_count + k] = self._up.out[:k]
+        self._in_count += k
+
+        bs = self.bs
+        while self._in_count >= bs:
+            process_block(self._in_fifo[:bs], self._mid)
+            rem = self._in_count - bs
+            self._in_fifo[:rem] = self._in_fifo[bs:self._in_count]
+            self._in_count = rem
+
+            k = self._down.process(self._mid)
+            k = min(k, self._out_fifo.shape[0] - self._out_count)
+            self._out_fifo[self._out_count:self._out_count + k] = self._down.out[:k]
+            self._out_count += k
+
+        take = min(frames, self._out_count)
+        out_block[:take] = self._out_fifo[:take]
+        if take < frames:
+            out_block[take:] = 0.0
+            self.underruns += 1
+        rem = self._out_count - take
+        self._out_fifo[:rem] = self._out_fifo[take:self._out_count]
+        self._out_count = rem
@@ -9,61 +9,30 @@ import audioblocks as ab
 # -------------------- Kernels --------------------
 
 @numba.njit(cache=True, fastmath=True)
-def pure_delay_kernel(buf, w, size, x_block, y_out, dS):
+def comb_damped_kernel(buf, w, x_block, y_out, dS, g, h, lp_prev):
     N = x_block.shape[0]
-    if dS == 0:
-        for n in range(N):
-            x = x_block[n, 0]
-            y_out[n, 0] = x      # no delay
-            buf[w] = x
-            w += 1
-            if w == size:
-                w = 0
-        return w
-
     for n in range(N):
-        r = (w - dS) % size
-        y_out[n, 0] = buf[r]
-        buf[w] = x_block[n, 0]
-        w += 1
-        if w == size:
-            w = 0
-    return w
-
-@numba.njit(cache=True, fastmath=True)
-def comb_damped_kernel(buf, w, size, x_block, y_out, dS, g, h, lp_prev):
-    N = x_block.shape[0]
-    for n in range(N):
-        r = (w - dS) % size
-        y = buf[r]
+        y = ab.ring_tap(buf, w, dS)
         damped = (1.0 - h) * y + h * lp_prev
-        lp_prev = damped
+        lp_prev = ab.flush_denormal(damped)
         y_out[n, 0] = y
-        buf[w] = x_block[n, 0] + g * damped
-        w += 1
-        if w == size:
-            w = 0
+        w = ab.ring_push(buf, w, ab.flush_denormal(x_block[n, 0] + g * damped))
     return w, lp_prev
 
 @numba.njit(cache=True, fastmath=True)
-def allpass_kernel(buf, w, size, x_block, y_out, dS, a):
+def allpass_kernel(buf, w, x_block, y_out, dS, a):
     """
     Stable Gardner/Moorer-style allpass diffuser.
     'a' is the feedback gain, typically ~0.5-0.7.
     """
     N = x_block.shape[0]
     for n in range(N):
-        r = (w - dS) % size
-        delayed = buf[r]
+        delayed = ab.ring_tap(buf, w, dS)
         x = x_block[n, 0]
 
         y = delayed - a * x
         y_out[n, 0] = y
-        buf[w] = x + a * y
-
-        w += 1
-        if w == size:
-            w = 0
+        w = ab.ring_push(buf, w, ab.flush_denormal(x + a * y))
     return w
 
 
@@ -92,7 +61,8 @@ class ReverbEffect(ab.Effect):
         # smoothing config
         step_samples = 2.0,         # convert to ms based on fs during prepare()
         rt60_step = 0.05,           # per-block step
-        damp_step = 0.02            # per-block step
+        damp_step = 0.02,           # per-block step
+        mix_ramp_ms = 10.0          # per-sample mix ramp, full 0..1 sweep
     ):
         # topology / constants
         self._comb_ms_base = tuple(float(x) for x in comb_times_ms)
@@ -104,9 +74,9 @@ class ReverbEffect(ab.Effect):
         self._max_delay_ms    = float(max_delay_ms)
         self._max_pre_ms      = float(max_pre_delay_ms)
 
-        # mix
-        self.mix_dry = float(mix_dry)
-        self.mix_wet = float(mix_wet)
+        # mix (ramped per sample)
+        self.mix_dry = ab.SmoothParam(mix_dry, 0.0, 1.0)
+        self.mix_wet = ab.SmoothParam(mix_wet, 0.0, 1.0)
 
         # smoothed live params
         self.rt60_s     = ab.SmoothParam(rt60_s, 0.1, 10.0)
@@ -118,6 +88,8 @@ class ReverbEffect(ab.Effect):
         self._rt60_step  = float(rt60_step)
         self._damp_step  = float(damp_step)
         self._delay_step_ms = 0.1  # filled in prepare()
+        self._mix_ramp_ms = float(mix_ramp_ms)
+        self._mix_step = 1e-3      # filled in prepare()
 
         # sample rate for g-from-rt60 calc
         self._fs = 48000
@@ -133,6 +105,7 @@ class ReverbEffect(ab.Effect):
         self._pre_w_L   = 0
         self._pre_buf_R = np.zeros(1, np.float32)
         self._pre_w_R   = 0
+        self._pre_size  = 1
 
         # scratch
         self._tmp1 = np.empty((1,1), np.float32)
@@ -141,6 +114,8 @@ class ReverbEffect(ab.Effect):
         self._sumR = np.empty((1,1), np.float32)
         self._preL = np.empty((1,1), np.float32)
         self._preR = np.empty((1,1), np.float32)
+        self._dry_gain = np.empty(1, np.float32)
+        self._wet_gain = np.empty(1, np.float32)
 
 
     # setters
@@ -148,10 +123,10 @@ class ReverbEffect(ab.Effect):
     def set_damp(self, value: float):       self.damp.set_target(value)
     def set_pre_delay_ms(self, ms: float):     self.pre_delay_ms.set_target(ms)
     def set_mix(self, dry: float | None = None, wet: float | None = None):
-        if dry is not None: self.mix_dry = float(dry)
-        if wet is not None: self.mix_wet = float(wet)
-    def set_mix_wet(self, wet: float): self.mix_wet = wet
-    def set_mix_dry(self, dry: float): self.mix_dry = dry
+        if dry is not None: self.mix_dry.set_target(dry)
+        if wet is not None: self.mix_wet.set_target(wet)
+    def set_mix_wet(self, wet: float): self.mix_wet.set_target(wet)
+    def set_mix_dry(self, dry: float): self.mix_dry.set_target(dry)
 
     # -------------------- lifecycle --------------------
 
@@ -161,7 +136,7 @@ class ReverbEffect(ab.Effect):
             ms = min(base_ms + jitter, self._max_delay_ms - 1.0)
             Lsamp = int(sample_rate * ms / 1000.0)
             Lsamp = max(1, Lsamp)
-            buf = np.zeros(Lsamp + 1, np.float32)
+            buf = ab.make_ring(Lsamp + 1)
             comb.append({'buf': buf, 'w': 0, 'L': Lsamp, 'lp': 0.0})
 
         ap = []
@@ -169,7 +144,7 @@ class ReverbEffect(ab.Effect):
             ms = min(base_ms + jitter*0.2, self._max_delay_ms - 1.0)
             Lsamp = int(sample_rate * ms / 1000.0)
             Lsamp = max(1, Lsamp)
-            buf = np.zeros(Lsamp + 1, np.float32)
+            buf = ab.make_ring(Lsamp + 1)
             # --- START: Removed the unnecessary 'prev' state ---
             ap.append({'buf': buf, 'w': 0, 'L': Lsamp})
             # --- END: Removed 'prev' state ---
@@ -181,6 +156,7 @@ class ReverbEffect(ab.Effect):
         # store fs and smoothing conversion
         self._fs = int(sample_rate)
         self._delay_step_ms = 1000.0 * (self._step_samples / float(self._fs))
+        self._mix_step = 1000.0 / (max(self._mix_ramp_ms, 1e-3) * self._fs)
 
         # networks per side (slight jitter to decorrelate)
         self._comb_L, self._ap_L = self._mk_side(self._fs, +self._jitter_ms)
@@ -188,9 +164,9 @@ class ReverbEffect(ab.Effect):
 
         # pre-delay buffers (per side)
         pre_size = int(self._fs * self._max_pre_ms / 1000.0) + 1
-        pre_size = max(1, pre_size)
-        self._pre_buf_L = np.zeros(pre_size, np.float32); self._pre_w_L = 0
-        self._pre_buf_R = np.zeros(pre_size, np.float32); self._pre_w_R = 0
+        self._pre_size = max(1, pre_size)
+        self._pre_buf_L = ab.make_ring(self._pre_size); self._pre_w_L = 0
+        self._pre_buf_R = ab.make_ring(self._pre_size); self._pre_w_R = 0
 
         # scratch
         self._tmp1 = np.empty((blocksize, 1), np.float32)
@@ -199,6 +175,8 @@ class ReverbEffect(ab.Effect):
         self._sumR = np.empty((blocksize, 1), np.float32)
         self._preL = np.empty((blocksize, 1), np.float32)
         self._preR = np.empty((blocksize, 1), np.float32)
+        self._dry_gain = np.empty(blocksize, np.float32)
+        self._wet_gain = np.empty(blocksize, np.float32)
 
     # -------------------- processing --------------------
 
@@ -215,28 +193,32 @@ class ReverbEffect(ab.Effect):
             self._sumR = np.empty((N,1), np.float32)
             self._preL = np.empty((N,1), np.float32)
             self._preR = np.empty((N,1), np.float32)
+            self._dry_gain = np.empty(N, np.float32)
+            self._wet_gain = np.empty(N, np.float32)
 
         # smooth params
         rt60_now   = self.rt60_s.step_towards(self._rt60_step)
         damp_now   = self.damp.step_towards(self._damp_step)
         pre_ms_now = self.pre_delay_ms.step_towards(self._delay_step_ms)
         pre_dS     = int(self._fs * pre_ms_now / 1000.0)
-        if pre_dS >= self._pre_buf_L.shape[0]:
-            pre_dS = self._pre_buf_L.shape[0] - 1
+        if pre_dS >= self._pre_size:
+            pre_dS = self._pre_size - 1
 
         xL = x_in[:, 0:1].copy()
         xR = x_in[:, 1:2].copy()
 
         # pre-delay
-        self._pre_w_L = pure_delay_kernel(self._pre_buf_L, self._pre_w_L, self._pre_buf_L.shape[0], xL, self._preL, pre_dS)
-        self._pre_w_R = pure_delay_kernel(self._pre_buf_R, self._pre_w_R, self._pre_buf_R.shape[0], xR, self._preR, pre_dS)
+        with ab.TRACER.kernel("ring_delay_block"):
+            self._pre_w_L = ab.ring_delay_block(self._pre_buf_L, self._pre_w_L, xL, self._preL, pre_dS)
+            self._pre_w_R = ab.ring_delay_block(self._pre_buf_R, self._pre_w_R, xR, self._preR, pre_dS)
 
         # Left comb sum
         self._sumL.fill(0.0)
         for c in self._comb_L:
             g = self._g_from_rt60(c['L'], self._fs, rt60_now)
-            new_w, new_lp = comb_damped_kernel(c['buf'], c['w'], c['buf'].shape[0],
-                                            self._preL, self._tmp1, c['L'], g, damp_now, c['lp'])
+            with ab.TRACER.kernel("comb_damped_kernel"):
+                new_w, new_lp = comb_damped_kernel(c['buf'], c['w'],
+                                                self._preL, self._tmp1, c['L'], g, damp_now, c['lp'])
             c['w'], c['lp'] = new_w, new_lp
             self._sumL += self._tmp1
 
@@ -244,8 +226,9 @@ class ReverbEffect(ab.Effect):
         src, dst = self._sumL, self._tmp1
         for a in self._ap_L:
             # --- START: Call the corrected kernel ---
-            new_w = allpass_kernel(a['buf'], a['w'], a['buf'].shape[0],
-                                   src, dst, a['L'], self._ap_gain)
+            with ab.TRACER.kernel("allpass_kernel"):
+                new_w = allpass_kernel(a['buf'], a['w'],
+                                       src, dst, a['L'], self._ap_gain)
             a['w'] = new_w
             # --- END: Call the corrected kernel ---
             src, dst = dst, src
@@ -255,8 +238,9 @@ class ReverbEffect(ab.Effect):
         self._sumR.fill(0.0)
         for c in self._comb_R:
             g = self._g_from_rt60(c['L'], self._fs, rt60_now)
-            new_w, new_lp = comb_damped_kernel(c['buf'], c['w'], c['buf'].shape[0],
-                                            self._preR, self._tmp1, c['L'], g, damp_now, c['lp'])
+            with ab.TRACER.kernel("comb_damped_kernel"):
+                new_w, new_lp = comb_damped_kernel(c['buf'], c['w'],
+                                                self._preR, self._tmp1, c['L'], g, damp_now, c['lp'])
             c['w'], c['lp'] = new_w, new_lp
             self._sumR += self._tmp1
 
@@ -264,14 +248,17 @@ class ReverbEffect(ab.Effect):
         src, dst = self._sumR, self._tmp1
         for a in self._ap_R:
             # --- START: Call the corrected kernel ---
-            new_w = allpass_kernel(a['buf'], a['w'], a['buf'].shape[0],
-                                   src, dst, a['L'], self._ap_gain)
+            with ab.TRACER.kernel("allpass_kernel"):
+                new_w = allpass_kernel(a['buf'], a['w'],
+                                       src, dst, a['L'], self._ap_gain)
             a['w'] = new_w
             # --- END: Call the corrected kernel ---
             src, dst = dst, src
         yR = src
 
         # Mix and clip
-        out[:, 0:1] = self.mix_dry * xL + self.mix_wet * yL
-        out[:, 1:2] = self.mix_dry * xR + self.mix_wet * yR
-        np.clip(out, -1.0, 1.0, out=out)
\ No newline at end of file
+        self.mix_dry.ramp_into(self._dry_gain, self._mix_step)
+        self.mix_wet.ramp_into(self._wet_gain, self._mix_step)
+        with ab.TRACER.kernel("mix_ramped_kernel"):
+            ab.mix_ramped_kernel(xL, yL, out[:, 0:1], self._dry_gain, self._wet_gain)
+            ab.mix_ramped_kernel(xR, yR, out[:, 1:2], self._dry_gain, self._wet_gain)
\ No newline at end of file
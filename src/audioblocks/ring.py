@@ -0,0 +1,115 @@
+from __future__ import annotations
+import math
+import numpy as np
+import numba
+
+
+# Power-of-two ring buffers shared by the delay-based kernels. The storage is
+# a plain float32 array whose length is a power of two, so wrapping an index is
+# '& (len - 1)' instead of '%' (and negative indices wrap correctly).
+# 'w' is the next write position; a tap 'd' samples back reads buf[w - d]
+# (before the write of the current sample, so d >= 1 is a real delay).
+
+
+def ring_size(min_frames: int) -> int:
+    """Smallest power of two holding at least min_frames (and at least 2)."""
+    return 1 << max(1, int(math.ceil(math.log2(max(2, int(min_frames))))))
+
+
+def make_ring(min_frames: int) -> np.ndarray:
+    return np.zeros(ring_size(min_frames), dtype=np.float32)
+
+
+@numba.njit(cache=True, inline='always')
+def ring_tap(buf, w, d):
+    """Sample written d writes before position w."""
+    return buf[(w - d) & (buf.shape[0] - 1)]
+
+
+@numba.njit(cache=True, inline='always')
+def ring_push(buf, w, x):
+    """Writes x at w; returns the next write position."""
+    buf[w] = x
+    return (w + 1) & (buf.shape[0] - 1)
+
+
+@numba.njit(cache=True, inline='always')
+def cubic_interp(x, y0, y1, y2, y3):
+    """Hermite (Catmull-Rom) through y1..y2 at fraction x."""
+    c0 = y1
+    c1 = 0.5 * (y2 - y0)
+    c2 = y0 - 2.5 * y1 + 2.0 * y2 - 0.5 * y3
+    c3 = 0.5 * (y3 - y0) + 1.5 * (y1 - y2)
+    return ((c3 * x + c2) * x + c1) * x + c0
+
+
+@numba.njit(cache=True, inline='always')
+def ring_read_linear(buf, w, delay):
+    """Linearly interpolated read 'delay' (fractional) samples back from w."""
+    mask = buf.shape[0] - 1
+    pos = w - delay
+    i = int(math.floor(pos))
+    frac = pos - i
+    a = buf[i & mask]
+    return a + frac * (buf[(i + 1) & mask] - a)
+
+
+@numba.njit(cache=True, inline='always')
+def ring_read_cubic(buf, w, delay):
+    """Cubic (Hermite) read 'delay' samples back from w; needs one sample of history past it."""
+    mask = buf.shape[0] - 1
+    pos = w - delay
+    i = int(math.floor(pos))
+    frac = pos - i
+    return cubic_interp(frac, buf[(i - 1) & mask], buf[i & mask], buf[(i + 1) & mask], buf[(i + 2) & mask])
+
+
+@numba.njit(cache=True, inline='always')
+def ring_read_allpass(buf, w, delay, y_prev):
+    """
+    First-order allpass interpolated read (flat magnitude, for modulated
+    feedback paths). y_prev is the previous output of this tap, kept by the
+    caller. Best conditioned with the fractional part in [0.1, 1.1).
+    """
+    mask = buf.shape[0] - 1
+    m = int(math.floor(delay))
+    frac = delay - m
+    eta = (1.0 - frac) / (1.0 + frac)
+    return eta * (buf[(w - m) & mask] - y_prev) + buf[(w - m - 1) & mask]
+
+
+@numba.njit(cache=True, fastmath=True)
+def ring_delay_block(buf, w, x_block, y_out, d):
+    """
+    x_block, y_out: (N, 1). Pushes the block through a fixed delay of d samples
+    (d = 0 passes the input straight through). Returns the next write position.
+    """
+    N = x_block.shape[0]
+    mask = buf.shape[0] - 1
+    for n in range(N):
+        x = x_block[n, 0]
+        y_out[n, 0] = x if d == 0 else buf[(w - d) & mask]
+        buf[w] = x
+        w = (w + 1) & mask
+    return w
+
+
+@numba.njit(cache=True, fastmath=True)
+def ring_write_block(buf, w, x_block):
+    """Writes column 0 of x_block; returns the next write position."""
+    mask = buf.shape[0] - 1
+    for n in range(x_block.shape[0]):
+        buf[w] = x_block[n, 0]
+        w = (w + 1) & mask
+    return w
+
+
+@numba.njit(cache=True, fastmath=True)
+def ring_read_block(buf, w, d, y_out):
+    """
+    Reads len(y_out) consecutive samples starting d samples back from w
+    (y_out[0] = tap d, y_out[-1] = tap d - N + 1).
+    """
+    mask = buf.shape[0] - 1
+    for n in range(y_out.shape[0]):
+        y_out[n, 0] = buf[(w - d + n) & mask]
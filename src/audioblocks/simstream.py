@@ -0,0 +1,359 @@
+from __future__ import annotations
+import math
+import time
+import json
+import random
+import argparse
+import threading
+import numpy as np
+import soundfile as sf
+
+
+# -------------------- Sources --------------------
+# A source is any callable frames -> (frames, channels) float32 block.
+
+class ToneSource:
+    """Sine with optional white noise, the default when no file is given."""
+    def __init__(self, sample_rate: int, channels: int = 1, freq_hz: float = 220.0, amplitude: float = 0.3, noise: float = 0.0, seed: int = 1):
+        self.sr = sample_rate
+        self.channels = channels
+        self.inc = 2.0 * math.pi * freq_hz / sample_rate
+        self.amplitude = amplitude
+        self.noise = noise
+        self.phase = 0.0
+        self.rng = np.random.default_rng(seed)
+
+    def __call__(self, frames: int) -> np.ndarray:
+        ph = self.phase + self.inc * np.arange(frames)
+        self.phase = float((ph[-1] + self.inc) % (2.0 * math.pi)) if frames else self.phase
+        x = self.amplitude * np.sin(ph)
+        if self.noise > 0.0:
+            x = x + self.noise * self.rng.standard_normal(frames)
+        return np.repeat(x.astype(np.float32)[:, None], self.channels, axis=1)
+
+
+class WavSource:
+    """Loops a sound file (downmixed or duplicated to 'channels'); resampling is left to the chain edges."""
+    def __init__(self, path: str, channels: int = 1):
+        data, self.sr = sf.read(path, dtype='float32', always_2d=True)
+        if data.shape[1] != channels:
+            data = np.repeat(data.mean(axis=1, keepdims=True), channels, axis=1)
+        self.data = data
+        self.pos = 0
+
+    def __call__(self, frames: int) -> np.ndarray:
+        out = np.empty((frames, self.data.shape[1]), dtype=np.float32)
+        filled = 0
+        while filled < frames:
+            take = min(frames - filled, self.data.shape[0] - self.pos)
+            out[filled:filled + take] = self.data[self.pos:self.pos + take]
+            filled += take
+            self.pos = (self.pos + take) % self.data.shape[0]
+        return out
+
+
+# -------------------- Stream --------------------
+
+class SimStatus:
+    """Stand-in for sounddevice.CallbackFlags: truthy when the previous block missed its deadline."""
+    def __init__(self, output_underflow: bool = False):
+        self.output_underflow = output_underflow
+
+    def __bool__(self):
+        return self.output_underflow
+
+    def __repr__(self):
+        return "output underflow" if self.output_underflow else ""
+
+
+class SimulatedStream:
+    """
+    Drop-in for sounddevice.Stream (the subset AudioEngine uses) without audio
+    hardware. A clock thread delivers one block every blocksize / samplerate
+    seconds (divided by 'speed' to run faster than real time), late by a random
+    scheduling jitter, and calls callback(indata, outdata, frames, time_info, status)
+    just like PortAudio does.
+
+    Output of block k is due 'buffer_blocks' periods after its input is complete;
+    a callback that finishes later is a deadline miss, flagged as an output
+    underflow on the next callback. Per-block timings are kept for report().
+    """
+    def __init__(self, samplerate, blocksize, channels, callback, dtype='float32', latency='low',
+                 source=None, speed: float = 1.0, jitter_ms: float = 0.0, buffer_blocks: int = 1,
+                 seed: int = 0, **kwargs):
+        self.samplerate = float(samplerate)
+        self.blocksize = int(blocksize)
+        self.channels = channels
+        self.callback = callback
+        self.dtype = dtype
+        self.speed = max(float(speed), 1e-3)
+        self.jitter_ms = float(jitter_ms)
+        self.buffer_blocks = max(1, int(buffer_blocks))
+        self.source = source if source is not None else ToneSource(int(samplerate), channels[0])
+        self._rng = random.Random(seed)
+
+        self.period_s = self.blocksize / self.samplerate
+        # what a device would report: one block of input buffering, buffer_blocks of output
+        self.latency = (self.period_s, self.buffer_blocks * self.period_s)
+
+        self.active = False
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+
+        # per block, in stream seconds (wall time * speed) except durations
+        self.callback_ns: list[int] = []
+        self.lateness_s: list[float] = []
+        self.e2e_s: list[float] = []
+        self.deadline_misses = 0
+
+    def start(self):
+        if self.active:
+            return
+        self._stop.clear()
+        self.active = True
+        self._thread = threading.Thread(target=self._run, name="simulated-stream", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+        self.active = False
+
+    def close(self):
+        self.stop()
+
+    def _run(self):
+        frames = self.blocksize
+        period_wall = self.period_s / self.speed
+        outdata = np.zeros((frames, self.channels[1]), dtype=np.float32)
+        missed = False
+        t0 = time.perf_counter()
+        k = 0
+        while not self._stop.is_set():
+            # input block k is complete at 'ready'; the host wakes us a bit later
+            ready = t0 + (k + 1) * period_wall
+            jitter = self._rng.expovariate(1000.0 / self.jitter_ms) if self.jitter_ms > 0 else 0.0
+            wake = ready + jitter / self.speed
+            delay = wake - time.perf_counter()
+            if delay > 0:
+                self._stop.wait(delay)
+                if self._stop.is_set():
+                    break
+
+            indata = self.source(frames)
+            start = time.perf_counter()
+            time_info = {'inputBufferAdcTime': ready - period_wall, 'currentTime': start, 'outputBufferDacTime': ready + self.buffer_blocks * period_wall}
+            self.callback(indata, outdata, frames, time_info, SimStatus(missed))
+            end = time.perf_counter()
+
+            deadline = ready + self.buffer_blocks * period_wall
+            missed = end > deadline
+            if missed:
+                self.deadline_misses += 1
+            # first input sample captured at ready - period; output starts playing at
+            # the deadline, or as soon as it exists when late
+            plays = max(end, deadline)
+            self.callback_ns.append(int((end - start) * 1e9))
+            self.lateness_s.append((start - ready) * self.speed)
+            self.e2e_s.append((plays - (ready - period_wall)) * self.speed)
+
+            k += 1
+            # a late callback does not make the device wait: skip the blocks it overran
+            behind = int((time.perf_counter() - t0) / period_wall) - (k + 1)
+            if behind > 0:
+                k += behind
+
+    def report(self, extra_latency_s: float = 0.0) -> dict:
+        """Deadline misses, callback duration histogram and end-to-end latency of the run so far."""
+        blocks = len(self.callback_ns)
+        cb_us = np.asarray(self.callback_ns, dtype=np.float64) / 1e3
+        budget_us = 1e6 * self.period_s / self.speed
+        # log-spaced bins relative to the per-block budget
+        edges = budget_us * np.array([0.0, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, np.inf])
+        counts, _ = np.histogram(cb_us, bins=edges) if blocks else (np.zeros(len(edges) - 1, dtype=int), None)
+
+        def summary(values, scale=1.0):
+            if len(values) == 0:
+                return {'p50': 0.0, 'p99': 0.0, 'max': 0.0}
+            arr = np.asarray(values, dtype=np.float64) * scale
+            p50, p99 = np.percentile(arr, (50, 99))
+            return {'p50': round(float(p50), 3), 'p99': round(float(p99), 3), 'max': round(float(arr.max()), 3)}
+
+        return {
+            'blocks': blocks,
+            'blocksize': self.blocksize,
+            'sample_rate': self.samplerate,
+            'speed': self.speed,
+            'budget_us': round(budget_us, 2),
+            'deadline_misses': self.deadline_misses,
+            'miss_rate': round(self.deadline_misses / blocks, 5) if blocks else 0.0,
+            'callback_us': summary(cb_us),
+            'callback_histogram': [
+                {'le_budget': (None if math.isinf(hi) else round(hi / budget_us, 2)), 'count': int(c)}
+                for hi, c in zip(edges[1:], counts)
+            ],
+            'wake_lateness_ms': summary(self.lateness_s, 1e3),
+            'e2e_latency_ms': summary(np.asarray(self.e2e_s) + extra_latency_s, 1e3),
+        }
+
+
+# -------------------- Control-plane load --------------------
+
+class ControlLoad:
+    """
+    Background threads hammering an AudioEngine the way the WebSocket handler
+    would: build_chain storms (alternating configs) and update_param floods.
+    """
+    def __init__(self, engine, configs: list[list[dict]], build_hz: float = 0.0, param_hz: float = 0.0, seed: int = 0):
+        self.engine = engine
+        self.configs = configs
+        self.build_hz = build_hz
+        self.param_hz = param_hz
+        self.builds = 0
+        self.params = 0
+        self._rng = random.Random(seed)
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    def start(self):
+        if self.build_hz > 0 and self.configs:
+            self._threads.append(threading.Thread(target=self._build_storm, name="build-storm", daemon=True))
+        if self.param_hz > 0:
+            self._threads.append(threading.Thread(target=self._param_flood, name="param-flood", daemon=True))
+        for t in self._threads:
+            t.start()
+
+    def stop(self):
+        self._stop.set()
+        for t in self._threads:
+            t.join()
+        self._threads = []
+
+    def _build_storm(self):
+        i = 0
+        while not self._stop.wait(1.0 / self.build_hz):
+            i += 1
+            self.engine.build_chain(self.configs[i % len(self.configs)])
+            self.builds += 1
+
+    def _param_flood(self):
+        import audioblocks as ab
+        while not self._stop.wait(1.0 / self.param_hz):
+            effects = list(self.engine.effects_map.items())
+            if not effects:
+                continue
+            effect_id, fx = self._rng.choice(effects)
+            params = [(name, p) for name, p in vars(fx).items() if isinstance(p, ab.SmoothParam)]
+            if not params:
+                continue
+            name, p = self._rng.choice(params)
+            lo = p.lo if math.isfinite(p.lo) else -1.0
+            hi = p.hi if math.isfinite(p.hi) else 1.0
+            self.engine.update_param(effect_id, name, self._rng.uniform(lo, hi))
+            self.params += 1
+
+
+# -------------------- Harness --------------------
+
+# stream seconds between adapt_latency calls (backend.latency_monitor runs every METRICS_INTERVAL_S)
+ADAPT_INTERVAL_S = 1.0
+
+
+def run_harness(configs: list[list[dict]], seconds: float = 10.0, speed: float = 1.0, jitter_ms: float = 0.0,
+                profile: str | None = None, wav: str | None = None, build_hz: float = 0.0, param_hz: float = 0.0,
+                buffer_blocks: int = 1, seed: int = 0) -> dict:
+    """
+    Runs an AudioEngine on a SimulatedStream for 'seconds' of stream time and
+    returns the stream report plus the engine's own metrics snapshot. With the
+    'adaptive' profile, adapt_latency runs every ADAPT_INTERVAL_S of stream time,
+    on a clock that runs 'speed' times faster like the stream.
+    """
+    import audioblocks as ab
+
+    engine = ab.AudioEngine(ab.SPSCRing(2 ** 16, 2))
+    t_start = time.monotonic()
+    engine.clock = lambda: t_start + (time.monotonic() - t_start) * speed
+    if profile is not None:
+        engine.set_latency_profile(profile)
+    engine.build_chain(configs[0] if configs else [])
+
+    streams: list[SimulatedStream] = []
+
+    def factory(**kwargs):
+        source = WavSource(wav, kwargs['channels'][0]) if wav else None
+        stream = SimulatedStream(source=source, speed=speed, jitter_ms=jitter_ms,
+                                 buffer_blocks=buffer_blocks, seed=seed, **kwargs)
+        streams.append(stream)
+        return stream
+
+    engine.stream_factory = factory
+    load = ControlLoad(engine, configs, build_hz, param_hz, seed)
+
+    # drain the plot ring like data_sender would, or the taps count overruns
+    draining = threading.Event()
+
+    def drain():
+        while not draining.wait(0.033 / speed):
+            engine.plot_ring.advance(engine.plot_ring.readable())
+
+    drainer = threading.Thread(target=drain, name="plot-drain", daemon=True)
+
+    engine.start_mic_stream()
+    drainer.start()
+    load.start()
+    profile_changes = 0
+    end = time.monotonic() + seconds / speed
+    while (left := end - time.monotonic()) > 0:
+        time.sleep(min(left, ADAPT_INTERVAL_S / speed))
+        if engine.adapt_latency():
+            profile_changes += 1
+    load.stop()
+    engine.stop_stream()
+    draining.set()
+    drainer.join()
+
+    stream = streams[-1]
+    chain_latency_s = engine.effects_chain.latency / engine.current_sample_rate if engine.effects_chain else 0.0
+    report = stream.report(extra_latency_s=chain_latency_s)
+    report['profile'] = engine.latency_profile
+    # the stream report covers the last stream; each profile change restarts it
+    report['profile_changes'] = profile_changes
+    report['control'] = {'builds': load.builds, 'params': load.params}
+    snapshot = engine.metrics_snapshot()
+    # the engine measures load against stream-time deadlines, which the sped-up
+    # clock shortens by 'speed' in wall time
+    snapshot['cpu_load_pct'] = {k: round(v * speed, 2) for k, v in snapshot['cpu_load_pct'].items()}
+    report['engine'] = snapshot
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the audio engine on a simulated stream and report deadline behaviour.")
+    parser.add_argument('--config', help="JSON file with one chain config, or a list of them for build storms")
+    parser.add_argument('--wav', help="input file (looped); default is a 220 Hz tone")
+    parser.add_argument('--seconds', type=float, default=10.0, help="stream time to simulate")
+    parser.add_argument('--speed', type=float, default=1.0, help=">1 runs the clock faster than real time")
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help="mean callback wake-up lateness")
+    parser.add_argument('--profile', default=None, help="latency profile name or 'adaptive'")
+    parser.add_argument('--buffer-blocks', type=int, default=1)
+    parser.add_argument('--build-hz', type=float, default=0.0, help="build_chain calls per second")
+    parser.add_argument('--param-hz', type=float, default=0.0, help="update_param calls per second")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    configs: list[list[dict]] = [[]]
+    if args.config:
+        with open(args.config) as f:
+            loaded = json.load(f)
+        configs = loaded if loaded and isinstance(loaded[0], list) else [loaded]
+
+    report = run_harness(configs, seconds=args.seconds, speed=args.speed, jitter_ms=args.jitter_ms,
+                         profile=args.profile, wav=args.wav, build_hz=args.build_hz, param_hz=args.param_hz,
+                         buffer_blocks=args.buffer_blocks, seed=args.seed)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
 from __future__ import annotations
 import numpy as np
+import scipy.signal
 import audioblocks as ab
 
+OFFLINE_BATCH_HOPS = 512  # STFT frames per batch in process_offline (bounds the spectra held at once)
+
 class SpectralFilter(ab.Effect):
     def __init__(self, threshold_db=-40.0, reduction=0.5, smoothing=0.8):
         # Params
@@ -41,8 +44,59 @@ class SpectralFilter(ab.Effect):
             self.out_accum = np.zeros(self.n_fft, dtype=np.float32)
             self.mask_smooth = np.ones(self.n_fft // 2 + 1, dtype=np.float32)
 
+    def memory_samples(self) -> int | None:
+        # one analysis frame plus however many hops the mask smoothing needs to forget (1e-4)
+        if self.alpha_param >= 1.0:
+            return None
+        hops = 0 if self.alpha_param <= 0.0 else int(np.ceil(np.log(1e-4) / np.log(self.alpha_param)))
+        return self.n_fft + hops * self.hop
+
+    def process_offline(self, x: np.ndarray) -> np.ndarray | None:
+        # the block path is one STFT frame per block; batching needs the same framing
+        N = x.shape[0]
+        if N % self.hop or self.n_fft != 2 * self.hop:
+            return None
+        mono = np.mean(x, axis=1)
+        valid = np.empty(N, dtype=np.float32)
+        step = OFFLINE_BATCH_HOPS * self.hop
+        for start in range(0, N, step):
+            valid[start:start + step] = self._process_frames(mono[start:start + step])
+        out = np.zeros_like(x)
+        out[:, :min(2, x.shape[1])] = valid[:, None]
+        return out
+
+    def _process_frames(self, mono: np.ndarray) -> np.ndarray:
+        """process_into() for len(mono) // hop consecutive blocks at once (static params)."""
+        hop = self.hop
+        threshold_linear = 10.0 ** (self.threshold_db.current / 20.0)
+        red_amount = self.reduction.current
+
+        # every analysis frame: the previous hop and this one, as in self.in_buffer
+        signal = np.concatenate([self.in_buffer[hop:], mono])
+        frames = np.lib.stride_tricks.sliding_window_view(signal, self.n_fft)[::hop]
+        fft_in = np.fft.rfft(frames * self.window, axis=1)
+
+        # the temporal smoothing is a one-pole filter down the frames
+        current_mask = np.where(np.abs(fft_in) > threshold_linear, 1.0, red_amount)
+        a = self.alpha_param
+        mask, _ = scipy.signal.lfilter([1.0 - a], [1.0, -a], current_mask, axis=0,
+                                       zi=a * self.mask_smooth[None, :])
+
+        # overlap-add: each block is the first half of its frame plus the second half of the previous one
+        processed_time = np.fft.irfft(fft_in * mask, self.n_fft, axis=1)
+        valid_out = processed_time[:, :hop].copy()
+        valid_out[0] += self.out_accum[:hop]
+        valid_out[1:] += processed_time[:-1, hop:]
+
+        self.in_buffer[:] = signal[-self.n_fft:]
+        self.out_accum[:hop] = processed_time[-1, hop:]
+        self.out_accum[hop:] = 0.0
+        self.mask_smooth = mask[-1]
+        return valid_out.reshape(-1)
+
     def process_into(self, x_in: np.ndarray, out: np.ndarray) -> None:
-        # 1. Update params
+        # 1. Update params (once per block = once per frame, the finest rate the
+        #    mask can change at; the mask smoothing and overlap-add blend the steps)
         th_db = self.threshold_db.step_towards(1.0)
         red_amount = self.reduction.step_towards(0.05)
         
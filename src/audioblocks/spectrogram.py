@@ -0,0 +1,90 @@
+from __future__ import annotations
+import numpy as np
+
+
+N_FFT = 1024
+HOP = 256
+DB_FLOOR = -100.0  # maps to 0
+DB_CEIL = 0.0      # maps to 255, dBFS of a full-scale sine
+TILE_FRAMES = 256  # STFT frames (columns) per tile, at every level
+BATCH_FRAMES = 2048  # frames per batched rfft, bounds the float scratch memory
+
+
+def stft_db_u8(x: np.ndarray, n_fft: int = N_FFT, hop: int = HOP) -> np.ndarray:
+    """
+    x: (N,) signal -> (frames, n_fft // 2) uint8 magnitudes in [DB_FLOOR, DB_CEIL] dB.
+    Frame i is centred on sample i * hop; the Nyquist bin is dropped so rows are a power of two.
+    Frames are windowed and transformed in batches with one vectorized rfft per batch.
+    """
+    x = np.asarray(x, dtype=np.float32).reshape(-1)
+    half = n_fft // 2
+    padded = np.zeros(x.shape[0] + n_fft, dtype=np.float32)
+    padded[half:half + x.shape[0]] = x
+    frames = max(1, -(-x.shape[0] // hop))
+    windows = np.lib.stride_tricks.sliding_window_view(padded, n_fft)[::hop][:frames]
+
+    window = np.hanning(n_fft).astype(np.float32)
+    # full-scale sine -> 0 dB
+    ref = float(window.sum()) / 2.0
+    scale = 255.0 / (DB_CEIL - DB_FLOOR)
+
+    out = np.empty((frames, half), dtype=np.uint8)
+    for b0 in range(0, frames, BATCH_FRAMES):
+        batch = windows[b0:b0 + BATCH_FRAMES] * window
+        mag = np.abs(np.fft.rfft(batch, axis=1)[:, :half])
+        db = 20.0 * np.log10(mag / ref + 1e-12)
+        out[b0:b0 + batch.shape[0]] = np.clip((db - DB_FLOOR) * scale, 0.0, 255.0).astype(np.uint8)
+    return out
+
+
+class SpectrogramTiles:
+    """
+    uint8 dB spectrogram of one signal at power-of-two time zoom levels (level k
+    pools 2**k STFT frames by max, so transients stay visible), cut into tiles of
+    TILE_FRAMES columns. Tiles are views, nothing is copied when serving them.
+    """
+    def __init__(self, samples: np.ndarray, sample_rate: int, n_fft: int = N_FFT, hop: int = HOP):
+        self.sample_rate = int(sample_rate)
+        self.n_fft = n_fft
+        self.hop = hop
+        self.levels = [stft_db_u8(samples, n_fft, hop)]
+        while self.levels[-1].shape[0] > TILE_FRAMES:
+            prev = self.levels[-1]
+            even = prev.shape[0] - (prev.shape[0] & 1)
+            pooled = np.maximum(prev[0:even:2], prev[1:even:2])
+            if prev.shape[0] & 1:
+                pooled = np.concatenate([pooled, prev[-1:]])
+            self.levels.append(pooled)
+
+    tile_frames = TILE_FRAMES
+
+    @property
+    def bins(self) -> int:
+        return self.levels[0].shape[1]
+
+    def column_time(self, level: int, column: int) -> float:
+        """Seconds from the start of the file to column 'column' of a level."""
+        return (column * self.hop << level) / self.sample_rate
+
+    def describe(self) -> dict:
+        """What a client needs to lay tiles out on time/frequency axes."""
+        return {
+            'sample_rate': self.sample_rate,
+            'n_fft': self.n_fft,
+            'hop': self.hop,
+            'bins': self.bins,
+            'tile_frames': TILE_FRAMES,
+            'levels': [lvl.shape[0] for lvl in self.levels],
+            'db_floor': DB_FLOOR,
+            'db_ceil': DB_CEIL,
+        }
+
+    def tile(self, level: int, index: int) -> np.ndarray | None:
+        """(<= TILE_FRAMES, bins) uint8 block, or None outside the spectrogram."""
+        if not 0 <= level < len(self.levels):
+            return None
+        data = self.levels[level]
+        start = index * TILE_FRAMES
+        if index < 0 or start >= data.shape[0]:
+            return None
+        return data[start:start + TILE_FRAMES]
@@ -0,0 +1,73 @@
+from __future__ import annotations
+import numpy as np
+
+
+class SPSCRing:
+    """
+    Preallocated single-producer/single-consumer ring of (capacity, channels) float32.
+
+    The producer (audio thread) only ever advances 'w' and the consumer only 'r';
+    both are monotonically increasing frame counters, so each side reads the
+    other's index with a single attribute load (atomic under the GIL) and never
+    needs a lock. Data is copied in before 'w' is published.
+
+    Writes are two-phase so several taps in one chain can fill different columns
+    of the same frames: begin_write() reserves space, write_column() copies, and
+    commit_write() publishes. A block that does not fit is dropped and counted.
+    """
+    def __init__(self, capacity: int, channels: int):
+        if capacity <= 0 or capacity & (capacity - 1):
+            raise ValueError("capacity must be a power of two")
+        self.capacity = capacity
+        self.mask = capacity - 1
+        self.channels = channels
+        self.buf = np.zeros((capacity, channels), dtype=np.float32)
+        self.w = 0
+        self.r = 0
+        self.overruns = 0
+        self._pending = 0
+
+    # -------------------- producer --------------------
+
+    def begin_write(self, frames: int) -> bool:
+        if frames > self.capacity - (self.w - self.r):
+            self._pending = 0
+            self.overruns += 1
+            return False
+        self._pending = frames
+        return True
+
+    def write_column(self, col: int, data: np.ndarray):
+        """data: (frames,) matching the reserved block; no-op if the block was dropped."""
+        n = self._pending
+        if n == 0:
+            return
+        start = self.w & self.mask
+        first = min(n, self.capacity - start)
+        self.buf[start:start + first, col] = data[:first]
+        if first < n:
+            self.buf[:n - first, col] = data[first:n]
+
+    def commit_write(self):
+        self.w += self._pending
+        self._pending = 0
+
+    # -------------------- consumer --------------------
+
+    def readable(self) -> int:
+        return self.w - self.r
+
+    def read_views(self) -> list[np.ndarray]:
+        """Zero-copy views of every readable frame (two when it wraps). Call advance() when done."""
+        n = self.w - self.r
+        if n == 0:
+            return []
+        start = self.r & self.mask
+        first = min(n, self.capacity - start)
+        views = [self.buf[start:start + first]]
+        if first < n:
+            views.append(self.buf[:n - first])
+        return views
+
+    def advance(self, frames: int):
+        self.r += frames
@@ -0,0 +1,239 @@
+from __future__ import annotations
+import os
+import json
+import time
+import threading
+import contextvars
+
+
+TRACE_MAX_EVENTS = 2_000_000  # later spans are counted as dropped
+# spans of these categories are compiled code; everything else is Python glue around them
+KERNEL_CATEGORIES = ('kernel',)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'cat', 'args', 't0', 'kernel_ns')
+
+    def __init__(self, tracer, name, cat, args):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.kernel_ns = 0
+
+    def __enter__(self):
+        self.tracer._stack().append(self)
+        self.t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        t1 = time.perf_counter_ns()
+        stack = self.tracer._stack()
+        stack.pop()
+        dur = t1 - self.t0
+        # kernel time bubbles up so every span knows how much of it was compiled code
+        kernel = dur if self.cat in KERNEL_CATEGORIES else self.kernel_ns
+        if stack:
+            stack[-1].kernel_ns += kernel
+        self.tracer._record(self.name, self.cat, self.t0, dur, kernel, self.args)
+        return False
+
+
+def chrome_trace(events: list[tuple], threads: dict[int, str], t0_ns: int, dropped: int) -> dict:
+    """Trace-event JSON object ("X" complete events, microsecond timestamps)."""
+    pid = os.getpid()
+    out = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+           for tid, name in threads.items()]
+    for name, cat, t0, dur, kernel, tid, args in events:
+        ev_args = dict(args) if args else {}
+        if cat not in KERNEL_CATEGORIES and kernel:
+            ev_args['kernel_us'] = round(kernel / 1e3, 3)
+            ev_args['glue_us'] = round((dur - kernel) / 1e3, 3)
+        out.append({
+            'name': name, 'cat': cat, 'ph': 'X', 'pid': pid, 'tid': tid,
+            'ts': (t0 - t0_ns) / 1e3, 'dur': dur / 1e3, 'args': ev_args,
+        })
+    return {'traceEvents': out, 'displayTimeUnit': 'ms', 'otherData': {'dropped': dropped}}
+
+
+def summarize(events: list[tuple]) -> dict:
+    """Per span name: count, total, and its split into kernel and glue time (ms)."""
+    stats: dict[str, dict] = {}
+    for name, cat, t0, dur, kernel, tid, args in events:
+        s = stats.get(name)
+        if s is None:
+            s = stats[name] = {'cat': cat, 'count': 0, 'total_ms': 0.0, 'kernel_ms': 0.0, 'glue_ms': 0.0}
+        s['count'] += 1
+        s['total_ms'] += dur / 1e6
+        s['kernel_ms'] += kernel / 1e6
+        s['glue_ms'] += (dur - kernel) / 1e6
+    for s in stats.values():
+        for key in ('total_ms', 'kernel_ms', 'glue_ms'):
+            s[key] = round(s[key], 3)
+    return dict(sorted(stats.items(), key=lambda kv: -kv[1]['total_ms']))
+
+
+class TraceSession:
+    """
+    Events of one scoped trace (e.g. a debug render), see Tracer.start_session().
+    They live as long as the session object, not in the tracer.
+    """
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+        self.events: list[tuple] = []
+        self.dropped = 0
+        self._token = None
+
+    def add(self, event: tuple):
+        if len(self.events) < TRACE_MAX_EVENTS:
+            self.events.append(event)
+        else:
+            self.dropped += 1
+
+    def chrome(self) -> dict:
+        return chrome_trace(self.events, self.tracer._threads, self.tracer._t0, self.dropped)
+
+    def write(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(self.chrome(), f)
+
+    def summary(self) -> dict:
+        return summarize(self.events)
+
+
+class Tracer:
+    """
+    Opt-in span recorder exporting Chrome trace-event JSON (chrome://tracing,
+    ui.perfetto.dev). Disabled it costs one attribute check per span.
+    Spans nest per thread; each one carries how much of its duration was spent
+    in 'kernel' spans (numba code), the rest being Python glue.
+
+    begin()/end() trace every thread of the process (AUDIO_TRACE). A scoped
+    session (start_session()) only records the task or thread that started it,
+    plus work it hands on through bind(), so a debug render never turns
+    tracing on for the audio callback.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.events: list[tuple] = []
+        self.dropped = 0
+        self._sessions = 0
+        # open scoped sessions; while zero, spans never look at _current
+        self._scoped = 0
+        self._current: contextvars.ContextVar[TraceSession | None] = contextvars.ContextVar('trace_session', default=None)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._threads: dict[int, str] = {}
+        self._t0 = time.perf_counter_ns()
+
+    def _stack(self) -> list:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def begin(self):
+        """Starts (or joins) the global trace; a new one starts without the events of the last."""
+        with self._lock:
+            if self._sessions == 0:
+                self.events = []
+                self.dropped = 0
+            self._sessions += 1
+            self.enabled = True
+
+    def end(self):
+        with self._lock:
+            self._sessions = max(0, self._sessions - 1)
+            self.enabled = self._sessions > 0
+
+    def clear(self):
+        with self._lock:
+            self.events = []
+            self.dropped = 0
+
+    def start_session(self) -> TraceSession:
+        """
+        Scoped trace of the calling task or thread; stop_session() from the same
+        one. Executor work joins it through bind().
+        """
+        session = TraceSession(self)
+        session._token = self._current.set(session)
+        with self._lock:
+            self._scoped += 1
+        return session
+
+    def stop_session(self, session: TraceSession):
+        with self._lock:
+            self._scoped -= 1
+        self._current.reset(session._token)
+
+    def bind(self, fn):
+        """fn, made to record into the caller's session wherever it runs (e.g. an executor thread)."""
+        session = self._current.get() if self._scoped else None
+        if session is None:
+            return fn
+        def run(*args, **kwargs):
+            token = self._current.set(session)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._current.reset(token)
+        return run
+
+    @property
+    def active(self) -> bool:
+        """Whether spans opened on this thread (task) are recorded."""
+        return self.enabled or (self._scoped > 0 and self._current.get() is not None)
+
+    def span(self, name: str, cat: str = 'python', **args):
+        if not self.active:
+            return _NULL_SPAN
+        return _Span(self, name, cat, args)
+
+    def kernel(self, name: str):
+        """Span around a call into compiled code."""
+        if not self.active:
+            return _NULL_SPAN
+        return _Span(self, name, 'kernel', None)
+
+    def _record(self, name, cat, t0, dur, kernel, args):
+        tid = threading.get_ident()
+        if tid not in self._threads:
+            self._threads[tid] = threading.current_thread().name
+        event = (name, cat, t0, dur, kernel, tid, args)
+        session = self._current.get() if self._scoped else None
+        if session is not None:
+            session.add(event)
+        if not self.enabled:
+            return
+        # list.append is atomic under the GIL, the audio thread never takes the lock
+        if len(self.events) < TRACE_MAX_EVENTS:
+            self.events.append(event)
+        else:
+            self.dropped += 1
+
+    def chrome(self) -> dict:
+        return chrome_trace(self.events, self._threads, self._t0, self.dropped)
+
+    def write(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(self.chrome(), f)
+
+    def summary(self) -> dict:
+        return summarize(self.events)
+
+
+TRACER = Tracer()
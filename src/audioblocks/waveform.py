@@ -0,0 +1,88 @@
+from __future__ import annotations
+import math
+import numpy as np
+
+
+MIN_LEVEL_BUCKETS = 512  # coarsest level still has about this many buckets
+
+
+def _reduce_pairs(mn: np.ndarray, mx: np.ndarray, ms: np.ndarray):
+    """Next level: every two buckets into one (an odd last bucket is kept alone)."""
+    n = mn.shape[0]
+    even = n - (n & 1)
+    nmn = np.minimum(mn[0:even:2], mn[1:even:2])
+    nmx = np.maximum(mx[0:even:2], mx[1:even:2])
+    nms = 0.5 * (ms[0:even:2] + ms[1:even:2])
+    if n & 1:
+        nmn = np.append(nmn, mn[-1])
+        nmx = np.append(nmx, mx[-1])
+        nms = np.append(nms, ms[-1])
+    return nmn, nmx, nms
+
+
+class WaveformPyramid:
+    """
+    Min/max/mean-square summaries of one signal at power-of-two bucket sizes,
+    built once per render. Level k has buckets of 2**k frames; level 0 is the
+    signal itself (kept by reference, never copied).
+    range() picks the finest level that still fits n_points buckets, so a
+    query costs O(n_points) whatever the length of the file.
+    """
+    def __init__(self, samples: np.ndarray, sample_rate: int):
+        self.sample_rate = int(sample_rate)
+        self.samples = np.asarray(samples, dtype=np.float32).reshape(-1)
+        self.frames = self.samples.shape[0]
+        # levels[k - 1] = (min, max, mean square) for buckets of 2**k frames
+        self.levels: list[tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+
+        x = self.samples
+        if x.shape[0] > MIN_LEVEL_BUCKETS:
+            sq = x * x
+            level = _reduce_pairs(x, x, sq)
+            self.levels.append(level)
+            while level[0].shape[0] > MIN_LEVEL_BUCKETS:
+                level = _reduce_pairs(*level)
+                self.levels.append(level)
+
+    @property
+    def duration(self) -> float:
+        return self.frames / self.sample_rate
+
+    def level_for(self, frames: int, n_points: int) -> int:
+        """Coarsest level whose buckets are no wider than frames / n_points."""
+        if n_points <= 0 or frames <= n_points:
+            return 0
+        return min(int(math.floor(math.log2(frames / n_points))), len(self.levels))
+
+    def range(self, t0: float, t1: float, n_points: int) -> dict:
+        """
+        Buckets covering [t0, t1) seconds, at most ~n_points of them.
+        Bucket i starts at 't_start + i * dt' seconds.
+        """
+        f0 = min(max(int(math.floor(t0 * self.sample_rate)), 0), self.frames)
+        f1 = min(max(int(math.ceil(t1 * self.sample_rate)), f0), self.frames)
+        k = self.level_for(f1 - f0, n_points)
+        i0 = f0 >> k
+        i1 = -(-f1 >> k)
+        if k == 0:
+            x = self.samples[i0:i1]
+            mn, mx, rms = x, x, np.abs(x)
+        else:
+            lmn, lmx, lms = self.levels[k - 1]
+            mn, mx, rms = lmn[i0:i1], lmx[i0:i1], np.sqrt(lms[i0:i1])
+        return {
+            'level': k,
+            't_start': (i0 << k) / self.sample_rate,
+            'dt': (1 << k) / self.sample_rate,
+            'min': mn,
+            'max': mx,
+            'rms': rms,
+        }
+
+    def raw(self, t1: float, frames: int) -> np.ndarray:
+        """The last 'frames' samples before t1, zero padded at the file start (for spectra)."""
+        f1 = min(max(int(math.ceil(t1 * self.sample_rate)), 0), self.frames)
+        out = np.zeros(frames, dtype=np.float32)
+        take = min(frames, f1)
+        out[frames - take:] = self.samples[f1 - take:f1]
+        return out
@@ -1,111 +1,478 @@
 import numpy as np
 import gc
-import queue
 import asyncio
 import websockets as ws
 import json
 import os
+import secrets
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs
 
 import audioblocks as ab
 
 
 connected_client = None
+active_engine = None
 
+METRICS_INTERVAL_S = 1.0
+LOUDNESS_INTERVAL_S = 0.1  # loudness messages while audio is flowing (meters refresh at 10 Hz)
+PITCH_INTERVAL_S = 0.05  # tuner updates while audio is flowing (the tracker itself hops every 10 ms)
+CONTROL_TICK_S = 0.01  # coalesced update_params are applied at most once per tick
+PLOT_RING_FRAMES = 2 ** 16
+PLOT_DEFAULT_FPS = 30.0
+PLOT_MIN_FPS = 1.0
+PLOT_MAX_FPS = 60.0
+MAX_FRAMES_IN_FLIGHT = 2
+PLOT_WRITE_BUFFER_LIMIT = 256 * 1024  # bytes queued in the transport before plot frames are dropped
+# record a Chrome trace of the whole server run into this file (written on shutdown)
+AUDIO_TRACE = os.environ.get("AUDIO_TRACE", "")
+# run the live path without a sound card: SIM_STREAM=1 (tone) or SIM_STREAM=path/to/input.wav
+SIM_STREAM = os.environ.get("SIM_STREAM", "")
+# a dropped client can reconnect to its session (engine, chain, parked upload) within this time
+SESSION_GRACE_S = float(os.environ.get("SESSION_GRACE_S", 120.0))
 
-def serialize_audio_data(in_frames, out_frames, sample_rate):
+
+def serialize_audio_data(views, sample_rate, frame=0, dropped=0):
     """
-    CPU-intensive task: concatenates numpy arrays and serializes to JSON.
+    CPU-intensive task: converts ring views to lists and serializes to JSON.
     Run this in an executor to avoid blocking the asyncio event loop.
     """
-    # Concatenate the list of arrays into one big contiguous array
-    in_chunk = np.concatenate(in_frames)
-    out_chunk = np.concatenate(out_frames)
+    # views are (frames, 2) zero-copy slices of the ring: column 0 = input, 1 = output
+    chunk = views[0] if len(views) == 1 else np.concatenate(views)
 
     return json.dumps({
         "type": "plot_data",
-        "input": in_chunk[:, 0].tolist(),
-        "output": out_chunk[:, 0].tolist(),
-        "sample_rate": sample_rate
+        "input": chunk[:, 0].tolist(),
+        "output": chunk[:, 1].tolist(),
+        "sample_rate": sample_rate,
+        "frame": frame,
+        "dropped": dropped
     })
 
 
-async def data_sender(websocket, data_queues: dict[str, queue.Queue], audio_engine):
+def serialize_waveform_range(audio_engine, cmd: dict) -> str | None:
+    """Range query on the last file's pyramids, serialized off the event loop."""
+    response = audio_engine.waveform_range(
+        float(cmd.get("t0", 0.0)),
+        float(cmd.get("t1", 0.0)),
+        int(cmd.get("n_points", 2000)),
+        int(cmd.get("raw_frames", 0))
+    )
+    if response is None:
+        return None
+    # echoed so the client can tell which view a reply belongs to
+    response["view"] = cmd.get("view")
+    return json.dumps(response)
+
+
+class PlotFlowControl:
+    """
+    Per-connection flow control for plot_data. Each message carries a frame id
+    that the client acks once it has rendered it; the server keeps at most
+    MAX_FRAMES_IN_FLIGHT unacked frames and paces sends at the fps the client
+    asks for. While the client is behind, hidden, or the socket's write buffer
+    is above PLOT_WRITE_BUFFER_LIMIT, drained frames are dropped instead of
+    queued, so a slow browser never builds up latency or server memory.
+    """
+    def __init__(self):
+        self.fps = PLOT_DEFAULT_FPS
+        self.visible = True
+        self.sent = 0
+        self.acked = 0
+        self.dropped_backpressure = 0
+        self.dropped_congestion = 0
+        self.dropped_hidden = 0
+
+    @property
+    def interval(self) -> float:
+        return 1.0 / self.fps
+
+    def configure(self, visible=None, fps=None):
+        if visible is not None:
+            self.visible = bool(visible)
+        if fps is not None:
+            self.fps = min(max(float(fps), PLOT_MIN_FPS), PLOT_MAX_FPS)
+
+    def ack(self, frame: int):
+        # acks can arrive out of order or be repeated; only the newest counts
+        if frame is not None and self.sent >= int(frame) > self.acked:
+            self.acked = int(frame)
+
+    def should_send(self, websocket) -> bool:
+        """False (and counted as dropped) when the frame about to be built would only queue up."""
+        if not self.visible:
+            self.dropped_hidden += 1
+            return False
+        if self.sent - self.acked >= MAX_FRAMES_IN_FLIGHT:
+            self.dropped_backpressure += 1
+            return False
+        transport = getattr(websocket, "transport", None)
+        if transport is not None and transport.get_write_buffer_size() > PLOT_WRITE_BUFFER_LIMIT:
+            self.dropped_congestion += 1
+            return False
+        return True
+
+    def next_frame(self) -> int:
+        self.sent += 1
+        return self.sent
+
+    def stats(self) -> dict:
+        return {
+            "fps": self.fps,
+            "visible": self.visible,
+            "sent": self.sent,
+            "in_flight": self.sent - self.acked,
+            "dropped": self.dropped_backpressure + self.dropped_congestion + self.dropped_hidden,
+            "dropped_backpressure": self.dropped_backpressure,
+            "dropped_congestion": self.dropped_congestion,
+            "dropped_hidden": self.dropped_hidden,
+        }
+
+
+async def data_sender(websocket, plot_ring: ab.SPSCRing, audio_engine, flow: PlotFlowControl):
     loop = asyncio.get_running_loop()
     
     while True:
         try:
-            in_frames = []
-            out_frames = []
-            
-            # Drain the queue of available audio blocks
-            while True:
-                try:
-                    in_frames.append(data_queues['input'].get_nowait())
-                    out_frames.append(data_queues['output'].get_nowait())
-                except queue.Empty:
-                    break
+            # Everything published so far, as views into the ring
+            views = plot_ring.read_views()
             
-            if len(in_frames) > 0:
-                # CRITICAL FIX: Run the heavy JSON serialization in a separate thread.
-                # This prevents the list conversion and JSON encoding from blocking 
-                # the asyncio loop, allowing 'stop' and 'update' commands to be processed immediately.
-                payload = await loop.run_in_executor(
-                    None, 
-                    serialize_audio_data, 
-                    in_frames, 
-                    out_frames, 
-                    audio_engine.current_sample_rate
-                )
-                
-                await websocket.send(payload)
+            if views:
+                frames = sum(v.shape[0] for v in views)
+                # the tuner sees every input frame, sent or dropped
+                audio_engine.pitch.push(views)
+                if not flow.should_send(websocket):
+                    # drop the intermediate frame: the client only ever plots the newest window
+                    plot_ring.advance(frames)
+                else:
+                    # CRITICAL FIX: Run the heavy JSON serialization in a separate thread.
+                    # This prevents the list conversion and JSON encoding from blocking 
+                    # the asyncio loop, allowing 'stop' and 'update' commands to be processed immediately.
+                    payload = await loop.run_in_executor(
+                        None, 
+                        serialize_audio_data, 
+                        views, 
+                        audio_engine.effects_chain.sr,
+                        flow.next_frame(),
+                        flow.stats()["dropped"]
+                    )
+                    # only now may the audio thread reuse those frames
+                    plot_ring.advance(frames)
+                    
+                    await websocket.send(payload)
                 
-            await asyncio.sleep(0.033) # ~30 FPS
+            await asyncio.sleep(flow.interval)
     
-        except queue.Empty:
-            await asyncio.sleep(0.1)
         except ws.exceptions.ConnectionClosed:
             break
 
 
+class CommandCoalescer:
+    """
+    Per-connection control plane state. The client stamps an increasing 'seq'
+    when a UI action creates a command: an update_param older than the last one
+    for the same (effect_id, param), or any other message older than the newest
+    one seen, is stale and dropped. update_params are parked per (effect_id,
+    param) so a slider burst applies only its latest value, once per control
+    tick, and they are flushed before any other command so ordering against
+    build_chain etc. is preserved; those for effects no longer in the chain are
+    dropped.
+    """
+    def __init__(self):
+        self.last_seq = 0
+        self.param_seq: dict[tuple[str, str], int] = {}
+        self.pending_params: dict[tuple[str, str], float] = {}
+        self.stale_dropped = 0
+        self.coalesced = 0
+
+    def accept(self, cmd: dict) -> bool:
+        seq = cmd.get("seq")
+        # a batch has no order of its own, its members are checked one by one
+        if seq is None or cmd.get("command") == "batch":
+            return True
+        if cmd.get("command") == "update_param":
+            key = (cmd.get("effect_id"), cmd.get("param"))
+            if seq <= self.param_seq.get(key, 0):
+                self.stale_dropped += 1
+                return False
+            self.param_seq[key] = seq
+            return True
+        if seq <= self.last_seq:
+            self.stale_dropped += 1
+            return False
+        self.last_seq = seq
+        return True
+
+    def push_param(self, effect_id: str, param: str, value: float):
+        key = (effect_id, param)
+        if key in self.pending_params:
+            self.coalesced += 1
+        self.pending_params[key] = value
+
+    def flush_params(self, audio_engine):
+        if not self.pending_params:
+            return
+        pending, self.pending_params = self.pending_params, {}
+        for (effect_id, param), value in pending.items():
+            if effect_id not in audio_engine.effects_map:
+                # sent before a rebuild that removed the effect
+                self.stale_dropped += 1
+                continue
+            audio_engine.update_param(effect_id, param, value)
+
+    def stats(self) -> dict:
+        return {"stale_dropped": self.stale_dropped, "coalesced": self.coalesced}
+
+
+async def param_applier(coalescer: CommandCoalescer, audio_engine):
+    while True:
+        await asyncio.sleep(CONTROL_TICK_S)
+        coalescer.flush_params(audio_engine)
+
+
+async def metrics_sender(websocket, audio_engine, coalescer: CommandCoalescer, flow: PlotFlowControl):
+    while True:
+        try:
+            await asyncio.sleep(METRICS_INTERVAL_S)
+            payload = {"type": "metrics", **audio_engine.metrics_snapshot(), "commands": coalescer.stats(), "plot": flow.stats()}
+            await websocket.send(json.dumps(payload))
+        except ws.exceptions.ConnectionClosed:
+            break
+
+
+async def loudness_sender(websocket, audio_engine):
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            await asyncio.sleep(LOUDNESS_INTERVAL_S)
+            # K-weighting and true-peak oversampling of everything since the last tick
+            report = await loop.run_in_executor(None, audio_engine.update_loudness)
+            if report is not None:
+                await websocket.send(json.dumps(report))
+        except ws.exceptions.ConnectionClosed:
+            break
+
+
+async def pitch_sender(websocket, audio_engine):
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            await asyncio.sleep(PITCH_INTERVAL_S)
+            estimate = await loop.run_in_executor(None, audio_engine.pitch.update)
+            if estimate is not None:
+                await websocket.send(json.dumps(estimate))
+        except ws.exceptions.ConnectionClosed:
+            break
+
+
+async def latency_monitor(websocket, audio_engine):
+    while True:
+        try:
+            await asyncio.sleep(METRICS_INTERVAL_S)
+            if audio_engine.adapt_latency():
+                await websocket.send(json.dumps(audio_engine.latency_report()))
+        except ws.exceptions.ConnectionClosed:
+            break
+
+
+def process_request(connection, request):
+    """Plain-text metrics scrape on GET /metrics, everything else upgrades to WebSocket."""
+    if request.path != "/metrics":
+        return None
+    if active_engine is None:
+        snapshot = ab.AudioMetrics().snapshot()
+    else:
+        snapshot = active_engine.metrics_snapshot()
+    return connection.respond(HTTPStatus.OK, ab.metrics_to_text(snapshot))
+
+
+async def dispatch(cmd: dict, websocket, audio_engine, flow: PlotFlowControl):
+    command = cmd.get("command")
+
+    if command == "plot_ack":
+        flow.ack(cmd.get("frame"))
+    elif command == "plot_flow":
+        flow.configure(visible=cmd.get("visible"), fps=cmd.get("fps"))
+    elif command == "start_mic":
+        audio_engine.start_mic_stream()
+        await websocket.send(json.dumps(audio_engine.latency_report()))
+    elif command == "stop":
+        audio_engine.stop_stream()
+    elif command == "build_chain":
+        audio_engine.build_chain(cmd.get("config", []))
+    elif command == "set_modulation":
+        audio_engine.set_modulation(cmd.get("routes", []))
+    elif command == "reset_loudness":
+        audio_engine.reset_loudness()
+    elif command == "set_latency_profile":
+        audio_engine.set_latency_profile(cmd.get("profile", ab.DEFAULT_LATENCY_PROFILE))
+        await websocket.send(json.dumps(audio_engine.latency_report()))
+    elif command == "waveform_range":
+        loop = asyncio.get_running_loop()
+        payload = await loop.run_in_executor(None, serialize_waveform_range, audio_engine, cmd)
+        if payload is not None:
+            await websocket.send(payload)
+    elif command == "spectrogram_tile":
+        tile = audio_engine.spectrogram_tile(
+            cmd.get("render_id"),
+            cmd.get("signal", "processed"),
+            int(cmd.get("level", 0)),
+            int(cmd.get("index", 0))
+        )
+        if tile is not None:
+            await websocket.send(json.dumps(tile))
+    elif command == "render_file":
+        # re-render of the parked upload with the current chain, nothing is uploaded again
+        audio_engine.submit_render(
+            None,
+            output_format=cmd.get("output_format", ab.DEFAULT_CODEC),
+            debug=cmd.get("debug", False)
+        )
+    elif command == "process_file":
+        # cancels the render in flight, if any; progress and the result arrive as messages
+        audio_engine.submit_render(
+            cmd.get("contents"),
+            output_format=cmd.get("output_format", ab.DEFAULT_CODEC),
+            echo_original=cmd.get("echo_original", True),
+            debug=cmd.get("debug", False)
+        )
+    else:
+        print(f"Warning: unknown command '{command}'")
+
+
+def simulated_stream_factory(spec: str):
+    """sd.Stream replacement reading a looped WAV file, or a test tone for any non-path value."""
+    def factory(**kwargs):
+        source = ab.WavSource(spec, kwargs['channels'][0]) if os.path.isfile(spec) else None
+        return ab.SimulatedStream(source=source, **kwargs)
+    return factory
+
+
+class Session:
+    """
+    A client's engine and plot ring, identified by a token the client sends back
+    when it reconnects (ws://host/?session=<token>). When the socket drops, the
+    engine keeps running (chain, live stream, parked upload) for SESSION_GRACE_S,
+    so a reconnect within that time continues where it left off.
+    """
+    def __init__(self):
+        self.token = secrets.token_urlsafe(16)
+        self.plot_ring = ab.SPSCRing(PLOT_RING_FRAMES, 2)
+        self.engine = ab.AudioEngine(self.plot_ring)
+        if SIM_STREAM:
+            self.engine.stream_factory = simulated_stream_factory(SIM_STREAM)
+        self.websocket = None
+        self._expiry = None
+
+    def attach(self, websocket):
+        if self._expiry is not None:
+            self._expiry.cancel()
+            self._expiry = None
+        self.websocket = websocket
+        self.engine.client = websocket
+        # plot frames queued while nobody was connected are stale
+        self.plot_ring.advance(self.plot_ring.readable())
+
+    def detach(self):
+        self.websocket = None
+        self.engine.client = None
+        self._expiry = asyncio.get_running_loop().call_later(SESSION_GRACE_S, expire_session, self)
+
+    def describe(self, resumed: bool) -> dict:
+        """First message of every connection: the token, and the state a resumed client can restore."""
+        engine = self.engine
+        return {
+            "type": "session",
+            "token": self.token,
+            "resumed": resumed,
+            "grace_s": SESSION_GRACE_S,
+            "chain": engine.last_chain_config,
+            "modulation": engine.last_mod_config,
+            "latency_profile": engine.latency_profile,
+            "streaming": engine.is_running,
+            # a resumed client that is still waiting for a render which is no longer
+            # running missed its result, and asks for it again
+            "rendering": engine.rendering(),
+            "file": engine.last_file,
+        }
+
+
+sessions: dict[str, Session] = {}
+
+
+def expire_session(session: Session):
+    if session.websocket is not None:
+        return
+    sessions.pop(session.token, None)
+    # nobody will receive a render that is still queued or running
+    session.engine.cancel_renders("session_expired")
+    session.engine.close()
+    print("Info: session expired")
+
+
 async def handler(websocket):
     # check if connection is available
-    global connected_client
+    global connected_client, active_engine
+    token = parse_qs(urlsplit(websocket.request.path).query).get("session", [None])[0]
+    session = sessions.get(token) if token else None
     if connected_client is not None:
-        print("Warning: client already connected. Rejecting new connection")
-        return
-    
-    # prepare new client connection
+        if session is None or session.websocket is not connected_client:
+            print("Warning: client already connected. Rejecting new connection")
+            return
+        # the same client is back while its old socket is still half-open (e.g. dropped by a proxy)
+        print("Info: session reconnected, closing its previous connection")
+        asyncio.create_task(connected_client.close())
+
+    # prepare new client connection (or pick up the session it had)
+    resumed = session is not None
+    if session is None:
+        # only one client at a time, and it did not come back for the detached
+        # sessions: release their input devices instead of waiting for the expiry
+        for detached in sessions.values():
+            if detached.websocket is None and detached.engine.is_running:
+                print("Info: stopping the stream of a detached session")
+                detached.engine.stop_stream()
+        session = Session()
+        sessions[session.token] = session
+    session.attach(websocket)
     connected_client = websocket
-    print("Connected to frontend client")
-    data_queues = {
-        "input": queue.Queue(maxsize=200),
-        "output": queue.Queue(maxsize=200)
-    }
-    audio_engine = ab.AudioEngine(data_queues)
+    print("Resumed session of frontend client" if resumed else "Connected to frontend client")
+    plot_ring = session.plot_ring
+    audio_engine = session.engine
+    active_engine = audio_engine
+    await websocket.send(json.dumps(session.describe(resumed)))
+
+    coalescer = CommandCoalescer()
+    flow = PlotFlowControl()
 
     # start data send task
-    sender_task = asyncio.create_task(data_sender(websocket, data_queues, audio_engine))
+    sender_task = asyncio.create_task(data_sender(websocket, plot_ring, audio_engine, flow))
+    metrics_task = asyncio.create_task(metrics_sender(websocket, audio_engine, coalescer, flow))
+    latency_task = asyncio.create_task(latency_monitor(websocket, audio_engine))
+    loudness_task = asyncio.create_task(loudness_sender(websocket, audio_engine))
+    pitch_task = asyncio.create_task(pitch_sender(websocket, audio_engine))
+    params_task = asyncio.create_task(param_applier(coalescer, audio_engine))
 
     try:
         async for message in websocket:
             try:
                 cmd = json.loads(message)
-                command = cmd.get("command")
-
-                if command == "start_mic":
-                    audio_engine.start_mic_stream()
-                elif command == "stop":
-                    audio_engine.stop_stream()
-                elif command == "build_chain":
-                    audio_engine.build_chain(cmd.get("config", []))
-                elif command == "update_param":
-                    audio_engine.update_param(
-                        cmd.get("effect_id"),
-                        cmd.get("param"),
-                        cmd.get("value")
-                    )
-                elif command == "process_file":
-                    asyncio.create_task(audio_engine.process_wav_file(cmd.get("contents"), websocket))
+                if not coalescer.accept(cmd):
+                    continue
+
+                # {"command": "batch", "commands": [...]}, each member with its own seq
+                commands = cmd.get("commands", []) if cmd.get("command") == "batch" else [cmd]
+                for sub in commands:
+                    if sub is not cmd and not coalescer.accept(sub):
+                        continue
+                    if sub.get("command") == "update_param":
+                        coalescer.push_param(sub.get("effect_id"), sub.get("param"), sub.get("value"))
+                    elif sub.get("command") in ("plot_ack", "plot_flow"):
+                        # flow control does not touch the chain, no need to flush params
+                        await dispatch(sub, websocket, audio_engine, flow)
+                    else:
+                        coalescer.flush_params(audio_engine)
+                        await dispatch(sub, websocket, audio_engine, flow)
 
             except json.JSONDecodeError:
                 print(f"Error: message is not valid JSON: {message}")
@@ -113,19 +480,29 @@ async def handler(websocket):
                 print(f"Error processing command: {e}")
 
     finally:
-        audio_engine.stop_stream()
         sender_task.cancel()
-        connected_client = None
+        metrics_task.cancel()
+        latency_task.cancel()
+        loudness_task.cancel()
+        pitch_task.cancel()
+        params_task.cancel()
+        # unless a reconnect has already taken the session over, keep it for the grace period
+        if session.websocket is websocket:
+            session.detach()
+            connected_client = None
+            active_engine = None
         print("Disconnected from frontend client")
 
 
 async def main():
     gc.disable()
+    if AUDIO_TRACE:
+        ab.TRACER.begin()
 
     port = int(os.environ.get("PORT", 8765))
     print(f"Audio effects server initialized on port {port}")
 
-    async with ws.serve(handler, "0.0.0.0", port, max_size = 500 * 1024 * 1024):
+    async with ws.serve(handler, "0.0.0.0", port, max_size = 500 * 1024 * 1024, process_request=process_request):
         await asyncio.Future()
         
 
@@ -135,3 +512,9 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         print("\nClosing server")
         gc.enable()
+    finally:
+        for session in list(sessions.values()):
+            session.engine.close()
+        if AUDIO_TRACE:
+            ab.TRACER.write(AUDIO_TRACE)
+            print(f"Trace written to {AUDIO_TRACE}")
@@ -0,0 +1,21 @@
+import app
+
+
+def test_no_server_callback_is_triggered_by_slider_patches():
+    # effects-chain-store is patched clientside on every slider move
+    for name, cb in app.app.callback_map.items():
+        inputs = {(i['id'], i['property']) for i in cb['inputs']}
+        assert ('effects-chain-store', 'data') not in inputs, name
+
+
+def test_structural_edits_write_the_structure_store():
+    chain, structure, command, _ = app.add_effect('delay', [])
+    assert structure == app.chain_structure(chain)
+    assert structure[0]['type'] == 'delay'
+    assert command == {'command': 'build_chain', 'config': chain}
+
+
+def test_structure_ignores_params():
+    a = [{'effect_id': 'x', 'type': 'delay', 'params': {'mix_wet': 0.1}}]
+    b = [{'effect_id': 'x', 'type': 'delay', 'params': {'mix_wet': 0.9}}]
+    assert app.chain_structure(a) == app.chain_structure(b)
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+import audioblocks as ab
+
+
+def render(effect, x, blocksize=256, fs=48000):
+    effect.prepare(fs, x.shape[1], x.shape[1], blocksize)
+    out = np.zeros_like(x)
+    for i in range(0, len(x), blocksize):
+        effect.process_into(x[i:i + blocksize], out[i:i + blocksize])
+    return out
+
+
+def noise(seconds=1.0, fs=48000):
+    return (np.random.default_rng(3).standard_normal((int(seconds * fs), 2)) * 0.25).astype(np.float32)
+
+
+@pytest.mark.parametrize("cls", [ab.ChorusEffect, ab.FlangerEffect])
+def test_zero_mix_is_dry(cls):
+    x = noise()
+    y = render(cls(mix=0.0), x)
+    assert np.allclose(y, x, atol=1e-6)
+
+
+@pytest.mark.parametrize("cls", [ab.ChorusEffect, ab.FlangerEffect])
+def test_output_stays_bounded(cls):
+    x = noise(2.0)
+    fx = cls(mix=1.0, feedback=cls.FEEDBACK_RANGE[1], voices=ab.chorus.MAX_VOICES if cls is ab.ChorusEffect else 1)
+    y = render(fx, x)
+    assert np.all(np.isfinite(y))
+    assert np.max(np.abs(y)) < 20.0 * np.max(np.abs(x))
+
+
+def test_wet_signal_is_delayed():
+    # an impulse comes out no earlier than the shortest swept tap
+    fs = 48000
+    x = np.zeros((fs // 4, 2), dtype=np.float32)
+    x[0] = 1.0
+    fx = ab.ChorusEffect(mix=1.0, delay_ms=15.0, depth_ms=3.0, voices=1)
+    y = render(fx, x)
+    first = np.flatnonzero(np.abs(y[:, 0]) > 1e-6)[0]
+    assert first >= int((15.0 - 3.0) * fs / 1000.0) - 2
+
+
+def test_voice_count_is_clamped():
+    fx = ab.ChorusEffect(voices=99)
+    assert fx.voices == ab.chorus.MAX_VOICES
+    fx.set_voices(0)
+    assert fx.voices == 1
@@ -0,0 +1,58 @@
+import backend
+
+
+class Engine:
+    def __init__(self, effect_ids):
+        self.effects_map = dict.fromkeys(effect_ids)
+        self.applied = []
+
+    def update_param(self, effect_id, param, value):
+        self.applied.append((effect_id, param, value))
+
+
+def param(seq, effect_id='d', name='mix', value=0.0):
+    return {'command': 'update_param', 'effect_id': effect_id, 'param': name, 'value': value, 'seq': seq}
+
+
+def test_stale_commands_are_dropped():
+    c = backend.CommandCoalescer()
+    assert c.accept({'command': 'build_chain', 'seq': 5})
+    assert not c.accept({'command': 'set_modulation', 'seq': 4})
+    assert c.accept({'command': 'set_modulation', 'seq': 6})
+    # unsequenced messages (plot acks, replays) always pass
+    assert c.accept({'command': 'plot_ack'})
+    assert c.stats()['stale_dropped'] == 1
+
+
+def test_params_are_ordered_per_effect_and_param():
+    c = backend.CommandCoalescer()
+    assert c.accept({'command': 'build_chain', 'seq': 10})
+    # created before the rebuild was sent, but newer than any value for this slider
+    assert c.accept(param(8))
+    assert not c.accept(param(7))
+    assert c.accept(param(3, name='feedback'))
+    assert not c.accept(param(8))
+    assert c.accept({'command': 'batch', 'commands': [], 'seq': 1})
+
+
+def test_bursts_apply_only_the_latest_value_once():
+    c = backend.CommandCoalescer()
+    engine = Engine(['d'])
+    for v in (0.1, 0.2, 0.3):
+        c.push_param('d', 'mix', v)
+    c.push_param('d', 'feedback', 0.5)
+    c.flush_params(engine)
+    assert engine.applied == [('d', 'mix', 0.3), ('d', 'feedback', 0.5)]
+    assert c.stats()['coalesced'] == 2
+    c.flush_params(engine)
+    assert len(engine.applied) == 2
+
+
+def test_params_of_removed_effects_are_dropped():
+    c = backend.CommandCoalescer()
+    engine = Engine(['kept'])
+    c.push_param('gone', 'mix', 0.5)
+    c.push_param('kept', 'mix', 0.5)
+    c.flush_params(engine)
+    assert engine.applied == [('kept', 'mix', 0.5)]
+    assert c.stats()['stale_dropped'] == 1
@@ -0,0 +1,41 @@
+import base64
+import io
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+import audioblocks as ab
+
+
+def decode(data_url):
+    header, payload = data_url.split(',')
+    return header, sf.read(io.BytesIO(base64.b64decode(payload)), dtype='float32')
+
+
+def sine(fs=48000, seconds=0.5):
+    t = np.arange(int(fs * seconds)) / fs
+    x = 0.5 * np.sin(2 * np.pi * 440.0 * t)
+    return np.stack([x, -x], axis=1).astype(np.float32)
+
+
+@pytest.mark.parametrize("codec, tol", [('wav16', 1e-4), ('wav32f', 0.0), ('flac', 1e-4)])
+def test_lossless_codecs_round_trip(codec, tol):
+    x = sine()
+    header, (y, fs) = decode(ab.encode_audio(x, 48000, codec))
+    assert header == f"data:{ab.OUTPUT_CODECS[codec][2]};base64"
+    assert fs == 48000
+    assert y.shape == x.shape
+    assert np.abs(y - x).max() <= tol
+
+
+def test_ogg_keeps_length_and_level():
+    x = sine()
+    _, (y, _) = decode(ab.encode_audio(x, 48000, 'ogg'))
+    assert abs(y.shape[0] - x.shape[0]) < 1024
+    assert np.sqrt(np.mean(y ** 2)) == pytest.approx(np.sqrt(np.mean(x ** 2)), rel=0.05)
+
+
+def test_unknown_codec_falls_back_to_default():
+    header, _ = decode(ab.encode_audio(sine(), 48000, 'mp9'))
+    assert header == f"data:{ab.OUTPUT_CODECS[ab.DEFAULT_CODEC][2]};base64"
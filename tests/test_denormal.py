@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+import audioblocks as ab
+from audioblocks import denormal
+
+
+def subnormal_product():
+    return np.float32(1e-30) * np.float32(1e-10)
+
+
+def test_flush_denormal_threshold():
+    assert ab.flush_denormal(1e-16) == 0.0
+    assert ab.flush_denormal(-1e-16) == 0.0
+    assert ab.flush_denormal(1e-14) == 1e-14
+
+
+@pytest.mark.skipif(denormal._swap_mxcsr is None, reason="no MXCSR on this platform")
+def test_denormals_flushed_is_scoped():
+    assert subnormal_product() != 0.0
+    with ab.denormals_flushed():
+        assert subnormal_product() == 0.0
+    assert subnormal_product() != 0.0
+
+
+@pytest.mark.parametrize("effect_type", sorted(denormal.TAIL_EFFECTS))
+def test_feedback_tails_decay_to_exact_zero(effect_type):
+    fs, bs = 48000, 1024
+    chain = ab.build_file_chain([{'type': effect_type, 'params': denormal.TAIL_EFFECTS[effect_type]}], [], fs)
+    x = np.zeros((bs, 1), dtype=np.float32)
+    y = np.zeros((bs, chain.co), dtype=np.float32)
+    x[:, 0] = 0.5 * np.random.default_rng(0).standard_normal(bs)
+    chain.process(x, y)
+    x.fill(0.0)
+    # 0.95 delay feedback needs ~25 s to fall below DENORMAL_FLOOR
+    for _ in range(int(30 * fs / bs)):
+        chain.process(x, y)
+    assert not np.any(y)
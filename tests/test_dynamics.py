@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+import audioblocks as ab
+from audioblocks import dynamics as D
+
+
+def render(effect, x, blocksize=256, fs=48000):
+    effect.prepare(fs, x.shape[1], x.shape[1], blocksize)
+    out = np.zeros_like(x)
+    for i in range(0, len(x), blocksize):
+        effect.process_into(x[i:i + blocksize], out[i:i + blocksize])
+    return out
+
+
+@pytest.mark.parametrize("windows", [[5], [1, 7, 3, 16, 2]])
+def test_sliding_max_matches_brute_force(windows):
+    v = np.random.default_rng(1).standard_normal(400)
+    dq_val, dq_idx, st = D.make_sliding_max(16)
+    prev, changed = windows[0], 0
+    for t, x in enumerate(v):
+        w = windows[(t // 50) % len(windows)]
+        if w != windows[((t - 1) // 50) % len(windows)] and t:
+            prev, changed = windows[((t - 1) // 50) % len(windows)], t
+        got = D.sliding_max_push(dq_val, dq_idx, st, x, w)
+        want = v[max(0, t - w + 1):t + 1].max()
+        if w <= prev or t - changed + 1 >= w:
+            assert got == want
+        else:
+            # a grown window only covers what the shorter one kept until it refills
+            assert got <= want
+
+
+def test_soft_knee_curve():
+    # below the knee: untouched; far above: the ratio; at the threshold: half the knee's reduction
+    assert D.soft_knee_gain_db(-40.0, -20.0, 4.0, 6.0) == 0.0
+    assert D.soft_knee_gain_db(0.0, -20.0, 4.0, 6.0) == pytest.approx(-15.0)
+    assert D.soft_knee_gain_db(-20.0, -20.0, 4.0, 6.0) == pytest.approx(-0.75 * 3.0 * 3.0 / 12.0)
+
+
+@pytest.mark.parametrize("ceiling_db", [-1.0, -6.0])
+def test_limiter_never_exceeds_ceiling(ceiling_db):
+    fs = 48000
+    rng = np.random.default_rng(7)
+    x = (rng.standard_normal((2 * fs, 2)) * 2.0).astype(np.float32)
+    x[fs // 2] = 40.0  # an isolated spike
+    y = render(ab.LimiterEffect(ceiling_db=ceiling_db), x)
+    assert np.max(np.abs(y)) <= 10.0 ** (ceiling_db / 20.0) + 1e-6
+
+
+def test_limiter_passes_quiet_signal_delayed():
+    fs = 48000
+    t = np.arange(fs // 2) / fs
+    x = np.repeat((0.3 * np.sin(2 * np.pi * 440.0 * t))[:, None], 2, axis=1).astype(np.float32)
+    lim = ab.LimiterEffect(ceiling_db=-1.0, lookahead_ms=5.0)
+    y = render(lim, x)
+    d = lim.latency_samples()
+    assert d == 240
+    assert np.allclose(y[d:], x[:-d], atol=1e-6)
+    assert lim.gain_reduction_db == pytest.approx(0.0, abs=1e-6)
+
+
+def test_compressor_reduces_a_loud_sine_by_the_ratio():
+    fs = 48000
+    t = np.arange(fs) / fs
+    x = np.repeat(np.sin(2 * np.pi * 200.0 * t)[:, None], 2, axis=1).astype(np.float32)  # 0 dBFS peaks
+    comp = ab.CompressorEffect(threshold_db=-20.0, ratio=4.0, knee_db=0.0, attack_ms=1.0, release_ms=50.0)
+    y = render(comp, x)
+    assert comp.gain_reduction_db == pytest.approx(-15.0, abs=0.5)
+    assert 20.0 * np.log10(np.max(np.abs(y[-fs // 4:]))) == pytest.approx(-15.0, abs=0.5)
@@ -0,0 +1,24 @@
+import numpy as np
+
+import audioblocks as ab
+
+
+def glide_end(blocksize, fs=48000):
+    """Sample at which a 500 Hz -> 5 kHz cutoff change has fully ramped."""
+    f = ab.FilterEffect(0.0, 500.0, 0.707)
+    f.prepare(fs, 2, 2, blocksize)
+    x = (np.random.default_rng(0).standard_normal((fs, 2)) * 0.2).astype(np.float32)
+    out = np.zeros_like(x)
+    f.set_cutoff_hz(5000.0)
+    for i in range(0, fs, blocksize):
+        f.process_into(x[i:i + blocksize], out[i:i + blocksize])
+        if f.cutoff_hz.current == 5000.0:
+            return i + blocksize
+    return None
+
+
+def test_cutoff_glide_does_not_depend_on_the_blocksize():
+    ends = [glide_end(bs) for bs in (64, 256, 512)]
+    assert None not in ends
+    assert max(ends) - min(ends) <= 512
+
@@ -0,0 +1,52 @@
+import pytest
+
+import audioblocks as ab
+from audioblocks import engine as E
+
+
+@pytest.fixture
+def engine():
+    engine = ab.AudioEngine(ab.SPSCRing(2 ** 16, 2))
+    engine.stream_factory = lambda **kwargs: ab.SimulatedStream(**kwargs)
+    now = [0.0]
+    engine.clock = lambda: now[0]
+    engine.now = now
+    yield engine
+    engine.close()
+
+
+def test_named_profile_sets_the_blocksize(engine):
+    engine.set_latency_profile('low')
+    assert engine.blocksize == E.LATENCY_PROFILES['low']['blocksize']
+    assert not engine.adaptive_latency
+    engine.set_latency_profile('nonsense')
+    assert engine.latency_profile == 'low'
+
+
+def test_adaptive_steps_up_on_xruns_and_down_when_stable(engine):
+    engine.set_latency_profile('adaptive')
+    engine.start_mic_stream()
+    start = engine.latency_profile
+    order = list(E.LATENCY_PROFILES)
+
+    engine.metrics.xruns += E.ADAPT_XRUN_THRESHOLD + 1
+    assert engine.adapt_latency()
+    assert engine.latency_profile == order[order.index(start) + 1]
+    assert engine.stream.blocksize == engine.blocksize
+
+    # a few xruns hold the profile and restart the stability window
+    engine.now[0] += E.ADAPT_STABLE_S + 1
+    engine.metrics.xruns += 1
+    assert not engine.adapt_latency()
+    engine.now[0] += E.ADAPT_STABLE_S / 2
+    assert not engine.adapt_latency()
+
+    engine.now[0] += E.ADAPT_STABLE_S
+    assert engine.adapt_latency()
+    assert engine.latency_profile == start
+
+
+def test_adaptive_needs_a_running_stream(engine):
+    engine.set_latency_profile('adaptive')
+    engine.metrics.xruns += 100
+    assert not engine.adapt_latency()
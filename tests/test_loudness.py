@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from audioblocks import loudness as L
+
+FS = 48000
+
+
+def sine(level_dbfs, seconds, freq=997.0, channels=2, phase=0.0):
+    t = np.arange(int(seconds * FS)) / FS
+    x = 10.0 ** (level_dbfs / 20.0) * np.sin(2 * np.pi * freq * t + phase)
+    return np.repeat(x[:, None], channels, axis=1).astype(np.float32)
+
+
+def test_minus_23_lufs_sine_reads_minus_23_integrated():
+    # R128 reference: a stereo 1 kHz sine at -23 dBFS per channel is -23 LUFS
+    snap = L.measure_loudness(sine(-23.0, 20.0), FS)
+    assert snap['integrated'] == -23.0
+    assert snap['momentary'] == pytest.approx(-23.0, abs=0.1)
+    assert snap['short_term'] == pytest.approx(-23.0, abs=0.1)
+
+
+def test_full_scale_sine_on_one_channel_is_minus_3():
+    x = sine(0.0, 5.0, channels=2)
+    x[:, 1] = 0.0
+    assert L.measure_loudness(x, FS)['integrated'] == pytest.approx(-3.0, abs=0.1)
+
+
+def test_silence_is_gated_out():
+    x = np.concatenate([sine(-23.0, 10.0), np.zeros((10 * FS, 2), dtype=np.float32)])
+    snap = L.measure_loudness(x, FS)
+    assert snap['integrated'] == pytest.approx(-23.0, abs=0.2)
+    assert L.measure_loudness(np.zeros((FS, 2), dtype=np.float32), FS)['integrated'] is None
+
+
+def test_relative_gate_drops_quiet_passages():
+    # 20 LU below the loud part is under the -10 LU relative gate
+    x = np.concatenate([sine(-23.0, 10.0), sine(-43.0, 10.0)])
+    assert L.measure_loudness(x, FS)['integrated'] == pytest.approx(-23.0, abs=0.2)
+
+
+def test_loudness_range_of_two_levels():
+    # EBU Tech 3342 case: 20 s at -20 LUFS then 20 s at -30 LUFS gives LRA 10 LU
+    x = np.concatenate([sine(-20.0, 20.0), sine(-30.0, 20.0)])
+    assert L.measure_loudness(x, FS)['lra'] == pytest.approx(10.0, abs=1.0)
+
+
+def test_true_peak_finds_the_intersample_peak():
+    # fs/4 at 45 degrees: every sample sits 3 dB below the waveform's peak
+    x = sine(-6.0, 1.0, freq=FS / 4, phase=np.pi / 4)
+    assert 20.0 * np.log10(np.max(np.abs(x))) == pytest.approx(-9.0, abs=0.1)
+    assert L.measure_loudness(x, FS)['true_peak'] == pytest.approx(-6.0, abs=0.5)
+
+
+def test_block_size_does_not_change_the_reading():
+    x = np.concatenate([sine(-18.0, 4.0), sine(-28.0, 4.0, freq=200.0)])
+    assert L.measure_loudness(x, FS, blocksize=97) == L.measure_loudness(x, FS)
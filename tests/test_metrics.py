@@ -0,0 +1,41 @@
+import numpy as np
+
+import audioblocks as ab
+
+
+def test_snapshot_reports_load_against_the_deadline():
+    m = ab.AudioMetrics(capacity=8)
+    for _ in range(20):
+        m.record_callback(duration_ns=250_000, deadline_ns=1_000_000)
+    m.record_callback(duration_ns=2_000_000, deadline_ns=1_000_000, xrun=True)
+    snap = m.snapshot(queue_drops=3)
+    assert snap['callbacks'] == 21
+    assert snap['xruns'] == 1
+    assert snap['queue_drops'] == 3
+    # the ring keeps the last 'capacity' callbacks
+    assert snap['cpu_load_pct']['p50'] == 25.0
+    assert snap['cpu_load_pct']['max'] == 200.0
+
+
+def test_effect_rows_follow_the_chain_labels():
+    m = ab.AudioMetrics(capacity=4, max_effects=2)
+    m.set_effects(['gate', 'filter', 'delay'])
+    for k in range(6):
+        row = m.next_block_row()
+        row[:2] = (1000 * (k + 1), 2000 * (k + 1))
+    snap = m.snapshot()
+    assert list(snap['effect_us']) == ['gate', 'filter']
+    assert snap['effect_us']['filter']['max'] == 12.0
+
+
+def test_text_exposition():
+    m = ab.AudioMetrics()
+    m.set_effects(['gate'])
+    m.record_callback(1000, 2000)
+    m.next_block_row()[0] = 500
+    text = ab.metrics_to_text(m.snapshot())
+    lines = text.splitlines()
+    assert 'audio_callbacks_total 1' in lines
+    assert 'audio_cpu_load_pct{quantile="0.5"} 50.0' in lines
+    assert 'audio_effect_us{effect="gate",quantile="1"} 0.5' in lines
+    assert text.endswith("\n")
@@ -0,0 +1,91 @@
+import math
+
+import numpy as np
+import pytest
+
+import audioblocks as ab
+
+
+def lfo_reference(shape, rate_hz, fs, blocks, blocksize, phase=0.0, seed=1):
+    """Per-sample LFO; the source's value per block is its last sample."""
+    inc = rate_hz / fs
+    held = 0.0
+    values = []
+    for _ in range(blocks):
+        for _ in range(blocksize):
+            p = phase
+            v = {
+                'sine': math.sin(2 * math.pi * p),
+                'triangle': 4.0 * abs(p - 0.5) - 1.0,
+                'square': 1.0 if p < 0.5 else -1.0,
+                'sample_hold': held,
+            }[shape]
+            phase += inc
+            if phase >= 1.0:
+                phase -= 1.0
+                seed = (seed * 1103515245 + 12345) & 0x7fffffff
+                held = 2.0 * (seed / 2147483647.0) - 1.0
+        values.append(v)
+    return np.array(values)
+
+
+@pytest.mark.parametrize("shape", sorted(ab.LFO_SHAPES))
+def test_lfo_block_values_match_the_per_sample_waveform(shape):
+    lfo = ab.LFO(shape, rate_hz=7.3, phase=0.1)
+    lfo.prepare(48000, 256)
+    x = np.zeros((256, 1), dtype=np.float32)
+    got = np.array([lfo.process(x) for _ in range(100)])
+    ref = lfo_reference(shape, 7.3, 48000, 100, 256, phase=0.1)
+    assert np.abs(got - ref).max() < 1e-6
+
+
+def test_lfo_tempo_sync():
+    assert ab.LFO(bpm=120, beats=4).rate == pytest.approx(0.5)
+
+
+def test_envelope_follows_the_level_and_clamps():
+    env = ab.EnvelopeFollower(attack_ms=1.0, release_ms=50.0, sensitivity=4.0)
+    env.prepare(48000, 256)
+    silence = np.zeros((256, 2), dtype=np.float32)
+    # the loudest channel counts
+    level = np.zeros((256, 2), dtype=np.float32)
+    level[:, 1] = 0.2
+    assert env.process(silence) == 0.0
+    rising = [env.process(level) for _ in range(10)]
+    assert rising[-1] == pytest.approx(0.8, abs=1e-3)
+    falling = [env.process(silence) for _ in range(10)]
+    assert all(b < a for a, b in zip(falling, falling[1:]))
+    assert env.process(level * 5) == 1.0
+
+
+@pytest.mark.parametrize("config", [
+    {'type': 'wobble'},
+    {'type': 'lfo', 'speed': 3},
+    {'type': 'lfo', 'rate_hz': 'fast'},
+])
+def test_invalid_sources_are_rejected(config):
+    assert ab.make_source(config) is None
+
+
+def test_routes_write_depth_scaled_offsets():
+    store = ab.ParamStore(2)
+    a = ab.SmoothParam(0.5, 0.0, 2.0)
+    b = ab.SmoothParam(0.0)  # unbounded: depth in absolute units
+    a.bind(store)
+    b.bind(store)
+
+    class Const:
+        def __init__(self, v): self.v = v
+        def prepare(self, sample_rate, blocksize): pass
+        def process(self, x_block): return self.v
+
+    matrix = ab.ModulationMatrix(store)
+    matrix.add_route(Const(0.5), a, 0.25)
+    matrix.add_route(Const(-1.0), a, 0.1)
+    matrix.add_route(Const(1.0), b, 3.0)
+    matrix.process(np.zeros((16, 1), dtype=np.float32))
+    assert store.mod[a._idx] == pytest.approx(0.5 * 0.25 * 2.0 - 0.1 * 2.0)
+    assert store.mod[b._idx] == pytest.approx(3.0)
+
+    with pytest.raises(ValueError):
+        matrix.add_route(Const(1.0), ab.SmoothParam(0.0), 1.0)
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from audioblocks.engine import build_file_chain
+
+PARAMS = {
+    'filter': {'cutoff_hz': 800.0, 'q': 2.0},
+    'delay': {'delay_ms': 375.0, 'feedback': 0.5},
+    'spectral': {'threshold_db': -30.0},
+    'reverb': {},
+}
+
+
+def config(*types, **overrides):
+    return [{'effect_id': f'e{i}', 'type': t, 'params': {**PARAMS[t], **overrides.get(t, {})}}
+            for i, t in enumerate(types)]
+
+
+def signal(fs, seconds=3.0):
+    rng = np.random.default_rng(0)
+    t = np.arange(int(fs * seconds)) / fs
+    x = 0.3 * np.sin(2 * np.pi * 220.0 * t) * (rng.random(t.size) > 0.5) + 0.05 * rng.standard_normal(t.size)
+    return x.astype(np.float32)[:, None]
+
+
+def render(cfg, audio, fs, offline, mod=()):
+    chain = build_file_chain(cfg, list(mod), fs)
+    out = np.zeros((audio.shape[0], 2), dtype=np.float32)
+    assert chain.render(audio, out, offline=offline)
+    return out, chain
+
+
+@pytest.mark.parametrize("fs", [48000, 44100])
+@pytest.mark.parametrize("cfg", [
+    config('filter'),
+    config('delay'),
+    config('delay', delay={'delay_ms': 5.0, 'feedback': 0.6}),  # under one offline period
+    config('spectral'),
+    config('filter', 'reverb', 'delay', 'spectral'),
+])
+def test_offline_render_matches_the_block_render(fs, cfg):
+    audio = signal(fs)
+    blocks, _ = render(cfg, audio, fs, offline=False)
+    whole, chain = render(cfg, audio, fs, offline=True)
+    assert chain.static()
+    assert np.max(np.abs(whole - blocks)) < 1e-5
+    assert np.max(np.abs(blocks)) > 0.01
+
+
+def test_modulated_chain_is_not_static():
+    mod = [{'source': {'type': 'lfo', 'rate_hz': 1.0}, 'effect_id': 'e0', 'param': 'cutoff_hz', 'depth': 0.2}]
+    chain = build_file_chain(config('filter'), mod, 48000)
+    assert not chain.static()
+
+
+def test_filter_offline_continues_from_the_block_state():
+    # half the signal in blocks, the rest in one process_offline call
+    fs = 48000
+    audio = np.repeat(signal(fs, 1.0), 2, axis=1)
+    a = build_file_chain(config('filter'), [], fs).effects[0]
+    b = build_file_chain(config('filter'), [], fs).effects[0]
+    ref = np.empty_like(audio)
+    for i in range(0, len(audio), 256):
+        a.process_into(audio[i:i + 256], ref[i:i + 256])
+    half = 256 * 90
+    got = np.empty_like(audio)
+    for i in range(0, half, 256):
+        b.process_into(audio[i:i + 256], got[i:i + 256])
+    got[half:] = b.process_offline(audio[half:])
+    assert np.max(np.abs(got - ref)) < 1e-5
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+import audioblocks as ab
+
+
+def test_linear_ramp_moves_at_most_step_per_sample():
+    p = ab.SmoothParam(0.0, 0.0, 1.0)
+    p.set_target(1.0)
+    out = np.zeros(64)
+    last = p.ramp_into(out, 0.01)
+    assert np.allclose(np.diff(np.concatenate([[0.0], out])), 0.01)
+    assert last == pytest.approx(0.64)
+    assert p.current == last
+
+
+def test_ramp_reaches_the_target_and_stays():
+    p = ab.SmoothParam(0.0, 0.0, 1.0)
+    p.set_target(0.5)
+    out = np.zeros(100)
+    p.ramp_into(out, 0.01)
+    assert out[49] == 0.5
+    assert np.all(out[49:] == 0.5)
+
+
+def test_exponential_ramp_approaches_the_target():
+    p = ab.SmoothParam(0.0, 0.0, 1.0, mode=ab.RAMP_EXP)
+    p.set_target(1.0)
+    out = np.zeros(200)
+    p.ramp_into(out, 0.05)
+    assert np.all(np.diff(out) > 0)
+    assert out[0] == pytest.approx(0.05)
+    assert out[-1] == pytest.approx(1.0, abs=1e-4)
+
+
+def test_targets_are_clamped_and_modulation_adds_to_them():
+    store = ab.ParamStore(1)
+    p = ab.SmoothParam(0.2, 0.0, 1.0)
+    p.bind(store)
+    p.set_target(5.0)
+    assert p.target == 1.0
+    p.set_target(0.5)
+    store.mod[p._idx] = 0.3
+    assert p.step_towards(1.0) == pytest.approx(0.8)
+    store.mod[p._idx] = 1.0
+    assert p.step_towards(1.0) == 1.0
+    assert store.settled()
+
+
+def test_bind_moves_the_slot_and_keeps_its_state():
+    p = ab.SmoothParam(0.25, -1.0, 1.0)
+    p.set_target(0.75)
+    store = ab.ParamStore(1)
+    for _ in range(3):
+        ab.SmoothParam(0.0).bind(store)  # forces a grow
+    p.bind(store)
+    assert (p.current, p.target, p.lo, p.hi) == (0.25, 0.75, -1.0, 1.0)
+    assert p._store is store and store.size == 4
+
+
+def test_fused_helpers_match_the_handle():
+    store = ab.ParamStore(2)
+    a = ab.SmoothParam(0.0, 0.0, 10.0)
+    b = ab.SmoothParam(0.0, 0.0, 10.0)
+    a.bind(store)
+    b.bind(store)
+    a.set_target(3.0)
+    b.set_target(3.0)
+    params = store.arrays()
+    assert ab.step_param(params, a._idx, 1.0) == 1.0
+    out = np.zeros(8)
+    ab.ramp_param(params, b._idx, out, 0.5, ab.RAMP_LINEAR)
+    ref = ab.SmoothParam(0.0, 0.0, 10.0)
+    ref.set_target(3.0)
+    ref_out = np.zeros(8)
+    ref.ramp_into(ref_out, 0.5)
+    assert np.array_equal(out, ref_out)
+    assert b.current == ref.current == 3.0
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from audioblocks import pitch as P
+
+FS = 48000
+
+
+def tone(freq, seconds=0.5, harmonics=1, amp=0.5):
+    t = np.arange(int(seconds * FS)) / FS
+    x = sum(np.sin(2 * np.pi * freq * h * t) / h for h in range(1, harmonics + 1))
+    return (amp * x / np.max(np.abs(x))).astype(np.float32)
+
+
+def test_cmnd_matches_the_direct_sum():
+    x = np.random.default_rng(2).standard_normal((2, 600))
+    tau_max = 200
+    n_int = x.shape[1] - tau_max
+    got = P.yin_cmnd(x, tau_max)
+    for k in range(2):
+        d = np.array([np.sum((x[k, :n_int] - x[k, tau:tau + n_int]) ** 2) for tau in range(tau_max + 1)])
+        want = np.ones(tau_max + 1)
+        want[1:] = d[1:] * np.arange(1, tau_max + 1) / np.cumsum(d[1:])
+        assert np.allclose(got[k], want, atol=1e-9)
+
+
+@pytest.mark.parametrize("freq", [41.2, 110.0, 440.0, 1000.0])
+@pytest.mark.parametrize("harmonics", [1, 6])
+def test_yin_finds_the_fundamental(freq, harmonics):
+    tracker = P.PitchTracker(FS)
+    x = tone(freq, harmonics=harmonics)
+    frames = np.lib.stride_tricks.sliding_window_view(x, tracker.window)[::tracker.hop]
+    for est in tracker.analyse(frames):
+        assert est['frequency'] == pytest.approx(freq, rel=0.005)
+
+
+def test_silence_is_unvoiced():
+    tracker = P.PitchTracker(FS)
+    frames = np.zeros((3, tracker.window), dtype=np.float32)
+    assert all(e['frequency'] is None and e['note'] is None for e in tracker.analyse(frames))
+
+
+def test_note_names():
+    assert P.frequency_to_note(440.0) == ('A4', 0.0)
+    assert P.frequency_to_note(41.2034)[0] == 'E1'
+    note, cents = P.frequency_to_note(440.0 * 2 ** (10 / 1200))
+    assert note == 'A4' and cents == pytest.approx(10.0)
+
+
+def test_push_and_update_in_uneven_chunks():
+    tracker = P.PitchTracker(FS)
+    x = np.stack([tone(220.0), np.zeros(int(0.5 * FS), dtype=np.float32)], axis=1)
+    for i in range(0, len(x), 1000):
+        tracker.push([x[i:i + 1000]])
+        est = tracker.update()
+    assert tracker.hops == (len(x) // tracker.hop)
+    assert est['note'] == 'A3'
+    assert est['frequency'] == pytest.approx(220.0, rel=0.005)
+    assert tracker.dropped == 0
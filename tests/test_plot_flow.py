@@ -0,0 +1,55 @@
+import backend
+
+
+class Transport:
+    def __init__(self, size):
+        self.size = size
+
+    def get_write_buffer_size(self):
+        return self.size
+
+
+class Socket:
+    def __init__(self, buffered=0):
+        self.transport = Transport(buffered)
+
+
+def test_unacked_frames_are_capped():
+    flow = backend.PlotFlowControl()
+    ws = Socket()
+    for _ in range(backend.MAX_FRAMES_IN_FLIGHT):
+        assert flow.should_send(ws)
+        flow.next_frame()
+    assert not flow.should_send(ws)
+    flow.ack(1)
+    assert flow.should_send(ws)
+    assert flow.stats()['dropped_backpressure'] == 1
+
+
+def test_acks_only_move_forward():
+    flow = backend.PlotFlowControl()
+    for _ in range(3):
+        flow.next_frame()
+    flow.ack(2)
+    flow.ack(1)
+    flow.ack(9)  # never sent
+    flow.ack(None)
+    assert flow.acked == 2
+
+
+def test_hidden_and_congested_clients_get_no_frames():
+    flow = backend.PlotFlowControl()
+    flow.configure(visible=False)
+    assert not flow.should_send(Socket())
+    flow.configure(visible=True)
+    assert not flow.should_send(Socket(backend.PLOT_WRITE_BUFFER_LIMIT + 1))
+    stats = flow.stats()
+    assert (stats['dropped_hidden'], stats['dropped_congestion'], stats['dropped']) == (1, 1, 2)
+
+
+def test_fps_is_clamped():
+    flow = backend.PlotFlowControl()
+    flow.configure(fps=1000)
+    assert flow.fps == backend.PLOT_MAX_FPS
+    flow.configure(fps=0)
+    assert flow.interval == 1.0 / backend.PLOT_MIN_FPS
@@ -0,0 +1,130 @@
+import asyncio
+import base64
+import io
+import json
+
+import numpy as np
+import soundfile as sf
+
+import audioblocks as ab
+
+FS = 48000
+CHAIN = [{'effect_id': 'c', 'type': 'chorus', 'params': {}}]
+
+
+class Client:
+    def __init__(self):
+        self.messages = []
+
+    async def send(self, message):
+        msg = json.loads(message)
+        msg.pop('processed_b64', None)
+        msg.pop('original_b64', None)
+        self.messages.append(msg)
+
+    def of(self, kind):
+        return [m for m in self.messages if m['type'] == kind]
+
+
+def upload(seconds):
+    buf = io.BytesIO()
+    x = (0.3 * np.random.default_rng(seconds).standard_normal(int(FS * seconds))).astype(np.float32)
+    sf.write(buf, x, FS, format='WAV')
+    return 'data:audio/wav;base64,' + base64.b64encode(buf.getvalue()).decode()
+
+
+def run(test):
+    async def main():
+        engine = ab.AudioEngine(ab.SPSCRing(2 ** 16, 2))
+        engine.client = Client()
+        engine.build_chain(CHAIN)
+        try:
+            await test(engine, engine.client)
+        finally:
+            engine.close()
+    asyncio.run(main())
+
+
+async def settle(engine):
+    while engine.rendering() or engine.current_job is not None:
+        await asyncio.sleep(0.02)
+
+
+def test_render_without_an_upload_is_cancelled():
+    async def test(engine, client):
+        job = engine.submit_render(None)
+        await job.finished.wait()
+        assert [m['reason'] for m in client.of('render_cancelled')] == ['no_upload']
+        assert not engine.rendering()
+    run(test)
+
+
+def test_newest_request_supersedes_the_queue():
+    async def test(engine, client):
+        first = engine.submit_render(upload(6), echo_original=False)
+        second = engine.submit_render(upload(2), echo_original=False)
+        await second.finished.wait()
+        assert first.cancelled == 'superseded'
+        assert [m['frames'] for m in client.of('file_processed')] == [2 * FS]
+        assert client.of('render_cancelled')[0]['job'] == first.id
+    run(test)
+
+
+def test_chain_change_restarts_the_queued_upload():
+    async def test(engine, client):
+        engine.submit_render(upload(6), echo_original=False)
+        await asyncio.sleep(0.1)
+        engine.submit_render(upload(2), echo_original=False)
+        engine.build_chain([{**CHAIN[0], 'params': {'mix': 0.2}}])
+        await settle(engine)
+        assert {m['reason'] for m in client.of('render_cancelled')} <= {'superseded', 'chain_changed'}
+        assert [m['frames'] for m in client.of('file_processed')] == [2 * FS]
+    run(test)
+
+
+def test_chain_change_rerenders_the_running_upload():
+    async def test(engine, client):
+        job = engine.submit_render(upload(6), echo_original=False)
+        # running: the upload is parked by now
+        while engine.current_job is not job:
+            await asyncio.sleep(0)
+        engine.build_chain([{**CHAIN[0], 'params': {'mix': 0.2}}])
+        await settle(engine)
+        assert [m['reason'] for m in client.of('render_cancelled')] == ['chain_changed']
+        assert [m['frames'] for m in client.of('file_processed')] == [6 * FS]
+    run(test)
+
+
+def test_unchanged_chain_does_not_restart():
+    async def test(engine, client):
+        job = engine.submit_render(upload(2), echo_original=False)
+        engine.build_chain(CHAIN)
+        await job.finished.wait()
+        assert job.cancelled is None
+        assert not client.of('render_cancelled')
+    run(test)
+
+
+def test_progress_is_reported_in_order(monkeypatch):
+    monkeypatch.setattr(ab.engine, 'RENDER_PROGRESS_INTERVAL_S', 0.001)
+
+    async def test(engine, client):
+        job = engine.submit_render(upload(6), echo_original=False)
+        await job.finished.wait()
+        progress = [m['progress'] for m in client.of('render_progress')]
+        assert progress and progress == sorted(progress)
+        assert all(0.0 <= p <= 1.0 for p in progress)
+        assert client.messages[-1]['type'] == 'file_processed'
+    run(test)
+
+
+def test_cancelled_renders_stop_rendering():
+    async def test(engine, client):
+        job = engine.submit_render(upload(6), echo_original=False)
+        await asyncio.sleep(0.05)
+        engine.cancel_renders('session_expired')
+        assert not engine.rendering()
+        await job.finished.wait()
+        assert client.of('render_cancelled')[-1]['reason'] == 'session_expired'
+        assert not client.of('file_processed')
+    run(test)
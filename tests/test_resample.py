@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from audioblocks.resample import PolyphaseResampler, SampleRateConverter, design_polyphase
+
+
+def tone(fs, seconds=1.0, freq=1000.0):
+    t = np.arange(int(fs * seconds)) / fs
+    return (0.5 * np.sin(2 * np.pi * freq * t)).astype(np.float32)[:, None]
+
+
+def copy_block(x, out):
+    out[:] = x
+
+
+def stream(src, x, frames):
+    out = np.zeros_like(x)
+    for i in range(0, x.shape[0], frames):
+        src.process(x[i:i + frames], out[i:i + frames], copy_block)
+    return out
+
+
+@pytest.mark.parametrize("io_rate, internal_rate", [(44100, 48000), (48000, 44100), (96000, 48000)])
+def test_round_trip_is_a_whole_frame_delay(io_rate, internal_rate):
+    x = tone(io_rate)
+    src = SampleRateConverter(io_rate, internal_rate, 1, 1, 256)
+    out = stream(src, x, 300)
+    lat = int(round(src.latency))
+    assert src.latency == pytest.approx(lat, abs=1e-6)
+    # past the filter start-up, the output is the input delayed by the reported latency
+    settle = 2000
+    assert np.abs(out[lat + settle:] - x[settle:x.shape[0] - lat]).max() < 1e-3
+
+
+def test_offline_conversion_matches_streaming():
+    x = tone(44100)
+    out = stream(SampleRateConverter(44100, 48000, 1, 1, 256), x, 300)
+    src = SampleRateConverter(44100, 48000, 1, 1, 256)
+    y = src.convert_out(src.convert_in(x).copy())
+    # the streaming run stops mid-block; compare what both produced
+    n = min(y.shape[0], out.shape[0]) - 300
+    assert np.array_equal(y[:n], out[:n])
+
+
+def test_resampler_output_count_follows_the_ratio():
+    r = PolyphaseResampler(48000, 44100, 2)
+    r.configure(512)
+    total = sum(r.process(np.zeros((512, 2), dtype=np.float32)) for _ in range(100))
+    assert abs(total - 512 * 100 * 44100 // 48000) <= 1
+
+
+def test_filter_designs_are_shared():
+    assert design_polyphase(147, 160) is design_polyphase(147, 160)
+    assert not design_polyphase(147, 160).flags.writeable
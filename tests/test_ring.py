@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from audioblocks import ring as R
+
+
+def test_ring_size_is_the_next_power_of_two():
+    assert [R.ring_size(n) for n in (0, 1, 2, 3, 1024, 1025)] == [2, 2, 2, 4, 1024, 2048]
+    assert R.make_ring(1000).shape == (1024,)
+
+
+def test_block_delay_across_the_wrap():
+    buf = R.make_ring(64)
+    x = np.arange(1, 301, dtype=np.float32)[:, None]
+    y = np.zeros_like(x)
+    w = 0
+    for i in range(0, 300, 37):
+        w = R.ring_delay_block(buf, w, x[i:i + 37], y[i:i + 37], 50)
+    assert np.array_equal(y[50:, 0], x[:-50, 0])
+    assert not np.any(y[:50])
+    assert w == 300 % 64
+
+
+def test_zero_delay_passes_through():
+    buf = R.make_ring(8)
+    x = np.arange(20, dtype=np.float32)[:, None]
+    y = np.zeros_like(x)
+    R.ring_delay_block(buf, 0, x, y, 0)
+    assert np.array_equal(x, y)
+
+
+def test_read_block_matches_taps():
+    buf = R.make_ring(16)
+    w = R.ring_write_block(buf, 10, np.arange(1, 13, dtype=np.float32)[:, None])
+    y = np.zeros((4, 1), dtype=np.float32)
+    R.ring_read_block(buf, w, 6, y)
+    assert list(y[:, 0]) == [R.ring_tap(buf, w, d) for d in (6, 5, 4, 3)] == [7, 8, 9, 10]
+
+
+@pytest.mark.parametrize("read", [R.ring_read_linear, R.ring_read_cubic])
+def test_interpolated_reads(read):
+    # a ramp is reproduced exactly by both interpolators
+    buf = R.make_ring(32)
+    w = R.ring_write_block(buf, 30, np.arange(20, dtype=np.float32)[:, None])
+    assert read(buf, w, 5.25) == pytest.approx(19 - 4.25)
+    assert read(buf, w, 3.0) == pytest.approx(17.0)
+
+
+def test_allpass_read_of_a_constant_is_the_constant():
+    buf = np.full(16, 0.5, dtype=np.float32)
+    y = 0.5
+    for _ in range(10):
+        y = R.ring_read_allpass(buf, 3, 4.3, y)
+    assert y == pytest.approx(0.5)
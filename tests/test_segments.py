@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+import audioblocks as ab
+from audioblocks import engine as E
+
+
+@pytest.mark.parametrize("n, workers, align", [(100_000, 4, 1), (100_000, 3, 147), (99_991, 8, 64)])
+def test_plan_covers_every_frame_once(n, workers, align):
+    segments = ab.plan_segments(n, workers, pre_roll=5000, post_roll=300, crossfade=256, align=align)
+    assert segments[0][0] == 0 and segments[-1][1] == n
+    for (start, stop, pre_start, post_stop), nxt in zip(segments, segments[1:] + [None]):
+        assert pre_start % align == 0
+        assert pre_start <= max(0, start - 5000) or pre_start == 0
+        assert stop <= post_stop <= n
+        if nxt is not None:
+            assert nxt[0] == stop
+            assert post_stop >= stop + 256
+
+
+def test_short_files_get_fewer_segments():
+    assert len(ab.plan_segments(10_000, 8, pre_roll=4000, post_roll=0, crossfade=0)) == 1
+    assert len(ab.plan_segments(10_000, 8, pre_roll=0, post_roll=0, crossfade=0, min_frames=2500)) == 4
+
+
+def test_stitching_identical_renders_gives_the_signal_back():
+    n = 50_000
+    x = np.random.default_rng(0).standard_normal((n, 2)).astype(np.float32)
+    segments = ab.plan_segments(n, 4, pre_roll=3000, post_roll=100, crossfade=512)
+    parts = [x[pre_start:post_stop] for (_, _, pre_start, post_stop) in segments]
+    out = np.zeros_like(x)
+    ab.stitch_segments(segments, parts, out, 512)
+    assert np.abs(out - x).max() < 1e-6
+
+
+def test_crossfade_blends_linearly_between_neighbours():
+    n = 2000
+    segments = ab.plan_segments(n, 2, pre_roll=0, post_roll=0, crossfade=100)
+    parts = [np.zeros((post_stop - pre_start, 1), dtype=np.float32) + i
+             for i, (_, _, pre_start, post_stop) in enumerate(segments)]
+    out = np.zeros((n, 1), dtype=np.float32)
+    ab.stitch_segments(segments, parts, out, 100)
+    boundary = segments[1][0]
+    fade = out[boundary:boundary + 100, 0]
+    assert out[boundary - 1, 0] == 0.0 and out[boundary + 100, 0] == 1.0
+    assert np.allclose(np.diff(fade), 0.01)
+
+
+def test_segment_render_matches_the_sequential_render(monkeypatch):
+    monkeypatch.setattr(E, 'PARALLEL_RENDER_MIN_S', 0.5)
+    monkeypatch.setattr(E, 'PARALLEL_RENDER_WORKERS', 3)
+    fs = 44100
+    config = [
+        {'effect_id': 'f', 'type': 'filter', 'params': {'cutoff_hz': 1500}},
+        {'effect_id': 'd', 'type': 'delay', 'params': {'delay_ms': 120, 'feedback': 0.3}},
+    ]
+    x = (0.3 * np.random.default_rng(1).standard_normal((fs * 8, 1))).astype(np.float32)
+
+    chain = E.build_file_chain(config, [], fs)
+    whole = np.zeros((x.shape[0], chain.co), dtype=np.float32)
+    assert E.render_sequential(chain, x, whole)
+
+    segments = E.plan_file_render(E.build_file_chain(config, [], fs), x.shape[0])
+    assert len(segments) > 1
+    parts = [E.render_file_segment(config, fs, x[pre_start:post_stop], pre_start * chain.sr // fs)
+             for (_, _, pre_start, post_stop) in segments]
+    stitched = np.zeros_like(whole)
+    ab.stitch_segments(segments, parts, stitched, E.RENDER_CROSSFADE)
+    assert np.abs(stitched - whole).max() < 1e-5
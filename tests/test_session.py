@@ -0,0 +1,140 @@
+import asyncio
+import base64
+import io
+import json
+
+import numpy as np
+import pytest
+import soundfile as sf
+import websockets
+
+import backend
+
+
+@pytest.fixture(autouse=True)
+def fresh_server_state(monkeypatch):
+    monkeypatch.setattr(backend, "sessions", {})
+    monkeypatch.setattr(backend, "connected_client", None)
+    monkeypatch.setattr(backend, "active_engine", None)
+    yield
+    for session in backend.sessions.values():
+        session.engine.close()
+
+
+async def recv_type(conn, kind):
+    while True:
+        msg = json.loads(await asyncio.wait_for(conn.recv(), 10))
+        if msg["type"] == kind:
+            return msg
+
+
+async def disconnected():
+    # the handler's finally block detaches the session once the close is seen
+    for _ in range(100):
+        if backend.connected_client is None:
+            return
+        await asyncio.sleep(0.01)
+
+
+def serve(test):
+    async def run():
+        async with websockets.serve(backend.handler, "127.0.0.1", 0, max_size=None) as server:
+            port = server.sockets[0].getsockname()[1]
+            await test(f"ws://127.0.0.1:{port}")
+    asyncio.run(run())
+
+
+CHAIN = [{"effect_id": "d", "type": "delay", "params": {"feedback": 0.3}}]
+
+
+def test_reconnect_with_token_resumes_the_chain():
+    async def test(url):
+        async with websockets.connect(url) as c:
+            first = await recv_type(c, "session")
+            assert first["resumed"] is False
+            await c.send(json.dumps({"command": "build_chain", "config": CHAIN, "seq": 1}))
+            await c.send(json.dumps({"command": "update_param", "effect_id": "d", "param": "feedback",
+                                     "value": 0.6, "seq": 2}))
+            await asyncio.sleep(0.1)
+        await disconnected()
+        assert backend.sessions[first["token"]].websocket is None
+
+        async with websockets.connect(f"{url}/?session={first['token']}") as c:
+            again = await recv_type(c, "session")
+        assert again["resumed"] is True
+        assert again["token"] == first["token"]
+        assert again["chain"][0]["params"]["feedback"] == 0.6
+        assert again["rendering"] is False
+        assert len(backend.sessions) == 1
+    serve(test)
+
+
+def test_unknown_token_starts_a_new_session():
+    async def test(url):
+        async with websockets.connect(f"{url}/?session=nope") as c:
+            msg = await recv_type(c, "session")
+        assert msg["resumed"] is False
+        assert msg["token"] != "nope"
+    serve(test)
+
+
+def test_second_client_is_rejected():
+    async def test(url):
+        async with websockets.connect(url) as c:
+            await recv_type(c, "session")
+            async with websockets.connect(url) as other:
+                with pytest.raises(websockets.ConnectionClosed):
+                    await asyncio.wait_for(other.recv(), 5)
+    serve(test)
+
+
+def test_half_open_socket_is_taken_over_by_its_session():
+    async def test(url):
+        old = await websockets.connect(url)
+        token = (await recv_type(old, "session"))["token"]
+        async with websockets.connect(f"{url}/?session={token}") as c:
+            assert (await recv_type(c, "session"))["resumed"] is True
+            with pytest.raises(websockets.ConnectionClosed):
+                await asyncio.wait_for(old.recv(), 5)
+            assert backend.sessions[token].websocket is not None
+    serve(test)
+
+
+def test_session_expires_after_the_grace_period(monkeypatch):
+    monkeypatch.setattr(backend, "SESSION_GRACE_S", 0.2)
+
+    async def test(url):
+        async with websockets.connect(url) as c:
+            token = (await recv_type(c, "session"))["token"]
+        await disconnected()
+        await asyncio.sleep(0.4)
+        assert token not in backend.sessions
+        async with websockets.connect(f"{url}/?session={token}") as c:
+            assert (await recv_type(c, "session"))["resumed"] is False
+    serve(test)
+
+
+def test_render_result_reaches_the_resumed_client():
+    fs = 48000
+    buf = io.BytesIO()
+    sf.write(buf, (0.2 * np.random.default_rng(0).standard_normal(fs * 10)).astype(np.float32), fs, format="WAV")
+    contents = "data:audio/wav;base64," + base64.b64encode(buf.getvalue()).decode()
+
+    async def test(url):
+        async with websockets.connect(url, max_size=None) as c:
+            token = (await recv_type(c, "session"))["token"]
+            await c.send(json.dumps({"command": "build_chain", "seq": 1,
+                                     "config": [{"effect_id": "r", "type": "reverb", "params": {}}]}))
+            await c.send(json.dumps({"command": "process_file", "contents": contents,
+                                     "echo_original": False, "seq": 2}))
+            await recv_type(c, "render_progress")
+        await disconnected()
+
+        async with websockets.connect(f"{url}/?session={token}", max_size=None) as c:
+            again = await recv_type(c, "session")
+            if not again["rendering"]:
+                # finished while nobody was connected: ask for it again, as the page does
+                await c.send(json.dumps({"command": "render_file", "seq": 1}))
+            done = await recv_type(c, "file_processed")
+        assert done["frames"] == fs * 10
+    serve(test)
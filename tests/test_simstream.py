@@ -0,0 +1,47 @@
+import time
+
+import numpy as np
+import pytest
+
+import audioblocks as ab
+from audioblocks import simstream
+
+
+def test_stream_delivers_blocks_on_the_simulated_clock():
+    calls = []
+
+    def callback(indata, outdata, frames, time_info, status):
+        calls.append(indata.copy())
+        outdata[:] = indata
+
+    stream = ab.SimulatedStream(samplerate=48000, blocksize=480, channels=(1, 2), callback=callback, speed=10.0)
+    stream.start()
+    time.sleep(0.1)
+    stream.stop()
+    # 1 s of stream time at 10 ms blocks
+    assert 60 <= len(calls) <= 110
+    report = stream.report()
+    assert report['blocks'] == len(calls)
+    assert report['budget_us'] == pytest.approx(1000.0)
+    # the tone source is continuous across blocks
+    x = np.concatenate(calls)[:, 0]
+    assert np.abs(np.diff(x)).max() < 0.1
+
+
+def test_harness_adapts_and_reports(monkeypatch):
+    seen = []
+    real = ab.AudioEngine.adapt_latency
+
+    def adapt(self):
+        seen.append(self.clock())
+        return real(self)
+
+    monkeypatch.setattr(ab.AudioEngine, 'adapt_latency', adapt)
+    report = simstream.run_harness([[]], seconds=4.0, speed=8.0, profile='adaptive')
+    assert report['speed'] == 8.0
+    assert report['profile_changes'] >= 0
+    assert report['engine']['callbacks'] > 0
+    # once per ADAPT_INTERVAL_S of stream time
+    steps = np.diff(seen)
+    assert len(seen) >= 3
+    assert np.all(np.abs(steps - simstream.ADAPT_INTERVAL_S) < 0.5)
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+import audioblocks as ab
+from audioblocks import spectrogram as S
+
+
+def u8_to_db(v):
+    return S.DB_FLOOR + v * (S.DB_CEIL - S.DB_FLOOR) / 255.0
+
+
+def test_full_scale_sine_peaks_at_0_db_in_its_bin():
+    fs = 48000
+    freq = 50 * fs / S.N_FFT  # centred on bin 50
+    x = np.sin(2 * np.pi * freq * np.arange(fs) / fs)
+    spec = S.stft_db_u8(x)
+    assert spec.shape == (-(-fs // S.HOP), S.N_FFT // 2)
+    mid = spec[spec.shape[0] // 2]
+    assert mid.argmax() == 50
+    assert u8_to_db(mid[50]) == pytest.approx(0.0, abs=0.5)
+    # a -40 dB sine lands 40 dB lower
+    quiet = S.stft_db_u8(0.01 * x)[spec.shape[0] // 2]
+    assert u8_to_db(quiet[50]) == pytest.approx(-40.0, abs=0.5)
+
+
+def test_levels_pool_by_max_so_clicks_survive_zooming_out():
+    fs = 48000
+    x = np.zeros(fs * 4, dtype=np.float32)
+    x[100_000] = 1.0
+    tiles = ab.SpectrogramTiles(x, fs)
+    assert tiles.levels[-1].shape[0] <= S.TILE_FRAMES
+    for level in tiles.levels:
+        assert level.max() == tiles.levels[0].max()
+    top = len(tiles.levels) - 1
+    # the first column whose window reaches the click
+    col = int(np.argmax(tiles.levels[top].max(axis=1)))
+    assert tiles.column_time(top, col) == pytest.approx(100_000 / fs, abs=(S.N_FFT / 2 + (S.HOP << top)) / fs)
+
+
+def test_tiles_are_views_and_bounded():
+    tiles = ab.SpectrogramTiles(np.zeros(48000 * 3, dtype=np.float32), 48000)
+    t = tiles.tile(0, 1)
+    assert t.shape == (S.TILE_FRAMES, tiles.bins)
+    assert np.shares_memory(t, tiles.levels[0])
+    assert tiles.tile(0, 100) is None
+    assert tiles.tile(len(tiles.levels), 0) is None
+    assert tiles.describe()['levels'] == [lvl.shape[0] for lvl in tiles.levels]
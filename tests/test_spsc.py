@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+import audioblocks as ab
+
+
+def write(ring, frames, start):
+    if not ring.begin_write(frames):
+        return False
+    for col in range(ring.channels):
+        ring.write_column(col, np.arange(start, start + frames, dtype=np.float32) + 1000 * col)
+    ring.commit_write()
+    return True
+
+
+def read_all(ring):
+    views = ring.read_views()
+    data = np.concatenate(views) if views else np.zeros((0, ring.channels), dtype=np.float32)
+    ring.advance(data.shape[0])
+    return data
+
+
+def test_capacity_must_be_a_power_of_two():
+    with pytest.raises(ValueError):
+        ab.SPSCRing(100, 2)
+
+
+def test_frames_come_out_in_order_across_the_wrap():
+    ring = ab.SPSCRing(16, 2)
+    expected = []
+    n = 0
+    for frames in (5, 7, 3, 6, 9, 4):
+        assert write(ring, frames, n)
+        expected.append(np.arange(n, n + frames))
+        n += frames
+        data = read_all(ring)
+        assert np.array_equal(data[:, 0], expected.pop(0))
+        assert np.array_equal(data[:, 1], data[:, 0] + 1000)
+    assert ring.readable() == 0
+
+
+def test_wrapped_read_is_two_views():
+    ring = ab.SPSCRing(8, 1)
+    write(ring, 6, 0)
+    read_all(ring)
+    write(ring, 5, 6)
+    views = ring.read_views()
+    assert [v.shape[0] for v in views] == [2, 3]
+
+
+def test_block_that_does_not_fit_is_dropped_and_counted():
+    ring = ab.SPSCRing(8, 1)
+    assert write(ring, 6, 0)
+    assert not write(ring, 3, 6)
+    assert ring.overruns == 1
+    # nothing of the dropped block was published
+    assert np.array_equal(read_all(ring)[:, 0], np.arange(6))
+    assert write(ring, 3, 6)
@@ -0,0 +1,85 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from audioblocks import Tracer
+
+
+def test_disabled_tracer_records_nothing():
+    tr = Tracer()
+    with tr.span("a"):
+        with tr.kernel("k"):
+            pass
+    assert not tr.active and tr.events == []
+
+
+def test_spans_nest_and_split_kernel_from_glue():
+    tr = Tracer()
+    tr.begin()
+    with tr.span("outer", "file", n=1):
+        with tr.kernel("k"):
+            time.sleep(0.01)
+        time.sleep(0.005)
+    tr.end()
+    summary = tr.summary()
+    outer = summary["outer"]
+    assert outer["count"] == 1 and summary["k"]["cat"] == "kernel"
+    assert outer["kernel_ms"] >= 10.0 and outer["glue_ms"] >= 5.0
+    assert outer["total_ms"] == round(outer["kernel_ms"] + outer["glue_ms"], 3)
+
+
+def test_chrome_export(tmp_path):
+    tr = Tracer()
+    tr.begin()
+    with tr.span("s", "io", bytes=3):
+        pass
+    tr.end()
+    path = tmp_path / "trace.json"
+    tr.write(str(path))
+    data = json.loads(path.read_text())
+    spans = [e for e in data["traceEvents"] if e["ph"] == "X"]
+    assert [e["name"] for e in spans] == ["s"] and spans[0]["args"] == {"bytes": 3}
+    assert any(e["ph"] == "M" for e in data["traceEvents"])
+
+
+def test_a_new_global_trace_starts_empty():
+    tr = Tracer()
+    tr.begin()
+    with tr.span("first"):
+        pass
+    tr.end()
+    tr.begin()
+    tr.end()
+    assert tr.events == []
+
+
+def test_session_records_its_task_and_bound_work_only():
+    tr = Tracer()
+    other = []
+
+    def audio_thread():
+        for _ in range(50):
+            with tr.span("callback"):
+                other.append(tr.active)
+            time.sleep(0.001)
+
+    def work(name):
+        with tr.span(name):
+            pass
+
+    t = threading.Thread(target=audio_thread)
+    t.start()
+    session = tr.start_session()
+    with tr.span("render"):
+        with ThreadPoolExecutor(1) as pool:
+            pool.submit(tr.bind(work), "worker").result()
+            pool.submit(work, "unbound").result()
+    tr.stop_session(session)
+    t.join()
+
+    names = {e[0] for e in session.events}
+    assert names == {"render", "worker"}
+    assert not any(other)
+    assert tr.events == []
+    assert not tr.active
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+import audioblocks as ab
+
+
+@pytest.fixture
+def pyramid():
+    x = np.random.default_rng(0).standard_normal(100_003).astype(np.float32)
+    return ab.WaveformPyramid(x, 1000), x
+
+
+def test_buckets_match_a_direct_reduction(pyramid):
+    p, x = pyramid
+    r = p.range(10.0, 60.0, 1000)
+    k = r['level']
+    # the finest level that fits: between n_points and 2 * n_points buckets
+    assert k > 0 and 1000 <= len(r['min']) <= 2001
+    f0 = int(round(r['t_start'] * 1000))
+    size = 1 << k
+    for i in (0, 7, len(r['min']) - 1):
+        bucket = x[f0 + i * size:f0 + (i + 1) * size]
+        assert r['min'][i] == bucket.min()
+        assert r['max'][i] == bucket.max()
+        assert r['rms'][i] == pytest.approx(np.sqrt(np.mean(bucket.astype(np.float64) ** 2)), rel=1e-4)
+
+
+def test_buckets_cover_the_query(pyramid):
+    p, _ = pyramid
+    r = p.range(12.345, 67.89, 500)
+    assert r['t_start'] <= 12.345
+    assert r['t_start'] + len(r['min']) * r['dt'] >= 67.89
+
+
+def test_short_ranges_are_raw_samples(pyramid):
+    p, x = pyramid
+    r = p.range(1.0, 1.2, 1000)
+    assert r['level'] == 0
+    assert np.array_equal(r['min'], x[1000:1200])
+
+
+def test_coarsest_level_keeps_a_minimum_of_buckets(pyramid):
+    p, _ = pyramid
+    assert p.levels[-1][0].shape[0] <= ab.waveform.MIN_LEVEL_BUCKETS
+    assert p.levels[-2][0].shape[0] > ab.waveform.MIN_LEVEL_BUCKETS
+    r = p.range(0.0, p.duration, 10)
+    assert r['level'] == len(p.levels)
+
+
+def test_raw_pads_at_the_file_start(pyramid):
+    p, x = pyramid
+    out = p.raw(0.01, 32)
+    assert np.array_equal(out[:22], np.zeros(22)) and np.array_equal(out[22:], x[:10])